@@ -40,12 +40,12 @@ def create_app():
         from app.models.users import User
         from app.models.learning_pathfinder import Domain, Technology
         from app.models.finance_tracker import Transaction, Budget, FinanceSetting
-        from app.models.scholarships import Scholarship, ScholarshipCriteria, UserScholarshipPreference, user_saved_scholarships
+        from app.models.scholarships import Scholarship, ScholarshipCriteria, UserScholarshipPreference, user_saved_scholarships, CurrencyRate
         from app.models.notifications import Notification, UserNotificationPreference
         
         
         # Import email summarizer models
-        from app.models.email_summarizer import EmailAccount, Email, EmailSummary
+        from app.models.email_summarizer import EmailAccount, Email, EmailSummary, EmailThreadSummary, EmailBody, EmailAccountStats, GmailOutbox, EmailChunkSummary
         
         # Import remaining learning pathfinder models after core models
         from app.models.learning_pathfinder import (
@@ -81,6 +81,10 @@ def create_app():
         # app.register_blueprint(notification_bp, url_prefix='/notifications')
         app.register_blueprint(email_bp, url_prefix='/api')
 
+        # Register CLI commands for scheduled jobs
+        from app.commands import register_commands
+        register_commands(app)
+
         # Create upload directories if they don't exist
         with app.app_context():
             os.makedirs('static/uploads/avatars', exist_ok=True)
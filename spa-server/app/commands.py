@@ -0,0 +1,281 @@
+"""
+CLI commands for scheduled jobs
+
+Run with `flask <group> <command>`, e.g. from cron:
+    flask email recategorize
+    flask scholarships sweep-expired
+    flask scholarships remind-deadlines
+"""
+
+from datetime import datetime
+import click
+from flask.cli import AppGroup
+
+email_cli = AppGroup('email', help='Email summarizer maintenance jobs')
+
+
+@email_cli.command('recategorize')
+@click.option('--account-id', type=int, default=None, help='Only this email account')
+@click.option('--batch-size', type=int, default=1000, show_default=True)
+def recategorize_command(account_id, batch_size):
+    """Re-apply the category rules to stored emails"""
+    from app.services.email_jobs import recategorize_emails
+    result = recategorize_emails(account_id=account_id, batch_size=batch_size)
+    click.echo(result)
+
+
+@email_cli.command('train-classifier')
+@click.option('--apply/--no-apply', default=True, show_default=True,
+              help='Categorize stored uncategorized emails with the new model')
+def train_classifier_command(apply):
+    """Retrain the local category model from stored emails"""
+    from app.services.email_classifier import train_from_database
+    from app.services.email_jobs import classify_unmatched_emails
+    train_from_database()
+    if apply:
+        click.echo(classify_unmatched_emails())
+
+
+@email_cli.command('flush-outbox')
+def flush_outbox_command():
+    """Send pending read/star/trash changes to Gmail"""
+    from app.services.gmail_outbox import flush_outbox, FLUSH_LIMIT
+    while True:
+        result = flush_outbox()
+        click.echo(result)
+        if sum(result.values()) < FLUSH_LIMIT:
+            break
+
+
+@email_cli.command('purge')
+@click.option('--retention-days', type=int, default=None, help='Defaults to EMAIL_RETENTION_DAYS (5)')
+@click.option('--account-id', type=int, default=None, help='Only this email account')
+@click.option('--batch-size', type=int, default=500, show_default=True)
+def purge_command(retention_days, account_id, batch_size):
+    """Delete unstarred emails older than the retention window"""
+    from app.services.email_jobs import purge_old_emails, RETENTION_DAYS
+    result = purge_old_emails(
+        retention_days=RETENTION_DAYS if retention_days is None else retention_days,
+        account_id=account_id,
+        batch_size=batch_size
+    )
+    click.echo(result)
+
+
+@email_cli.command('renew-watches')
+def renew_watches_command():
+    """Renew Gmail push watches that expire within a day"""
+    from app.services.email_sync_service import renew_watches
+    click.echo(renew_watches())
+
+
+@email_cli.command('simulate-push')
+@click.argument('account_id', type=int)
+@click.option('--history-id', type=int, default=None,
+              help='Defaults to the mailbox\'s current history ID')
+def simulate_push_command(account_id, history_id):
+    """
+    Post a Pub/Sub-style notification to the push webhook
+
+    Stands in for Google's publisher during local testing. Needs
+    GMAIL_PUSH_TOKEN, which it appends to the webhook URL.
+    """
+    import base64
+    import json
+    import os
+    from flask import current_app, url_for
+    from app.models.email_summarizer import EmailAccount
+    from app.services.gmail_token_manager import gmail_service_for
+
+    token = os.getenv('GMAIL_PUSH_TOKEN')
+    if not token:
+        raise click.ClickException('GMAIL_PUSH_TOKEN must be set to simulate a push')
+
+    email_account = EmailAccount.query.get(account_id)
+    if not email_account:
+        raise click.ClickException(f'Email account {account_id} not found')
+
+    if history_id is None:
+        history_id = gmail_service_for(email_account).get_history_id()
+
+    payload = json.dumps({'emailAddress': email_account.email_address, 'historyId': history_id})
+    envelope = {
+        'message': {
+            'data': base64.b64encode(payload.encode()).decode(),
+            'messageId': 'simulated',
+            'publishTime': datetime.utcnow().isoformat() + 'Z'
+        },
+        'subscription': 'simulated'
+    }
+
+    with current_app.test_request_context():
+        path = url_for('email.gmail_push', token=token)
+    response = current_app.test_client().post(path, json=envelope)
+    click.echo(f'{response.status_code} {response.get_data(as_text=True)}'.strip())
+
+
+
+scholarship_cli = AppGroup('scholarships', help='Scholarship maintenance jobs')
+
+
+@scholarship_cli.command('bench-index')
+@click.option('--count', type=int, default=100000, show_default=True, help='Synthetic scholarships')
+@click.option('--queries', type=int, default=1000, show_default=True)
+@click.option('--seed', type=int, default=7, show_default=True)
+def bench_index_command(count, queries, seed):
+    """Benchmark the eligibility bitmap index on synthetic data (no database)"""
+    import random
+    import statistics
+    import time
+    from datetime import date, timedelta
+    from types import SimpleNamespace
+    from app.services.scholarship_index import ScholarshipEligibilityIndex
+
+    rng = random.Random(seed)
+    branches = ['CSE', 'ECE', 'EEE', 'MECH', 'CIVIL', 'IT', 'CHEM', 'BIO', 'AERO', 'MBA']
+    genders = ['male', 'female', 'other']
+    countries = ['India', 'USA', 'UK', 'Germany', 'Canada', 'Australia', 'Japan', 'France']
+    types = ['merit', 'need', 'sports', 'research', 'diversity', 'government']
+    skills = ['python', 'java', 'ml', 'design', 'sql', 'react', 'statistics', 'writing', 'robotics', 'finance']
+    today = date.today()
+
+    def maybe(values, k):
+        return None if rng.random() < 0.3 else rng.sample(values, rng.randint(1, k))
+
+    rows = [
+        SimpleNamespace(
+            id=f'bench-{i:08d}',
+            is_active=rng.random() > 0.05,
+            application_deadline=today + timedelta(days=rng.randint(-30, 365)),
+            updated_at=None,
+            eligible_branches=maybe(branches, 4),
+            eligible_years=maybe([1, 2, 3, 4, 5], 3),
+            eligible_genders=maybe(genders, 2),
+            country=rng.choice(countries + [None]),
+            scholarship_type=rng.choice(types + [None]),
+            required_skills=maybe(skills, 3),
+            amount_max=None if rng.random() < 0.2 else float(rng.randint(5, 500) * 1000)
+        )
+        for i in range(count)
+    ]
+
+    index = ScholarshipEligibilityIndex()
+    started = time.perf_counter()
+    index.build(rows)
+    click.echo(f'build: {len(index)} active rows in {(time.perf_counter() - started) * 1000:.0f}ms')
+
+    timings = []
+    rank_timings = []
+    matched = 0
+    for _ in range(queries):
+        preferences = dict(
+            branch=rng.choice(branches),
+            year=rng.randint(1, 5),
+            gender=rng.choice(genders),
+            countries=rng.sample(countries, rng.randint(0, 3)),
+            types=rng.sample(types, rng.randint(0, 2)),
+            today=today
+        )
+        started = time.perf_counter()
+        ids, _ = index.match(**preferences)
+        timings.append((time.perf_counter() - started) * 1000)
+        matched += len(ids)
+
+        started = time.perf_counter()
+        index.rank(
+            skills=rng.sample(skills, 3), min_amount=rng.choice([None, 50000]),
+            saved_ids=rng.sample(ids, min(len(ids), 5)), **preferences
+        )
+        rank_timings.append((time.perf_counter() - started) * 1000)
+
+    for name, values in (('match', timings), ('rank', rank_timings)):
+        values.sort()
+        click.echo(
+            f'{name}: median {statistics.median(values):.3f}ms, '
+            f'p99 {values[int(len(values) * 0.99) - 1]:.3f}ms'
+        )
+    click.echo(f'avg {matched / queries:.0f} results per query')
+
+    started = time.perf_counter()
+    for row in rows[:1000]:
+        index.upsert(row)
+    click.echo(f'upsert: {(time.perf_counter() - started) * 1000 / 1000:.3f}ms per row')
+
+
+@scholarship_cli.command('normalize-amounts')
+@click.option('--all', 'all_rows', is_flag=True, help='Re-parse every amount, not only missing ones')
+@click.option('--batch-size', type=int, default=500, show_default=True)
+def normalize_amounts_command(all_rows, batch_size):
+    """Parse free-text scholarship amounts into amount_min/amount_max (INR)"""
+    from app.services.scholarship_amounts import backfill_amounts
+    click.echo(backfill_amounts(only_missing=not all_rows, batch_size=batch_size))
+
+
+@scholarship_cli.command('set-rate')
+@click.argument('currency')
+@click.argument('rate_to_inr', type=float)
+def set_rate_command(currency, rate_to_inr):
+    """Store an exchange rate and re-normalize every amount"""
+    from app import db
+    from app.services.scholarship_amounts import backfill_amounts, set_currency_rate
+    set_currency_rate(currency, rate_to_inr)
+    db.session.commit()
+    click.echo(backfill_amounts(only_missing=False))
+
+
+@scholarship_cli.command('ingest')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'feed_format', type=click.Choice(['csv', 'json', 'jsonl']), default=None,
+              help='Defaults to the file extension')
+@click.option('--notify/--no-notify', default=True, show_default=True,
+              help='Notify users matching new or changed scholarships')
+def ingest_command(path, feed_format, notify):
+    """Bulk load a scholarship feed (CSV, JSON array or JSON Lines)"""
+    from app.services.scholarship_service import ingest_feed
+    result = ingest_feed(path, feed_format, notify=notify)
+    for error in result.pop('errors'):
+        click.echo(f"  skipped {error}", err=True)
+    click.echo(result)
+
+
+@scholarship_cli.command('sweep-expired')
+@click.option('--batch-size', type=int, default=1000, show_default=True)
+def sweep_expired_command(batch_size):
+    """Deactivate scholarships whose deadline has passed"""
+    from app.services.scholarship_service import sweep_expired
+    click.echo(sweep_expired(batch_size=batch_size))
+
+
+@scholarship_cli.command('remind-deadlines')
+@click.option('--date', 'on_date', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Run as of this date (defaults to today)')
+def remind_deadlines_command(on_date):
+    """Remind users of saved scholarships closing within 7, 3 or 1 days"""
+    from app.services.scholarship_service import send_deadline_reminders
+    click.echo(send_deadline_reminders(today=on_date.date() if on_date else None))
+
+
+@scholarship_cli.command('notify-matches')
+@click.argument('scholarship_ids', nargs=-1)
+@click.option('--since-hours', type=float, default=None,
+              help='Scholarships created or updated in the last N hours')
+def notify_matches_command(scholarship_ids, since_hours):
+    """Notify users whose preferences match the given scholarships"""
+    from datetime import timedelta
+    from app.models.scholarships import Scholarship
+    from app.services.scholarship_matching import notify_matching_users
+    ids = list(scholarship_ids)
+    if since_hours is not None:
+        since = datetime.utcnow() - timedelta(hours=since_hours)
+        ids += [scholarship.id for scholarship in Scholarship.query.with_entities(Scholarship.id).filter(
+            Scholarship.updated_at >= since
+        ).all()]
+    if not ids:
+        raise click.UsageError('Pass scholarship IDs or --since-hours')
+    click.echo(notify_matching_users(ids))
+
+
+def register_commands(app):
+    """Attach CLI groups to the app"""
+    app.cli.add_command(email_cli)
+    app.cli.add_command(scholarship_cli)
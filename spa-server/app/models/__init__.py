@@ -61,6 +61,7 @@ __all__ = [
     "ScholarshipCriteria",
     "UserScholarshipPreference",
     "user_saved_scholarships",
+    "CurrencyRate",
 
     # ======================
     # NOTIFICATIONS
@@ -74,4 +75,9 @@ __all__ = [
     "EmailAccount",
     "Email",
     "EmailSummary",
+    "EmailThreadSummary",
+    "EmailBody",
+    "EmailAccountStats",
+    "GmailOutbox",
+    "EmailChunkSummary",
 ]
\ No newline at end of file
@@ -5,11 +5,13 @@ Following the existing model patterns for consistency
 
 from app import db
 from datetime import datetime
-from sqlalchemy.dialects.postgresql import ARRAY, JSONB
-from sqlalchemy import Index
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, TSVECTOR, insert as pg_insert
+from sqlalchemy import Index, func
+import hashlib
+import re
 
 # ======================
-# CORE TABLES (3 TABLES ONLY)
+# CORE TABLES
 # ======================
 
 class EmailAccount(db.Model):
@@ -18,6 +20,9 @@ class EmailAccount(db.Model):
     Reuses existing Google Auth credentials
     """
     __tablename__ = 'email_accounts'
+    __table_args__ = (
+        Index('idx_email_account_address', 'email_address'),  # Push notifications name the mailbox
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.String(36), db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, unique=True)
@@ -31,6 +36,7 @@ class EmailAccount(db.Model):
     # Sync tracking
     last_sync_at = db.Column(db.DateTime)
     sync_token = db.Column(db.String(255))  # Gmail history ID for incremental sync
+    watch_expiration = db.Column(db.DateTime)  # Gmail push watch, renewed daily
     
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -63,6 +69,7 @@ class Email(db.Model):
         Index('idx_email_date', 'email_date'),
         Index('idx_email_category', 'category'),
         Index('idx_email_starred', 'is_starred'),
+        Index('idx_email_search', 'search_vector', postgresql_using='gin'),
     )
 
     id = db.Column(db.Integer, primary_key=True)
@@ -81,6 +88,7 @@ class Email(db.Model):
     # Simple category (AI-assigned or user-changed)
     # Categories: important, work, personal, finance, shopping, promotions, spam, other
     category = db.Column(db.String(32), default='other')
+    category_source = db.Column(db.String(16))  # rule, model, user, gmail
     
     # User actions
     is_starred = db.Column(db.Boolean, default=False)
@@ -90,6 +98,10 @@ class Email(db.Model):
     # Timestamps
     email_date = db.Column(db.DateTime, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Full-text search over subject, sender, snippet and summary
+    # Maintained by database triggers (migration 011), never set from Python
+    search_vector = db.deferred(db.Column(TSVECTOR))
 
     # Relationships
     summary = db.relationship('EmailSummary', backref='email', uselist=False, cascade='all, delete-orphan')
@@ -97,7 +109,10 @@ class Email(db.Model):
     def __repr__(self):
         return f'<Email {self.subject[:30]}...>'
 
-    def to_dict(self):
+    def to_dict(self, has_summary=None):
+        """Serialize for lists; pass has_summary when the query already computed it"""
+        if has_summary is None:
+            has_summary = self.summary is not None
         return {
             'id': self.id,
             'message_id': self.message_id,
@@ -110,16 +125,27 @@ class Email(db.Model):
             'is_read': self.is_read,
             'has_attachments': self.has_attachments,
             'email_date': self.email_date.isoformat() if self.email_date else None,
-            'has_summary': self.summary is not None
+            'has_summary': has_summary
         }
 
 
+# Keyset pagination of an account's mailbox, newest first
+Index('idx_email_account_date_id', Email.account_id, Email.email_date.desc(), Email.id.desc())
+
+# Thread grouping and per-thread lookups; emails without a thread_id are
+# their own thread, and every thread query uses this same key
+Index('idx_email_account_thread_key', Email.account_id, func.coalesce(Email.thread_id, Email.message_id))
+
+
 class EmailSummary(db.Model):
     """
     Stores AI-generated summaries (created on-demand)
     Simple structure - just the essentials
     """
     __tablename__ = 'email_summaries'
+    __table_args__ = (
+        Index('idx_email_summary_hash', 'content_hash'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     email_id = db.Column(db.Integer, db.ForeignKey('emails.id', ondelete='CASCADE'), unique=True, nullable=False)
@@ -136,11 +162,40 @@ class EmailSummary(db.Model):
     # AI info (for debugging/improvements)
     model_used = db.Column(db.String(32))  # e.g., 'gpt-4o-mini'
     
+    # Hash of the normalized body, lets identical content in the same mailbox reuse a summary
+    content_hash = db.Column(db.String(64))
+    
+    # Body was longer than the map-reduce chunk limit; the tail was not read
+    truncated = db.Column(db.Boolean, nullable=False, default=False, server_default='false')
+    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def __repr__(self):
         return f'<EmailSummary {self.email_id}>'
 
+    @staticmethod
+    def generate_content_hash(body_text):
+        """Hash of the body with markup, links, quoted replies and spacing stripped"""
+        text = re.sub(r'<[^>]+>', ' ', body_text or '')
+        text = re.sub(r'https?://\S+', ' ', text)
+        text = '\n'.join(line for line in text.splitlines() if not line.lstrip().startswith('>'))
+        text = ' '.join(text.lower().split())
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def copy_for(self, email_id):
+        """New summary row for another email with identical content"""
+        return EmailSummary(
+            email_id=email_id,
+            summary_text=self.summary_text,
+            key_points=self.key_points,
+            action_items=self.action_items,
+            priority=self.priority,
+            sentiment=self.sentiment,
+            model_used=self.model_used,
+            content_hash=self.content_hash,
+            truncated=self.truncated
+        )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -149,10 +204,199 @@ class EmailSummary(db.Model):
             'action_items': self.action_items,
             'priority': self.priority,
             'sentiment': self.sentiment,
+            'truncated': bool(self.truncated),
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
 
+class EmailChunkSummary(db.Model):
+    """
+    Partial summary of one chunk of a long email, keyed by chunk_key()
+    Shared across one account's emails so an edited or extended thread only pays for new chunks
+    Goes with the account, and the purge job drops notes older than the retention window
+    """
+    __tablename__ = 'email_chunk_summaries'
+    __table_args__ = (
+        Index('idx_email_chunk_account_created', 'account_id', 'created_at'),
+    )
+
+    content_hash = db.Column(db.String(64), primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('email_accounts.id', ondelete='CASCADE'), nullable=False)
+    summary_text = db.Column(db.Text, nullable=False)
+    model_used = db.Column(db.String(32))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<EmailChunkSummary {self.content_hash[:12]}>'
+
+    @staticmethod
+    def chunk_key(account_id, text):
+        """Hash of the raw chunk, scoped to one account so notes never cross mailboxes"""
+        return hashlib.sha256(f"{account_id}:{text}".encode('utf-8')).hexdigest()
+
+    @classmethod
+    def get_many(cls, content_hashes):
+        """Known partial summaries as {content_hash: summary_text}"""
+        if not content_hashes:
+            return {}
+        rows = db.session.query(cls.content_hash, cls.summary_text).filter(
+            cls.content_hash.in_(list(set(content_hashes)))
+        ).all()
+        return dict(rows)
+
+    @classmethod
+    def store_many(cls, account_id, summaries, model_used=None):
+        """Insert {content_hash: summary_text} for one account, ignoring hashes already stored (caller commits)"""
+        if not summaries:
+            return
+        now = datetime.utcnow()
+        stmt = pg_insert(cls).values([
+            {'content_hash': content_hash, 'account_id': account_id, 'summary_text': text,
+             'model_used': model_used, 'created_at': now}
+            for content_hash, text in summaries.items()
+        ])
+        db.session.execute(stmt.on_conflict_do_nothing(index_elements=['content_hash']))
+
+
+class EmailAccountStats(db.Model):
+    """
+    Per-account mailbox counters, kept current by every write path
+    Lets /email/stats answer with a single primary-key read
+    """
+    __tablename__ = 'email_account_stats'
+
+    account_id = db.Column(db.Integer, db.ForeignKey('email_accounts.id', ondelete='CASCADE'), primary_key=True)
+    
+    total_count = db.Column(db.Integer, nullable=False, default=0)
+    unread_count = db.Column(db.Integer, nullable=False, default=0)
+    starred_count = db.Column(db.Integer, nullable=False, default=0)
+    category_counts = db.Column(JSONB, nullable=False, default=dict)  # {category: count}
+    
+    # Emails dated today; resets when the day rolls over
+    today_date = db.Column(db.Date)
+    today_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<EmailAccountStats {self.account_id}>'
+
+    def to_dict(self):
+        today = datetime.utcnow().date()
+        return {
+            'total_emails': self.total_count,
+            'unread_count': self.unread_count,
+            'starred_count': self.starred_count,
+            'today_count': self.today_count if self.today_date == today else 0,
+            'category_counts': {
+                category: count for category, count in (self.category_counts or {}).items() if count
+            }
+        }
+
+
+class EmailBody(db.Model):
+    """
+    Local copy of a message body so detail views and summaries skip Gmail
+    Text and HTML are zlib-compressed; evicted least-recently-used
+    """
+    __tablename__ = 'email_bodies'
+    __table_args__ = (
+        Index('idx_email_body_accessed', 'last_accessed_at'),
+    )
+
+    email_id = db.Column(db.Integer, db.ForeignKey('emails.id', ondelete='CASCADE'), primary_key=True)
+    
+    # Compressed content
+    text_data = db.Column(db.LargeBinary)
+    html_data = db.Column(db.LargeBinary)
+    attachments = db.Column(JSONB)  # Attachment metadata only, never the files
+    links = db.Column(JSONB)
+    truncated = db.Column(db.Boolean, nullable=False, default=False, server_default='false')  # Cut at the decode budget
+    
+    # Eviction bookkeeping
+    size_bytes = db.Column(db.Integer, nullable=False, default=0)
+    last_accessed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<EmailBody {self.email_id} {self.size_bytes}B>'
+
+
+class EmailThreadSummary(db.Model):
+    """
+    Rolling AI summary of a whole Gmail thread
+    Updated incrementally with only the messages it has not seen yet
+    """
+    __tablename__ = 'email_thread_summaries'
+    __table_args__ = (
+        db.UniqueConstraint('account_id', 'thread_id', name='uq_thread_summary_account_thread'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('email_accounts.id', ondelete='CASCADE'), nullable=False)
+    thread_id = db.Column(db.String(255), nullable=False)
+    
+    # Summary content (same shape as EmailSummary)
+    summary_text = db.Column(db.Text, nullable=False)
+    key_points = db.Column(ARRAY(db.String))
+    action_items = db.Column(ARRAY(db.String))
+    priority = db.Column(db.String(16), default='medium')
+    sentiment = db.Column(db.String(16))
+    model_used = db.Column(db.String(32))
+    
+    # Gmail message IDs already folded into the summary
+    message_ids = db.Column(ARRAY(db.String), nullable=False, default=list)
+    last_email_date = db.Column(db.DateTime)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<EmailThreadSummary {self.thread_id}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'thread_id': self.thread_id,
+            'summary_text': self.summary_text,
+            'key_points': self.key_points,
+            'action_items': self.action_items,
+            'priority': self.priority,
+            'sentiment': self.sentiment,
+            'message_count': len(self.message_ids or []),
+            'last_email_date': self.last_email_date.isoformat() if self.last_email_date else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+
+class GmailOutbox(db.Model):
+    """
+    Pending Gmail mutations (read, star, trash) written with the local change
+    Flushed in coalesced batches by a background worker
+    """
+    __tablename__ = 'gmail_outbox'
+    __table_args__ = (
+        Index('idx_gmail_outbox_due', 'status', 'next_attempt_at'),
+        Index('idx_gmail_outbox_account', 'account_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('email_accounts.id', ondelete='CASCADE'), nullable=False)
+    message_id = db.Column(db.String(255), nullable=False)  # Gmail ID, survives local deletes
+    action = db.Column(db.String(16), nullable=False)  # read, unread, star, unstar, trash
+    
+    # Retry state
+    status = db.Column(db.String(16), nullable=False, default='pending')  # pending, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<GmailOutbox {self.action} {self.message_id}>'
+
+
 # ======================
 # CATEGORY CONSTANTS (No separate table needed)
 # ======================
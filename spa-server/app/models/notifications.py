@@ -11,6 +11,7 @@ class Notification(db.Model):
         Index('idx_notification_user', 'user_id'),
         Index('idx_notification_read', 'user_id', 'is_read'),
         Index('idx_notification_feature', 'feature'),
+        Index('uq_notification_dedupe', 'user_id', 'dedupe_key', unique=True),
     )
 
     id = db.Column(String(36), primary_key=True, default=generate_uuid)
@@ -32,6 +33,9 @@ class Notification(db.Model):
     action_url = db.Column(String(512))  # URL to navigate when notification is clicked
     action_data = db.Column(JSONB)  # Additional data needed for the action
 
+    # Set by bulk jobs so reruns do not notify twice (NULL keys never clash)
+    dedupe_key = db.Column(String(128))
+
     # Timing
     created_at = db.Column(DateTime, default=datetime.utcnow, nullable=False)
     read_at = db.Column(DateTime)  # When notification was read
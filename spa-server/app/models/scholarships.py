@@ -1,6 +1,6 @@
 from app import db
 from datetime import datetime
-from sqlalchemy import String, DateTime, Text, Boolean, Date, ForeignKey, Index, Float, Integer
+from sqlalchemy import String, DateTime, Text, Boolean, Date, ForeignKey, Index, Float, Integer, text
 from sqlalchemy.dialects.postgresql import ARRAY
 from app.models.utils import generate_uuid
 
@@ -14,6 +14,8 @@ class Scholarship(db.Model):
         Index('idx_scholarship_years', 'eligible_years', postgresql_using='gin'),
         Index('idx_scholarship_genders', 'eligible_genders', postgresql_using='gin'),
         Index('idx_scholarship_skills', 'required_skills', postgresql_using='gin'),
+        Index('idx_scholarship_amount', text('amount_max DESC NULLS LAST'), 'id'),
+        Index('idx_scholarship_dedupe', text("coalesce(provider, '')"), 'title', 'application_deadline'),
     )
 
     id = db.Column(String(36), primary_key=True, default=generate_uuid)
@@ -24,6 +26,10 @@ class Scholarship(db.Model):
     application_deadline = db.Column(Date, nullable=False)
     amount = db.Column(String(64))
     currency = db.Column(String(3))
+
+    # Parsed from amount at write time, in CANONICAL_CURRENCY; NULL when unparseable
+    amount_min = db.Column(Float)
+    amount_max = db.Column(Float)
     is_active = db.Column(Boolean, default=True, nullable=False)
 
     # Filtering criteria
@@ -94,4 +100,12 @@ user_saved_scholarships = db.Table(
     db.Column('user_id', String(36), ForeignKey('users.id'), primary_key=True, index=True),
     db.Column('scholarship_id', String(36), ForeignKey('scholarships.id'), primary_key=True, index=True),
     db.Column('saved_at', DateTime, default=datetime.utcnow, index=True)
-)
\ No newline at end of file
+)
+
+class CurrencyRate(db.Model):
+    """Exchange rates into the canonical currency (INR) for amount normalization"""
+    __tablename__ = 'currency_rates'
+
+    currency = db.Column(String(3), primary_key=True)
+    rate_to_inr = db.Column(Float, nullable=False)
+    updated_at = db.Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
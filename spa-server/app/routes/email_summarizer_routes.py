@@ -2,34 +2,71 @@
 Email Summarizer Routes - Fixed and Optimized
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from sqlalchemy import cast, distinct, func, tuple_
+from sqlalchemy.dialects.postgresql import DOUBLE_PRECISION, aggregate_order_by, array_agg, insert as pg_insert
 from app import db
 from app.models.users import User
-from app.models.email_summarizer import EmailAccount, Email, EmailSummary, get_all_categories
+from app.models.email_summarizer import (
+    EmailAccount, Email, EmailSummary, EmailThreadSummary, EmailChunkSummary, EMAIL_CATEGORIES, get_all_categories
+)
 from app.services.gmail_service import create_gmail_service
+from app.services.gmail_token_manager import gmail_service_for, get_token_manager
+from app.services.gmail_outbox import enqueue_gmail_action, get_outbox_worker
 from app.services.email_ai_service import get_ai_service
+from app.services.email_classifier import get_classifier
+from app.services.email_body_store import get_body_store
+from app.services.email_sync_service import (
+    full_sync, history_sync, start_watch, to_body_data
+)
+from app.services.cache_service import cache_token, get_cached, set_cache, invalidate_tags
+from app.services.email_stats_service import (
+    get_email_stats as read_email_stats, record_emails_removed,
+    apply_stats_delta
+)
 from datetime import datetime, timedelta
 from functools import wraps
+from google.auth.transport import requests as google_requests
+from google.oauth2 import id_token
+import base64
+import hmac
+import json
+import os
 import traceback
 
 email_bp = Blueprint('email', __name__)
 
-# Simple in-memory cache
-_cache = {}
+SEARCH_CONFIG = 'english'  # Must match the emails search_vector trigger
+MAX_BATCH_SUMMARIZE = 50
+SUMMARY_INSERT_CHUNK = 10
+
 CACHE_EXPIRY = 300  # 5 minutes
 
-def get_cached(key):
-    """Get cached value if not expired"""
-    if key in _cache:
-        data, expiry = _cache[key]
-        if datetime.utcnow() < expiry:
-            return data
-        del _cache[key]
-    return None
 
-def set_cache(key, value, seconds=CACHE_EXPIRY):
-    """Set cache with expiry"""
-    _cache[key] = (value, datetime.utcnow() + timedelta(seconds=seconds))
+def emails_tag(firebase_uid):
+    """Cache tag for everything derived from a user's mailbox"""
+    return f"user:{firebase_uid}:emails"
+
+
+def account_tag(firebase_uid):
+    """Cache tag for a user's account status"""
+    return f"user:{firebase_uid}:account"
+
+
+def email_tag(email_id):
+    """Cache tag for a single email's body"""
+    return f"email:{email_id}"
+
+
+def threads_tag(firebase_uid):
+    """Cache tag for a user's thread listing, bumped when threads appear, vanish or move"""
+    return f"user:{firebase_uid}:threads"
+
+
+def thread_tag(firebase_uid, thread_id):
+    """Cache tag for one thread; emails without a thread_id are keyed by message_id"""
+    return f"user:{firebase_uid}:thread:{thread_id}"
+
 
 def handle_errors(f):
     @wraps(f)
@@ -45,18 +82,71 @@ def handle_errors(f):
     return decorated_function
 
 
-def update_account_tokens(account, gmail_service):
-    """Update account tokens if they were refreshed"""
-    updated = gmail_service.get_updated_credentials()
-    if updated:
-        account.access_token = updated['access_token']
-        if updated.get('refresh_token'):
-            account.refresh_token = updated['refresh_token']
-        if updated.get('token_expiry'):
-            account.token_expires_at = datetime.fromisoformat(updated['token_expiry'])
-        account.updated_at = datetime.utcnow()
-        db.session.commit()
-        print("✅ Account tokens updated")
+def encode_email_cursor(email):
+    """Opaque keyset cursor for the (email_date, id) position of an email"""
+    raw = f"{email.email_date.isoformat()}|{email.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_email_cursor(cursor):
+    """Decode a cursor from encode_email_cursor into (email_date, id)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        email_date, email_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(email_date), int(email_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def encode_search_cursor(rank, email_id):
+    """Opaque keyset cursor for the (rank, id) position of a search hit"""
+    raw = f"{rank!r}|{email_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_search_cursor(cursor):
+    """Decode a cursor from encode_search_cursor into (rank, id)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        rank, email_id = raw.rsplit('|', 1)
+        return float(rank), int(email_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def encode_thread_cursor(last_date, thread_id):
+    """Opaque keyset cursor for the (last message date, thread id) position of a thread"""
+    raw = f"{last_date.isoformat()}|{thread_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_thread_cursor(cursor):
+    """Decode a cursor from encode_thread_cursor into (last_date, thread_id)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        last_date, thread_id = raw.split('|', 1)
+        return datetime.fromisoformat(last_date), thread_id
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def email_filters(account_id, args):
+    """Account plus the optional category/is_read/is_starred query filters"""
+    filters = [Email.account_id == account_id]
+    
+    category = args.get('category')
+    if category:
+        filters.append(Email.category == category)
+    
+    is_read = args.get('is_read')
+    if is_read is not None:
+        filters.append(Email.is_read == (is_read.lower() == 'true'))
+    
+    is_starred = args.get('is_starred')
+    if is_starred is not None:
+        filters.append(Email.is_starred == (is_starred.lower() == 'true'))
+    
+    return filters
 
 
 @email_bp.route('/email/connect', methods=['POST'])
@@ -96,7 +186,8 @@ def connect_gmail():
         existing_account.updated_at = datetime.utcnow()
         db.session.commit()
         
-        set_cache(f"account_status:{user.id}", None, 0)
+        get_token_manager().forget(existing_account.id)
+        invalidate_tags(account_tag(user.id))
         
         return jsonify({
             'message': 'Gmail account updated',
@@ -116,6 +207,16 @@ def connect_gmail():
     db.session.add(email_account)
     db.session.commit()
     
+    # Push notifications are optional; polling sync still works without them
+    try:
+        if start_watch(email_account, gmail_service):
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Gmail watch error (non-critical): {e}")
+    
+    invalidate_tags(account_tag(user.id))
+    
     return jsonify({
         'message': 'Gmail connected successfully',
         'email_address': email_address,
@@ -123,6 +224,62 @@ def connect_gmail():
     }), 201
 
 
+def verify_push_request():
+    """
+    Check that a push request comes from our Pub/Sub subscription
+    
+    With GMAIL_PUSH_AUDIENCE set, the subscription's OIDC token is verified
+    (and its service account, if GMAIL_PUSH_SERVICE_ACCOUNT is set). Otherwise
+    the ?token= query parameter must equal GMAIL_PUSH_TOKEN.
+    """
+    audience = os.getenv('GMAIL_PUSH_AUDIENCE')
+    if audience:
+        header = request.headers.get('Authorization', '')
+        if not header.startswith('Bearer '):
+            return False
+        try:
+            claims = id_token.verify_oauth2_token(header[len('Bearer '):], google_requests.Request(), audience=audience)
+        except ValueError:
+            return False
+        service_account = os.getenv('GMAIL_PUSH_SERVICE_ACCOUNT')
+        return not service_account or claims.get('email') == service_account
+    
+    token = os.getenv('GMAIL_PUSH_TOKEN')
+    return bool(token) and hmac.compare_digest(request.args.get('token', ''), token)
+
+
+@email_bp.route('/email/push', methods=['POST'])
+@handle_errors
+def gmail_push():
+    """Pub/Sub push endpoint for Gmail watch notifications"""
+    if not verify_push_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    envelope = request.get_json(silent=True) or {}
+    try:
+        payload = json.loads(base64.b64decode(envelope['message']['data']))
+        email_address = payload['emailAddress']
+        history_id = int(payload['historyId'])
+    except (KeyError, TypeError, ValueError):
+        # Malformed messages would be redelivered forever; acknowledge them
+        print("⚠️ Ignoring malformed Gmail push message")
+        return '', 204
+    
+    account_ids = [
+        account_id for (account_id,) in db.session.query(EmailAccount.id).filter(
+            EmailAccount.email_address == email_address,
+            EmailAccount.is_active == True
+        ).all()
+    ]
+    
+    # A failure returns 500 so Pub/Sub redelivers the notification
+    for account_id in account_ids:
+        result = history_sync(account_id, notified_history_id=history_id)
+        print(f"🔔 Push sync for account {account_id}: {result}")
+    
+    return '', 204
+
+
 @email_bp.route('/email/sync', methods=['POST'])
 @handle_errors
 def sync_emails():
@@ -140,140 +297,294 @@ def sync_emails():
     if not email_account:
         return jsonify({'error': 'Gmail account not connected'}), 404
     
-    gmail_service = create_gmail_service(
-        email_account.access_token,
-        email_account.refresh_token
+    # Old emails are removed by the scheduled purge job (flask email purge)
+    result = full_sync(
+        email_account,
+        max_results=min(data.get('max_results', 50), 100),
+        days_back=data.get('days_back', 5)
     )
     
-    update_account_tokens(email_account, gmail_service)
-    ai_service = get_ai_service()
+    return jsonify({
+        'message': 'Emails synced successfully',
+        'synced_count': result['synced_count']
+    }), 200
+
+
+@email_bp.route('/email/list', methods=['GET'])
+@handle_errors
+def list_emails():
+    """Get emails with proper filtering and caching"""
+    firebase_uid = request.args.get('firebase_uid')
+    if not firebase_uid:
+        return jsonify({'error': 'firebase_uid is required'}), 400
     
-    # Delete old emails (>5 days, not starred)
-    if data.get('delete_old', True):
-        cutoff_date = datetime.utcnow() - timedelta(days=5)
-        Email.query.filter(
-            Email.account_id == email_account.id,
-            Email.email_date < cutoff_date,
-            Email.is_starred == False
-        ).delete()
-        db.session.commit()
+    cursor = request.args.get('cursor')
+    use_cursor = cursor is not None or request.args.get('pagination') == 'cursor'
+    include_total = request.args.get('include_total', 'false' if use_cursor else 'true').lower() == 'true'
+    page = int(request.args.get('page', 1))
+    per_page = min(int(request.args.get('per_page', 50)), 100)
     
-    # Fetch emails: last 5 days OR starred OR important
-    max_results = min(data.get('max_results', 50), 100)  # Reduced to 50
-    days_back = data.get('days_back', 5)
-    after_date = (datetime.utcnow() - timedelta(days=days_back)).strftime('%Y/%m/%d')
+    cache_key = (
+        f"emails_list:{firebase_uid}:{request.args.get('category', 'all')}:{request.args.get('is_read', 'all')}"
+        f":{request.args.get('is_starred', 'all')}:{cursor if use_cursor else page}:{per_page}:{include_total}"
+    )
+    cached = get_cached(cache_key)
+    if cached:
+        return jsonify(cached), 200
+    read_started = cache_token()
     
-    query = f'(after:{after_date} OR is:starred OR is:important) in:inbox'
+    email_account = EmailAccount.query.filter_by(user_id=firebase_uid).first()
+    if not email_account:
+        return jsonify({'error': 'Gmail account not connected'}), 404
     
-    result = gmail_service.fetch_emails(max_results=max_results, query=query)
-    emails_data = result['emails']
+    filters = email_filters(email_account.id, request.args)
     
-    synced_count = 0
-    existing_ids = {e.message_id for e in Email.query.filter_by(account_id=email_account.id).all()}
+    # Counting is the expensive part on big mailboxes, so it is opt-in for cursors
+    total = db.session.query(func.count(Email.id)).filter(*filters).scalar() if include_total else None
     
-    for email_data in emails_data:
-        if email_data['message_id'] in existing_ids:
-            continue
-        
-        category = ai_service.categorize_email(
-            email_data['subject'],
-            email_data['sender_email'],
-            email_data['snippet']
-        )
-        
-        if email_data.get('is_important'):
-            category = 'important'
-        
-        email = Email(
-            account_id=email_account.id,
-            message_id=email_data['message_id'],
-            thread_id=email_data['thread_id'],
-            subject=email_data['subject'],
-            sender_email=email_data['sender_email'],
-            sender_name=email_data['sender_name'],
-            snippet=email_data['snippet'],
-            category=category,
-            is_starred=email_data['is_starred'],
-            is_read=email_data['is_read'],
-            has_attachments=email_data['has_attachments'],
-            email_date=email_data['email_date']
-        )
-        
-        db.session.add(email)
-        synced_count += 1
+    # has_summary comes from the same query instead of a lazy load per row
+    has_summary = db.session.query(EmailSummary.id).filter(EmailSummary.email_id == Email.id).exists()
+    query = db.session.query(Email, has_summary.label('has_summary')).filter(*filters)
     
-    # Update last sync time (UTC)
-    email_account.last_sync_at = datetime.utcnow()
+    # Newest first; id breaks ties so the order is stable for cursors
+    query = query.order_by(Email.email_date.desc(), Email.id.desc())
     
-    history_id = gmail_service.get_history_id()
-    if history_id:
-        email_account.sync_token = str(history_id)
+    if use_cursor:
+        if cursor:
+            cursor_date, cursor_id = decode_email_cursor(cursor)
+            query = query.filter(tuple_(Email.email_date, Email.id) < (cursor_date, cursor_id))
+        rows = query.limit(per_page + 1).all()
+    else:
+        rows = query.offset((page - 1) * per_page).limit(per_page + 1).all()
     
-    db.session.commit()
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
     
-    # Clear cache
-    set_cache(f"emails_list:{data['firebase_uid']}", None, 0)
-    set_cache(f"email_stats:{data['firebase_uid']}", None, 0)
+    emails_data = [email.to_dict(has_summary=summarized) for email, summarized in rows]
     
-    return jsonify({
-        'message': 'Emails synced successfully',
-        'synced_count': synced_count
-    }), 200
+    result = {
+        'emails': emails_data,
+        'total': total,
+        'per_page': per_page,
+        'has_next': has_next,
+        'categories': get_all_categories()
+    }
+    
+    if use_cursor:
+        last_email = rows[-1][0] if rows else None
+        result['next_cursor'] = encode_email_cursor(last_email) if has_next and last_email else None
+    else:
+        result['page'] = page
+        result['has_prev'] = page > 1
+    
+    set_cache(cache_key, result, 180, tags=[emails_tag(firebase_uid)], since=read_started)  # 3 minutes
+    
+    return jsonify(result), 200
 
 
-@email_bp.route('/email/list', methods=['GET'])
+@email_bp.route('/email/search', methods=['GET'])
 @handle_errors
-def list_emails():
-    """Get emails with proper filtering and caching"""
+def search_emails():
+    """Ranked full-text search over subject, sender, snippet and summary"""
     firebase_uid = request.args.get('firebase_uid')
     if not firebase_uid:
         return jsonify({'error': 'firebase_uid is required'}), 400
     
-    cache_key = f"emails_list:{firebase_uid}:{request.args.get('category', 'all')}:{request.args.get('is_read', 'all')}:{request.args.get('is_starred', 'all')}:{request.args.get('page', 1)}"
+    search_text = (request.args.get('q') or '').strip()
+    if not search_text:
+        return jsonify({'error': 'q is required'}), 400
+    
+    cursor = request.args.get('cursor')
+    per_page = min(int(request.args.get('per_page', 20)), 100)
+    
+    cache_key = (
+        f"emails_search:{firebase_uid}:{search_text}:{request.args.get('category', 'all')}"
+        f":{request.args.get('is_read', 'all')}:{request.args.get('is_starred', 'all')}:{cursor}:{per_page}"
+    )
     cached = get_cached(cache_key)
     if cached:
         return jsonify(cached), 200
+    read_started = cache_token()
     
     email_account = EmailAccount.query.filter_by(user_id=firebase_uid).first()
     if not email_account:
         return jsonify({'error': 'Gmail account not connected'}), 404
     
-    query = Email.query.filter_by(account_id=email_account.id)
+    # websearch syntax: "exact phrase", or, -excluded
+    ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, search_text)
+    # ts_rank_cd is float4; widen it once so ordering, the cursor value and
+    # the keyset comparison all use the same double, or ties at a page edge slip
+    rank = cast(func.ts_rank_cd(Email.search_vector, ts_query), DOUBLE_PRECISION)
+    
+    has_summary = db.session.query(EmailSummary.id).filter(EmailSummary.email_id == Email.id).exists()
+    query = db.session.query(Email, has_summary.label('has_summary'), rank.label('rank')).filter(
+        *email_filters(email_account.id, request.args),
+        Email.search_vector.op('@@')(ts_query)
+    ).order_by(rank.desc(), Email.id.desc())
+    
+    if cursor:
+        cursor_rank, cursor_id = decode_search_cursor(cursor)
+        query = query.filter(tuple_(rank, Email.id) < (cursor_rank, cursor_id))
+    
+    rows = query.limit(per_page + 1).all()
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    
+    result = {
+        'emails': [email.to_dict(has_summary=summarized) for email, summarized, _ in rows],
+        'query': search_text,
+        'per_page': per_page,
+        'has_next': has_next,
+        'next_cursor': encode_search_cursor(rows[-1][2], rows[-1][0].id) if has_next else None
+    }
+    
+    set_cache(cache_key, result, 120, tags=[emails_tag(firebase_uid)], since=read_started)  # 2 minutes
+    
+    return jsonify(result), 200
+
+
+@email_bp.route('/email/threads', methods=['GET'])
+@handle_errors
+def list_threads():
+    """Conversations, newest activity first, aggregated in one grouped query"""
+    firebase_uid = request.args.get('firebase_uid')
+    if not firebase_uid:
+        return jsonify({'error': 'firebase_uid is required'}), 400
+    
+    cursor = request.args.get('cursor')
+    per_page = min(int(request.args.get('per_page', 30)), 100)
+    
+    cache_key = (
+        f"threads_list:{firebase_uid}:{request.args.get('category', 'all')}:{request.args.get('is_read', 'all')}"
+        f":{request.args.get('is_starred', 'all')}:{cursor}:{per_page}"
+    )
+    cached = get_cached(cache_key)
+    if cached:
+        return jsonify(cached), 200
+    read_started = cache_token()
+    
+    email_account = EmailAccount.query.filter_by(user_id=firebase_uid).first()
+    if not email_account:
+        return jsonify({'error': 'Gmail account not connected'}), 404
     
-    # Apply filters correctly
+    thread_key = func.coalesce(Email.thread_id, Email.message_id)
+    last_date = func.max(Email.email_date)
+    unread_count = func.count(Email.id).filter(Email.is_read == False)
+    has_thread_summary = db.session.query(EmailThreadSummary.id).filter(
+        EmailThreadSummary.account_id == email_account.id,
+        EmailThreadSummary.thread_id == thread_key
+    ).exists()
+    
+    query = db.session.query(
+        thread_key.label('thread_id'),
+        last_date.label('last_date'),
+        func.count(Email.id).label('message_count'),
+        unread_count.label('unread_count'),
+        func.count(EmailSummary.id).label('summarized_count'),
+        func.bool_or(Email.is_starred).label('is_starred'),
+        func.bool_or(Email.has_attachments).label('has_attachments'),
+        array_agg(distinct(func.coalesce(Email.sender_name, Email.sender_email))).label('participants'),
+        array_agg(aggregate_order_by(Email.subject, Email.email_date.desc()))[1].label('subject'),
+        array_agg(aggregate_order_by(Email.snippet, Email.email_date.desc()))[1].label('snippet'),
+        has_thread_summary.label('has_thread_summary')
+    ).outerjoin(
+        EmailSummary, EmailSummary.email_id == Email.id
+    ).filter(
+        Email.account_id == email_account.id
+    ).group_by(thread_key)
+    
+    # Filters select whole threads, so the aggregates always cover every message
     category = request.args.get('category')
     if category:
-        query = query.filter_by(category=category)
+        query = query.having(func.bool_or(Email.category == category))
     
     is_read = request.args.get('is_read')
     if is_read is not None:
-        read_value = is_read.lower() == 'true'
-        query = query.filter_by(is_read=read_value)
+        query = query.having(unread_count == 0 if is_read.lower() == 'true' else unread_count > 0)
     
     is_starred = request.args.get('is_starred')
     if is_starred is not None:
-        starred_value = is_starred.lower() == 'true'
-        query = query.filter_by(is_starred=starred_value)
+        starred = func.bool_or(Email.is_starred)
+        query = query.having(starred if is_starred.lower() == 'true' else ~starred)
+    
+    if cursor:
+        cursor_date, cursor_thread = decode_thread_cursor(cursor)
+        query = query.having(tuple_(last_date, thread_key) < (cursor_date, cursor_thread))
+    
+    rows = query.order_by(last_date.desc(), thread_key.desc()).limit(per_page + 1).all()
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    
+    threads = [
+        {
+            'thread_id': row.thread_id,
+            'subject': row.subject,
+            'snippet': row.snippet,
+            'participants': sorted(row.participants or [])[:10],
+            'message_count': row.message_count,
+            'unread_count': row.unread_count,
+            'is_starred': row.is_starred,
+            'has_attachments': row.has_attachments,
+            'summarized_count': row.summarized_count,
+            'has_thread_summary': row.has_thread_summary,
+            'last_email_date': row.last_date.isoformat() if row.last_date else None
+        }
+        for row in rows
+    ]
     
-    page = int(request.args.get('page', 1))
-    per_page = min(int(request.args.get('per_page', 50)), 100)
+    result = {
+        'threads': threads,
+        'per_page': per_page,
+        'has_next': has_next,
+        'next_cursor': encode_thread_cursor(rows[-1].last_date, rows[-1].thread_id) if has_next else None
+    }
+    
+    # Read/star/summary changes drop only pages holding that thread
+    tags = [threads_tag(firebase_uid)] + [thread_tag(firebase_uid, thread['thread_id']) for thread in threads]
+    set_cache(cache_key, result, 180, tags=tags, since=read_started)  # 3 minutes
+    
+    return jsonify(result), 200
+
+
+@email_bp.route('/email/threads/<thread_id>', methods=['GET'])
+@handle_errors
+def get_thread(thread_id):
+    """Messages of one thread, oldest first, with the thread summary if any"""
+    firebase_uid = request.args.get('firebase_uid')
+    if not firebase_uid:
+        return jsonify({'error': 'firebase_uid is required'}), 400
     
-    query = query.order_by(Email.email_date.desc())
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    cache_key = f"thread_detail:{firebase_uid}:{thread_id}"
+    cached = get_cached(cache_key)
+    if cached:
+        return jsonify(cached), 200
+    read_started = cache_token()
     
-    emails_data = [email.to_dict() for email in pagination.items]
+    email_account = EmailAccount.query.filter_by(user_id=firebase_uid).first()
+    if not email_account:
+        return jsonify({'error': 'Gmail account not connected'}), 404
+    
+    has_summary = db.session.query(EmailSummary.id).filter(EmailSummary.email_id == Email.id).exists()
+    rows = db.session.query(Email, has_summary.label('has_summary')).filter(
+        Email.account_id == email_account.id,
+        func.coalesce(Email.thread_id, Email.message_id) == thread_id
+    ).order_by(Email.email_date.asc(), Email.id.asc()).all()
+    if not rows:
+        return jsonify({'error': 'Thread not found'}), 404
+    
+    thread_summary = EmailThreadSummary.query.filter_by(
+        account_id=email_account.id,
+        thread_id=thread_id
+    ).first()
     
     result = {
-        'emails': emails_data,
-        'total': pagination.total,
-        'page': page,
-        'per_page': per_page,
-        'has_next': pagination.has_next,
-        'has_prev': pagination.has_prev,
-        'categories': get_all_categories()
+        'thread_id': thread_id,
+        'emails': [email.to_dict(has_summary=summarized) for email, summarized in rows],
+        'summary': thread_summary.to_dict() if thread_summary else None
     }
     
-    set_cache(cache_key, result, 180)  # 3 minutes
+    set_cache(cache_key, result, 180, tags=[threads_tag(firebase_uid), thread_tag(firebase_uid, thread_id)],
+              since=read_started)
     
     return jsonify(result), 200
 
@@ -305,29 +616,54 @@ def get_email_detail(email_id):
         if cached_body:
             response_data.update(cached_body)
         else:
-            gmail_service = create_gmail_service(
-                email_account.access_token,
-                email_account.refresh_token
-            )
+            read_started = cache_token()
+            body_store = get_body_store()
+            body_data = body_store.get(email_id)
             
-            update_account_tokens(email_account, gmail_service)
-            
-            # Get full message with attachments info
-            full_message = gmail_service.get_message_with_attachments(email.message_id)
-            
-            body_data = {
-                'body_text': full_message['body']['text'],
-                'body_html': full_message['body']['html'],
-                'attachments': full_message['attachments'],
-                'links': full_message['links']
-            }
+            if not body_data:
+                gmail_service = gmail_service_for(email_account)
+                
+                # Get full message with attachments info
+                full_message = gmail_service.get_message_with_attachments(email.message_id)
+                body_data = to_body_data(full_message)
+                body_store.put(email_id, body_data)
             
             response_data.update(body_data)
-            set_cache(cache_key, body_data, 600)  # 10 minutes
+            set_cache(cache_key, body_data, 600, tags=[email_tag(email_id)], since=read_started)  # 10 minutes
     
     return jsonify(response_data), 200
 
 
+def summarize_body(email, body_text, body_truncated=False):
+    """
+    Summary data for one body; long bodies go through map-reduce with cached chunks
+    
+    body_truncated marks a body the MIME extractor already cut at its size
+    budget; the summary is flagged truncated either way.
+    """
+    ai_service = get_ai_service()
+    sender_name = email.sender_name or email.sender_email
+    
+    if len(body_text) <= ai_service.MAX_BODY_CHARS:
+        summary_data = ai_service.summarize_email(email.subject, sender_name, body_text)
+        summary_data['truncated'] = body_truncated
+        return summary_data
+    
+    texts, truncated = ai_service.split_into_chunks(body_text)
+    truncated = truncated or body_truncated
+    chunks = [(EmailChunkSummary.chunk_key(email.account_id, chunk), chunk) for chunk in texts]
+    known = EmailChunkSummary.get_many([content_hash for content_hash, _ in chunks])
+    summary_data, new_partials = ai_service.summarize_chunked(
+        email.subject, sender_name, chunks, known, truncated=truncated
+    )
+    summary_data['truncated'] = truncated
+    
+    # Committed with the summary itself
+    EmailChunkSummary.store_many(email.account_id, new_partials, model_used=summary_data.get('model_used'))
+    print(f"🧩 Chunked summary: {len(chunks)} chunks, {len(new_partials)} new" + (" (truncated)" if truncated else ""))
+    return summary_data
+
+
 @email_bp.route('/email/<int:email_id>/summarize', methods=['POST'])
 @handle_errors
 def summarize_email(email_id):
@@ -357,52 +693,323 @@ def summarize_email(email_id):
     cache_key = f"email_body:{email_id}"
     cached_body = get_cached(cache_key)
     
-    if cached_body:
-        body_text = cached_body['body_text']
-    else:
-        gmail_service = create_gmail_service(
-            email_account.access_token,
-            email_account.refresh_token
-        )
-        update_account_tokens(email_account, gmail_service)
+    if not cached_body:
+        body_store = get_body_store()
+        cached_body = body_store.get(email_id)
         
-        body = gmail_service.get_message_body(email.message_id)
-        body_text = body['text'] if body['text'] else body['html']
+        if not cached_body:
+            gmail_service = gmail_service_for(email_account)
+            
+            cached_body = to_body_data(gmail_service.get_message_with_attachments(email.message_id))
+            body_store.put(email_id, cached_body)
+    
+    body_text = cached_body['body_text'] if cached_body['body_text'] else cached_body['body_html']
     
     if not body_text or len(body_text.strip()) < 50:
         return jsonify({'error': 'Email content too short to summarize'}), 400
     
-    # Generate summary
-    ai_service = get_ai_service()
-    summary_data = ai_service.summarize_email(
-        email.subject,
-        email.sender_name or email.sender_email,
-        body_text[:10000]  # Limit for Gemini
-    )
+    # Reuse a summary of identical content (newsletters, forwards, notifications).
+    # The hash is of normalized text, so reuse stays within the same mailbox
+    content_hash = EmailSummary.generate_content_hash(body_text)
+    duplicate = EmailSummary.query.join(Email, Email.id == EmailSummary.email_id).filter(
+        EmailSummary.content_hash == content_hash,
+        Email.account_id == email_account.id
+    ).first()
     
-    email_summary = EmailSummary(
-        email_id=email_id,
-        summary_text=summary_data['summary_text'],
-        key_points=summary_data.get('key_points', []),
-        action_items=summary_data.get('action_items', []),
-        priority=summary_data.get('priority', 'medium'),
-        sentiment=summary_data.get('sentiment', 'neutral'),
-        model_used=summary_data.get('model_used', 'unknown')
-    )
+    if duplicate:
+        email_summary = duplicate.copy_for(email_id)
+    else:
+        summary_data = summarize_body(email, body_text, cached_body.get('truncated', False))
+        
+        email_summary = EmailSummary(
+            email_id=email_id,
+            summary_text=summary_data['summary_text'],
+            key_points=summary_data.get('key_points', []),
+            action_items=summary_data.get('action_items', []),
+            priority=summary_data.get('priority', 'medium'),
+            sentiment=summary_data.get('sentiment', 'neutral'),
+            model_used=summary_data.get('model_used', 'unknown'),
+            content_hash=content_hash,
+            truncated=summary_data.get('truncated', False)
+        )
     
     db.session.add(email_summary)
     db.session.commit()
     
+    invalidate_tags(emails_tag(data['firebase_uid']), thread_tag(data['firebase_uid'], email.thread_id or email.message_id))
+    
     return jsonify({
         'message': 'Summary generated successfully',
         'summary': email_summary.to_dict()
     }), 201
 
 
+def fetch_email_bodies(email_account, emails):
+    """(body text, truncated) per email id: cache, then the body store, the rest in one Gmail batch"""
+    body_data = {}
+    for email in emails:
+        cached_body = get_cached(f"email_body:{email.id}")
+        if cached_body:
+            body_data[email.id] = cached_body
+    
+    body_store = get_body_store()
+    body_data.update(body_store.get_many([email.id for email in emails if email.id not in body_data]))
+    
+    missing = [email for email in emails if email.id not in body_data]
+    if missing:
+        gmail_service = gmail_service_for(email_account)
+        
+        fetched = gmail_service.get_messages_with_attachments([email.message_id for email in missing])
+        stored = {
+            email.id: to_body_data(fetched[email.message_id])
+            for email in missing
+            if email.message_id in fetched
+        }
+        body_store.put_many(stored)
+        body_data.update(stored)
+    
+    return {
+        email_id: (data['body_text'] if data['body_text'] else data['body_html'], data.get('truncated', False))
+        for email_id, data in body_data.items()
+    }
+
+
+def bulk_insert_summaries(rows):
+    """Insert summary rows in one statement, skipping emails summarized meanwhile"""
+    if not rows:
+        return
+    db.session.execute(
+        pg_insert(EmailSummary).values(rows).on_conflict_do_nothing(index_elements=['email_id'])
+    )
+    db.session.commit()
+
+
+@email_bp.route('/email/summarize-batch', methods=['POST'])
+@handle_errors
+def summarize_emails_batch():
+    """Generate Gemini summaries for many emails, streamed as NDJSON"""
+    data = request.get_json()
+    
+    if not data.get('firebase_uid'):
+        return jsonify({'error': 'firebase_uid is required'}), 400
+    
+    email_ids = data.get('email_ids')
+    if not isinstance(email_ids, list) or not email_ids:
+        return jsonify({'error': 'email_ids must be a non-empty list'}), 400
+    if len(email_ids) > MAX_BATCH_SUMMARIZE:
+        return jsonify({'error': f'At most {MAX_BATCH_SUMMARIZE} emails per batch'}), 400
+    
+    email_account = EmailAccount.query.filter_by(user_id=data['firebase_uid']).first()
+    if not email_account:
+        return jsonify({'error': 'Gmail account not connected'}), 404
+    
+    email_ids = list(dict.fromkeys(int(email_id) for email_id in email_ids))
+    emails = Email.query.filter(
+        Email.account_id == email_account.id,
+        Email.id.in_(email_ids)
+    ).all()
+    emails_by_id = {email.id: email for email in emails}
+    
+    existing = {
+        summary.email_id: summary
+        for summary in EmailSummary.query.filter(EmailSummary.email_id.in_(list(emails_by_id))).all()
+    }
+    pending = [email for email in emails if email.id not in existing]
+    
+    bodies = fetch_email_bodies(email_account, pending)
+    
+    # One AI call per distinct content; identical bodies share the result
+    hashes = {}
+    truncated_hashes = set()
+    items = []
+    skipped = []
+    for email in pending:
+        body_text, body_truncated = bodies.get(email.id, (None, False))
+        if not body_text or len(body_text.strip()) < 50:
+            skipped.append(email.id)
+            continue
+        
+        content_hash = EmailSummary.generate_content_hash(body_text)
+        if content_hash not in hashes:
+            hashes[content_hash] = []
+            items.append({
+                'key': content_hash,
+                'subject': email.subject,
+                'sender_name': email.sender_name or email.sender_email,
+                'body_text': body_text
+            })
+        hashes[content_hash].append(email.id)
+        if body_truncated:
+            truncated_hashes.add(content_hash)
+    
+    known = {}
+    if hashes:
+        for summary in EmailSummary.query.join(Email, Email.id == EmailSummary.email_id).filter(
+            EmailSummary.content_hash.in_(list(hashes)),
+            Email.account_id == email_account.id
+        ).all():
+            known.setdefault(summary.content_hash, summary)
+    items = [item for item in items if item['key'] not in known]
+    
+    ai_service = get_ai_service()
+    
+    def generate():
+        counts = {'summarized': 0, 'exists': len(existing), 'skipped': len(skipped), 'not_found': 0}
+        
+        for email_id in email_ids:
+            if email_id not in emails_by_id:
+                counts['not_found'] += 1
+                yield json.dumps({'email_id': email_id, 'status': 'not_found'}) + '\n'
+            elif email_id in existing:
+                yield json.dumps({'email_id': email_id, 'status': 'exists',
+                                  'summary': existing[email_id].to_dict()}) + '\n'
+        
+        for email_id in skipped:
+            yield json.dumps({'email_id': email_id, 'status': 'skipped',
+                              'error': 'Email content too short to summarize'}) + '\n'
+        
+        def summarized(summary_data, content_hash):
+            for email_id in hashes[content_hash]:
+                row = {
+                    'email_id': email_id,
+                    'summary_text': summary_data['summary_text'],
+                    'key_points': summary_data.get('key_points') or [],
+                    'action_items': summary_data.get('action_items') or [],
+                    'priority': summary_data.get('priority', 'medium'),
+                    'sentiment': summary_data.get('sentiment', 'neutral'),
+                    'model_used': summary_data.get('model_used', 'unknown'),
+                    'content_hash': content_hash,
+                    'truncated': bool(summary_data.get('truncated')) or content_hash in truncated_hashes,
+                    'created_at': datetime.utcnow()
+                }
+                counts['summarized'] += 1
+                
+                yield row, json.dumps({
+                    'email_id': email_id,
+                    'status': 'summarized',
+                    'summary': {
+                        'summary_text': row['summary_text'],
+                        'key_points': row['key_points'],
+                        'action_items': row['action_items'],
+                        'priority': row['priority'],
+                        'sentiment': row['sentiment'],
+                        'truncated': row['truncated'],
+                        'created_at': row['created_at'].isoformat()
+                    }
+                }) + '\n'
+        
+        rows = []
+        try:
+            for content_hash, summary in known.items():
+                summary_data = {**summary.to_dict(), 'model_used': summary.model_used}
+                for row, line in summarized(summary_data, content_hash):
+                    rows.append(row)
+                    yield line
+            
+            for content_hash, summary_data in ai_service.summarize_batch(items):
+                for row, line in summarized(summary_data, content_hash):
+                    rows.append(row)
+                    yield line
+                
+                if len(rows) >= SUMMARY_INSERT_CHUNK:
+                    bulk_insert_summaries(rows)
+                    rows = []
+            
+            bulk_insert_summaries(rows)
+            invalidate_tags(emails_tag(data['firebase_uid']), threads_tag(data['firebase_uid']))
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error in summarize_emails_batch: {str(e)}")
+            print(traceback.format_exc())
+            yield json.dumps({'status': 'error', 'error': 'Internal server error'}) + '\n'
+            return
+        
+        yield json.dumps({'status': 'done', **counts}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@email_bp.route('/email/thread/<thread_id>/summarize', methods=['POST'])
+@handle_errors
+def summarize_thread(thread_id):
+    """Summarize a whole thread once, folding in only messages added since the last run"""
+    data = request.get_json()
+    
+    if not data.get('firebase_uid'):
+        return jsonify({'error': 'firebase_uid is required'}), 400
+    
+    email_account = EmailAccount.query.filter_by(user_id=data['firebase_uid']).first()
+    if not email_account:
+        return jsonify({'error': 'Gmail account not connected'}), 404
+    
+    # Same key as the thread list: emails without a thread_id stand alone
+    emails = Email.query.filter(
+        Email.account_id == email_account.id,
+        func.coalesce(Email.thread_id, Email.message_id) == thread_id
+    ).order_by(Email.email_date.asc()).all()
+    if not emails:
+        return jsonify({'error': 'Thread not found'}), 404
+    
+    thread_summary = EmailThreadSummary.query.filter_by(
+        account_id=email_account.id,
+        thread_id=thread_id
+    ).first()
+    
+    seen = set(thread_summary.message_ids or []) if thread_summary else set()
+    new_emails = [email for email in emails if email.message_id not in seen]
+    
+    if not new_emails:
+        return jsonify({
+            'message': 'Thread summary is up to date',
+            'summary': thread_summary.to_dict()
+        }), 200
+    
+    bodies = fetch_email_bodies(email_account, new_emails)
+    messages = [
+        {
+            'sender_name': email.sender_name or email.sender_email,
+            'email_date': email.email_date.isoformat() if email.email_date else '',
+            'body_text': bodies.get(email.id) or email.snippet or ''
+        }
+        for email in new_emails
+    ]
+    
+    ai_service = get_ai_service()
+    summary_data = ai_service.summarize_thread(
+        emails[0].subject,
+        messages,
+        previous=thread_summary.to_dict() if thread_summary else None
+    )
+    
+    status_code = 200
+    if not thread_summary:
+        thread_summary = EmailThreadSummary(account_id=email_account.id, thread_id=thread_id)
+        db.session.add(thread_summary)
+        status_code = 201
+    
+    thread_summary.summary_text = summary_data['summary_text']
+    thread_summary.key_points = summary_data.get('key_points', [])
+    thread_summary.action_items = summary_data.get('action_items', [])
+    thread_summary.priority = summary_data.get('priority', 'medium')
+    thread_summary.sentiment = summary_data.get('sentiment', 'neutral')
+    thread_summary.model_used = summary_data.get('model_used', 'unknown')
+    thread_summary.message_ids = sorted(seen | {email.message_id for email in new_emails})
+    thread_summary.last_email_date = emails[-1].email_date
+    db.session.commit()
+    
+    invalidate_tags(emails_tag(data['firebase_uid']), thread_tag(data['firebase_uid'], thread_id))
+    
+    return jsonify({
+        'message': 'Thread summary updated',
+        'new_messages': len(new_emails),
+        'summary': thread_summary.to_dict()
+    }), status_code
+
+
 @email_bp.route('/email/<int:email_id>/mark-read', methods=['PUT'])
 @handle_errors
 def mark_read(email_id):
-    """Mark email as read - syncs with Gmail"""
+    """Mark email as read - Gmail is updated in the background"""
     data = request.get_json()
     
     if not data.get('firebase_uid'):
@@ -417,29 +1024,21 @@ def mark_read(email_id):
         return jsonify({'error': 'Access denied'}), 403
     
     is_read = data.get('is_read', True)
+    changed = email.is_read != is_read
     
     # Update local DB immediately
+    if changed:
+        apply_stats_delta(email_account.id, unread=-1 if is_read else 1)
     email.is_read = is_read
+    # Gmail is updated in the background from the outbox
+    enqueue_gmail_action(email_account.id, email.message_id, 'read' if is_read else 'unread')
     db.session.commit()
+    get_outbox_worker().notify()
     
-    # Clear cache
-    set_cache(f"emails_list:{data['firebase_uid']}", None, 0)
-    set_cache(f"email_stats:{data['firebase_uid']}", None, 0)
-    
-    # Sync with Gmail in background (don't wait)
-    try:
-        gmail_service = create_gmail_service(
-            email_account.access_token,
-            email_account.refresh_token
-        )
-        update_account_tokens(email_account, gmail_service)
-        
-        if is_read:
-            gmail_service.mark_as_read(email.message_id)
-        else:
-            gmail_service.mark_as_unread(email.message_id)
-    except Exception as e:
-        print(f"Gmail sync error (non-critical): {e}")
+    tags = [emails_tag(data['firebase_uid']), thread_tag(data['firebase_uid'], email.thread_id or email.message_id)]
+    if changed:
+        tags.append(threads_tag(data['firebase_uid']))  # The thread may join or leave is_read-filtered pages
+    invalidate_tags(*tags)
     
     return jsonify({
         'message': 'Read status updated',
@@ -464,25 +1063,14 @@ def delete_email(email_id):
     if not email_account or email_account.user_id != firebase_uid:
         return jsonify({'error': 'Access denied'}), 403
     
-    # Delete from local DB immediately
+    # Delete from local DB immediately; Gmail trash goes through the outbox
+    record_emails_removed(email_account.id, [email])
+    enqueue_gmail_action(email_account.id, email.message_id, 'trash')
     db.session.delete(email)
     db.session.commit()
+    get_outbox_worker().notify()
     
-    # Clear cache
-    set_cache(f"emails_list:{firebase_uid}", None, 0)
-    set_cache(f"email_stats:{firebase_uid}", None, 0)
-    
-    # Delete from Gmail in background
-    try:
-        gmail_service = create_gmail_service(
-            email_account.access_token,
-            email_account.refresh_token
-        )
-        update_account_tokens(email_account, gmail_service)
-        gmail_service.delete_message(email.message_id)
-        print(f"✅ Email {email_id} deleted from Gmail")
-    except Exception as e:
-        print(f"Gmail delete error (non-critical): {e}")
+    invalidate_tags(emails_tag(firebase_uid), email_tag(email_id), threads_tag(firebase_uid))
     
     return jsonify({'message': 'Email deleted successfully'}), 200
 
@@ -505,21 +1093,19 @@ def toggle_star(email_id):
         return jsonify({'error': 'Access denied'}), 403
     
     starred = data.get('starred', True)
+    changed = email.is_starred != starred
     
+    if changed:
+        apply_stats_delta(email_account.id, starred=1 if starred else -1)
     email.is_starred = starred
+    enqueue_gmail_action(email_account.id, email.message_id, 'star' if starred else 'unstar')
     db.session.commit()
+    get_outbox_worker().notify()
     
-    set_cache(f"emails_list:{data['firebase_uid']}", None, 0)
-    
-    try:
-        gmail_service = create_gmail_service(
-            email_account.access_token,
-            email_account.refresh_token
-        )
-        update_account_tokens(email_account, gmail_service)
-        gmail_service.toggle_star(email.message_id, starred)
-    except Exception as e:
-        print(f"Gmail sync error: {e}")
+    tags = [emails_tag(data['firebase_uid']), thread_tag(data['firebase_uid'], email.thread_id or email.message_id)]
+    if changed:
+        tags.append(threads_tag(data['firebase_uid']))  # The thread may join or leave is_starred-filtered pages
+    invalidate_tags(*tags)
     
     return jsonify({
         'message': 'Star toggled successfully',
@@ -527,6 +1113,45 @@ def toggle_star(email_id):
     }), 200
 
 
+@email_bp.route('/email/<int:email_id>/category', methods=['PUT'])
+@handle_errors
+def update_category(email_id):
+    """Re-categorize an email; the correction also trains the local model"""
+    data = request.get_json()
+    
+    if not data.get('firebase_uid'):
+        return jsonify({'error': 'firebase_uid is required'}), 400
+    
+    category = data.get('category')
+    if category not in EMAIL_CATEGORIES:
+        return jsonify({'error': 'Invalid category'}), 400
+    
+    email = Email.query.get(email_id)
+    if not email:
+        return jsonify({'error': 'Email not found'}), 404
+    
+    email_account = EmailAccount.query.get(email.account_id)
+    if not email_account or email_account.user_id != data['firebase_uid']:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    if email.category != category:
+        apply_stats_delta(email_account.id, categories={email.category or 'other': -1, category: 1})
+    email.category = category
+    email.category_source = 'user'
+    db.session.commit()
+    
+    invalidate_tags(emails_tag(data['firebase_uid']), threads_tag(data['firebase_uid']))
+    
+    get_classifier().learn_async([(
+        email.subject, email.sender_email, email.snippet, category, get_classifier().USER_WEIGHT
+    )])
+    
+    return jsonify({
+        'message': 'Category updated',
+        'category': category
+    }), 200
+
+
 @email_bp.route('/email/stats', methods=['GET'])
 @handle_errors
 def get_email_stats():
@@ -539,40 +1164,19 @@ def get_email_stats():
     cached = get_cached(cache_key)
     if cached:
         return jsonify(cached), 200
+    read_started = cache_token()
     
     email_account = EmailAccount.query.filter_by(user_id=firebase_uid).first()
     if not email_account:
         return jsonify({'error': 'Gmail account not connected'}), 404
     
-    total_emails = Email.query.filter_by(account_id=email_account.id).count()
-    unread_count = Email.query.filter_by(account_id=email_account.id, is_read=False).count()
-    starred_count = Email.query.filter_by(account_id=email_account.id, is_starred=True).count()
-    
-    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    today_count = Email.query.filter(
-        Email.account_id == email_account.id,
-        Email.email_date >= today_start
-    ).count()
-    
-    from sqlalchemy import func
-    category_counts = dict(
-        db.session.query(Email.category, func.count(Email.id))
-        .filter_by(account_id=email_account.id)
-        .group_by(Email.category)
-        .all()
-    )
-    
-    result = {
-        'total_emails': total_emails,
-        'unread_count': unread_count,
-        'starred_count': starred_count,
-        'today_count': today_count,
-        'category_counts': category_counts,
+    result = read_email_stats(email_account.id).to_dict()
+    result.update({
         'last_sync': email_account.last_sync_at.isoformat() if email_account.last_sync_at else None,
         'email_address': email_account.email_address
-    }
+    })
     
-    set_cache(cache_key, result, 120)
+    set_cache(cache_key, result, 120, tags=[emails_tag(firebase_uid)], since=read_started)
     
     return jsonify(result), 200
 
@@ -589,6 +1193,7 @@ def get_account_status():
     cached = get_cached(cache_key)
     if cached:
         return jsonify(cached), 200
+    read_started = cache_token()
     
     email_account = EmailAccount.query.filter_by(user_id=firebase_uid).first()
     
@@ -601,7 +1206,7 @@ def get_account_status():
     else:
         result = {'connected': False}
     
-    set_cache(cache_key, result, 300)
+    set_cache(cache_key, result, 300, tags=[account_tag(firebase_uid)], since=read_started)
     
     return jsonify(result), 200
 
@@ -2,11 +2,321 @@ from flask import Blueprint, request, jsonify
 from app import db
 from app.models.scholarships import Scholarship, ScholarshipCriteria, UserScholarshipPreference, user_saved_scholarships
 from app.models.users import User
-from datetime import datetime
-from sqlalchemy import and_, or_
+from app.services.scholarship_index import (
+    INDEX_COLUMNS, SEARCH_CACHE_TAG, ScholarshipEligibilityIndex, get_scholarship_index, index_enabled,
+    keyset_slice, normalize_skill
+)
+from app.services.scholarship_ranking import relevance_keyset_slice
+from app.services.scholarship_amounts import CANONICAL_CURRENCY
+from app.services.cache_service import cache_token, get_cached, set_cache
+from datetime import date, datetime, timedelta
+from sqlalchemy import and_, or_, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+import base64
+import hashlib
 
 scholarship_bp = Blueprint('scholarships', __name__)
 
+
+SEARCH_SORTS = ('relevance', 'deadline', 'amount')
+
+# Other workers' writes only reach this process through the index poll,
+# so cached pages are kept briefly even though local writes invalidate them
+SEARCH_CACHE_SECONDS = 300
+
+MAX_SAVE_BATCH = 100
+
+# Compact list projection; the detail endpoint returns the full record
+SEARCH_COLUMNS = (
+    Scholarship.id, Scholarship.title, Scholarship.provider, Scholarship.amount, Scholarship.currency,
+    Scholarship.amount_min, Scholarship.amount_max, Scholarship.application_deadline, Scholarship.website_url, Scholarship.country, Scholarship.scholarship_type
+)
+
+
+def encode_scholarship_cursor(deadline, scholarship_id):
+    """Opaque keyset cursor for the (deadline, id) position of a search result"""
+    raw = f"{deadline.isoformat()}|{scholarship_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_scholarship_cursor(cursor):
+    """Decode a cursor from encode_scholarship_cursor into (deadline, id)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        deadline, scholarship_id = raw.split('|', 1)
+        return date.fromisoformat(deadline), scholarship_id
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def encode_amount_cursor(amount, scholarship_id):
+    """Opaque keyset cursor for the (amount_max, id) position of a result"""
+    raw = f"{amount!r}|{scholarship_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_amount_cursor(cursor):
+    """Decode a cursor from encode_amount_cursor into (amount_max or None, id)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        amount, scholarship_id = raw.split('|', 1)
+        return (None if amount == 'None' else float(amount)), scholarship_id
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def eligible_scholarships_query(preferences):
+    """SQL filters for eligible, open scholarships"""
+    query = Scholarship.query.filter(Scholarship.is_active == True)
+    query = query.filter(Scholarship.application_deadline >= datetime.now().date())
+    
+    if preferences:
+        if preferences.branch:
+            query = query.filter(
+                or_(
+                    Scholarship.eligible_branches.contains([preferences.branch]),
+                    Scholarship.eligible_branches == None
+                )
+            )
+        
+        if preferences.current_year:
+            query = query.filter(
+                or_(
+                    Scholarship.eligible_years.contains([preferences.current_year]),
+                    Scholarship.eligible_years == None
+                )
+            )
+        
+        if preferences.gender:
+            query = query.filter(
+                or_(
+                    Scholarship.eligible_genders.contains([preferences.gender]),
+                    Scholarship.eligible_genders == None
+                )
+            )
+        
+        if preferences.preferred_countries:
+            query = query.filter(
+                Scholarship.country.in_(preferences.preferred_countries)
+            )
+        
+        if preferences.preferred_types:
+            query = query.filter(
+                Scholarship.scholarship_type.in_(preferences.preferred_types)
+            )
+        
+        if preferences.min_amount:
+            query = query.filter(
+                or_(
+                    Scholarship.amount_max >= preferences.min_amount,
+                    Scholarship.amount_max == None
+                )
+            )
+    
+    return query
+
+
+def encode_relevance_cursor(score, scholarship_id, signature):
+    """
+    Opaque keyset cursor for the (score, id) position of a ranked result
+    
+    Scores are only comparable under the same inputs, so the cursor also
+    carries the preference_signature() it was ranked under.
+    """
+    raw = f"{float(score)!r}|{scholarship_id}|{signature[:16]}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_relevance_cursor(cursor, signature):
+    """
+    Decode a cursor from encode_relevance_cursor into (score, id)
+    
+    Raises ValueError once the signature has moved on (a save, an unsave
+    or a preference change re-scores everything): paging restarts then.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        score, rest = raw.split('|', 1)
+        scholarship_id, cursor_signature = rest.rsplit('|', 1)
+        score = float(score)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+    if cursor_signature != signature[:16]:
+        raise ValueError('Cursor expired: results were re-ranked, restart from the first page')
+    return score, scholarship_id
+
+
+def eligible_ids(preferences, sort, saved_ids):
+    """
+    Every eligible, open scholarship id in result order
+    
+    Uses the in-memory eligibility index. Amount order always comes from
+    SQL (returns None), as does deadline order when the index is off or
+    fails; relevance is then scored on a throwaway index built from the SQL
+    candidates.
+    
+    Returns:
+        tuple: (ids, deadline ordinals or scores), or None for the SQL path
+    """
+    if sort == 'amount':
+        return None
+    
+    if index_enabled():
+        try:
+            index = get_scholarship_index()
+            if sort == 'relevance':
+                return index.rank_preferences(preferences, saved_ids)
+            return index.match_preferences(preferences)
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Scholarship index unavailable, using SQL filters: {e}")
+    
+    if sort != 'relevance':
+        return None
+    
+    rows = eligible_scholarships_query(preferences).with_entities(*INDEX_COLUMNS).all()
+    if saved_ids:
+        rows += Scholarship.query.with_entities(*INDEX_COLUMNS).filter(Scholarship.id.in_(saved_ids)).all()
+    index = ScholarshipEligibilityIndex()
+    index.build(rows)
+    return index.rank_preferences(preferences, saved_ids)
+
+
+def preference_signature(preferences, sort, saved_ids=()):
+    """
+    Canonical hash of everything that shapes a search result
+    
+    Students with the same filters share cached pages. Relevance also
+    depends on skills and, through similarity, on the saved scholarships.
+    """
+    if preferences is None:
+        parts = ['-']
+    else:
+        parts = [
+            preferences.branch, preferences.current_year, preferences.gender,
+            ','.join(sorted(preferences.preferred_countries or ())),
+            ','.join(sorted(preferences.preferred_types or ())),
+            preferences.min_amount or ''
+        ]
+    if sort == 'relevance':
+        skills = preferences.skills if preferences is not None else None
+        parts.append(','.join(sorted({normalize_skill(skill) for skill in skills or ()})))
+        parts.append(','.join(sorted(saved_ids)))
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def search_cache_seconds():
+    """Cache lifetime, cut short at midnight when the day's deadlines close"""
+    now = datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return max(1, min(SEARCH_CACHE_SECONDS, int((midnight - now).total_seconds())))
+
+
+def search_page(preferences, sort, after, per_page, include_total, saved_ids=()):
+    """
+    One page of eligible scholarships
+    
+    Ids come from eligible_ids(); only the page's rows are loaded. Amount
+    order, and deadline order without the index, are keyset SQL queries.
+    
+    Returns:
+        tuple: (rows with SEARCH_COLUMNS, up to per_page + 1; {id: score} or None; total or None)
+    """
+    ordered = eligible_ids(preferences, sort, saved_ids)
+    
+    if ordered is not None:
+        ids, keys = ordered
+        scores = None
+        if sort == 'relevance':
+            page_ids, page_scores = relevance_keyset_slice(ids, keys, after, per_page + 1)
+            scores = dict(zip(page_ids, page_scores.tolist()))
+        else:
+            page_ids = keyset_slice(ids, keys, after, per_page + 1)
+        
+        rows = {
+            row.id: row
+            for row in Scholarship.query.with_entities(*SEARCH_COLUMNS).filter(
+                Scholarship.id.in_(page_ids), Scholarship.is_active == True
+            ).all()
+        } if page_ids else {}
+        rows = [rows[scholarship_id] for scholarship_id in page_ids if scholarship_id in rows]
+        return rows, scores, len(ids) if include_total else None
+    
+    query = eligible_scholarships_query(preferences)
+    total = query.count() if include_total else None
+    
+    if sort == 'amount':
+        # Largest first, unknown amounts last; matches idx_scholarship_amount
+        if after is not None:
+            amount, scholarship_id = after
+            if amount is None:
+                query = query.filter(Scholarship.amount_max == None, Scholarship.id > scholarship_id)
+            else:
+                query = query.filter(
+                    or_(
+                        Scholarship.amount_max < amount,
+                        and_(Scholarship.amount_max == amount, Scholarship.id > scholarship_id),
+                        Scholarship.amount_max == None
+                    )
+                )
+        order = (Scholarship.amount_max.desc().nullslast(), Scholarship.id)
+    else:
+        if after is not None:
+            query = query.filter(tuple_(Scholarship.application_deadline, Scholarship.id) > after)
+        order = (Scholarship.application_deadline, Scholarship.id)
+    
+    rows = query.with_entities(*SEARCH_COLUMNS).order_by(*order).limit(per_page + 1).all()
+    return rows, None, total
+
+def build_search_page(preferences, sort, after, per_page, include_total, saved_ids):
+    """
+    Serialized search page without the per-user is_saved flag
+    
+    Returns:
+        dict: scholarships, total, has_next and next_cursor
+    """
+    rows, scores, total = search_page(preferences, sort, after, per_page, include_total, saved_ids)
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    
+    result = []
+    for scholarship in rows:
+        result.append({
+            'id': scholarship.id,
+            'title': scholarship.title,
+            'provider': scholarship.provider,
+            'amount': scholarship.amount,
+            'currency': scholarship.currency,
+            'amount_min': scholarship.amount_min,
+            'amount_max': scholarship.amount_max,
+            'application_deadline': scholarship.application_deadline.isoformat(),
+            'website_url': scholarship.website_url,
+            'country': scholarship.country,
+            'scholarship_type': scholarship.scholarship_type
+        })
+        if scores is not None:
+            result[-1]['score'] = round(scores[scholarship.id], 4)
+    
+    next_cursor = None
+    if has_next:
+        last = rows[-1]
+        if sort == 'relevance':
+            next_cursor = encode_relevance_cursor(
+                scores[last.id], last.id, preference_signature(preferences, sort, saved_ids)
+            )
+        elif sort == 'amount':
+            next_cursor = encode_amount_cursor(last.amount_max, last.id)
+        else:
+            next_cursor = encode_scholarship_cursor(last.application_deadline, last.id)
+    
+    return {
+        'scholarships': result,
+        'total': total,
+        'has_next': has_next,
+        'next_cursor': next_cursor
+    }
+
+
 @scholarship_bp.route('/scholarships/preferences', methods=['POST'])
 def save_preferences():
     """Save or update user scholarship preferences"""
@@ -108,103 +418,146 @@ def search_scholarships():
         
         preferences = UserScholarshipPreference.query.filter_by(user_id=user.id).first()
         
-        query = Scholarship.query.filter(Scholarship.is_active == True)
-        query = query.filter(Scholarship.application_deadline >= datetime.now().date())
-        
-        if preferences:
-            if preferences.branch:
-                query = query.filter(
-                    or_(
-                        Scholarship.eligible_branches.contains([preferences.branch]),
-                        Scholarship.eligible_branches == None
-                    )
-                )
-            
-            if preferences.current_year:
-                query = query.filter(
-                    or_(
-                        Scholarship.eligible_years.contains([preferences.current_year]),
-                        Scholarship.eligible_years == None
-                    )
-                )
-            
-            if preferences.gender:
-                query = query.filter(
-                    or_(
-                        Scholarship.eligible_genders.contains([preferences.gender]),
-                        Scholarship.eligible_genders == None
-                    )
-                )
-            
-            if preferences.preferred_countries:
-                query = query.filter(
-                    Scholarship.country.in_(preferences.preferred_countries)
-                )
-            
-            if preferences.preferred_types:
-                query = query.filter(
-                    Scholarship.scholarship_type.in_(preferences.preferred_types)
-                )
-        
-        scholarships = query.order_by(Scholarship.application_deadline).all()
-        
-        saved_ids = set()
-        if user.saved_scholarships:
-            saved_ids = {s.id for s in user.saved_scholarships}
-        
-        result = []
-        for scholarship in scholarships:
-            result.append({
-                'id': scholarship.id,
-                'title': scholarship.title,
-                'description': scholarship.description,
-                'provider': scholarship.provider,
-                'amount': scholarship.amount,
-                'currency': scholarship.currency,
-                'application_deadline': scholarship.application_deadline.isoformat(),
-                'website_url': scholarship.website_url,
-                'country': scholarship.country,
-                'scholarship_type': scholarship.scholarship_type,
-                'eligible_branches': scholarship.eligible_branches or [],
-                'eligible_years': scholarship.eligible_years or [],
-                'eligible_genders': scholarship.eligible_genders or [],
-                'required_skills': scholarship.required_skills or [],
-                'is_saved': scholarship.id in saved_ids
-            })
+        sort = data.get('sort', 'relevance')
+        if sort not in SEARCH_SORTS:
+            return jsonify({'error': f"sort must be one of {', '.join(SEARCH_SORTS)}"}), 400
+        
+        per_page = min(int(data.get('per_page', 20)), 100)
+        include_total = str(data.get('include_total', 'false')).lower() == 'true'
+        cursor = data.get('cursor')
+        saved_ids = get_saved_ids(user.id)
+        signature = preference_signature(preferences, sort, saved_ids)
+        try:
+            decode_cursor = {
+                'relevance': lambda value: decode_relevance_cursor(value, signature),
+                'deadline': decode_scholarship_cursor,
+                'amount': decode_amount_cursor
+            }[sort]
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Pages are shared across users; is_saved is applied per request
+        cache_key = (
+            f"scholarship_search:{signature}:{sort}"
+            f":{cursor or ''}:{per_page}:{include_total}"
+        )
+        page = get_cached(cache_key)
+        if page is None:
+            read_started = cache_token()
+            page = build_search_page(preferences, sort, after, per_page, include_total, saved_ids)
+            set_cache(cache_key, page, search_cache_seconds(), tags=[SEARCH_CACHE_TAG], since=read_started)
         
         return jsonify({
-            'scholarships': result,
-            'total': len(result)
+            'scholarships': [
+                dict(scholarship, is_saved=scholarship['id'] in saved_ids) for scholarship in page['scholarships']
+            ],
+            'total': page['total'],
+            'sort': sort,
+            'amount_currency': CANONICAL_CURRENCY,
+            'per_page': per_page,
+            'has_next': page['has_next'],
+            'next_cursor': page['next_cursor']
         }), 200
         
     except Exception as e:
         return jsonify({'error': f'Failed to search scholarships: {str(e)}'}), 500
 
+def get_saved_ids(user_id):
+    """
+    Ids of the user's saved scholarships, straight from the association table
+    
+    Deliberately uncached: the cache is per process, and a save must show
+    up on the very next search whichever worker serves it.
+    """
+    return frozenset(db.session.execute(
+        select(user_saved_scholarships.c.scholarship_id).where(user_saved_scholarships.c.user_id == user_id)
+    ).scalars())
+
+
+def save_scholarships(user_id, scholarship_ids):
+    """
+    Save scholarships in one INSERT ... ON CONFLICT DO NOTHING (caller commits)
+    
+    Returns:
+        list: Ids that were newly saved
+    """
+    stmt = pg_insert(user_saved_scholarships).values([
+        {'user_id': user_id, 'scholarship_id': scholarship_id} for scholarship_id in scholarship_ids
+    ]).on_conflict_do_nothing().returning(user_saved_scholarships.c.scholarship_id)
+    return db.session.execute(stmt).scalars().all()
+
+
+def unsave_scholarships(user_id, scholarship_ids):
+    """
+    Remove saved scholarships in one DELETE ... IN (caller commits)
+    
+    Returns:
+        list: Ids that were removed
+    """
+    stmt = user_saved_scholarships.delete().where(
+        user_saved_scholarships.c.user_id == user_id,
+        user_saved_scholarships.c.scholarship_id.in_(scholarship_ids)
+    ).returning(user_saved_scholarships.c.scholarship_id)
+    return db.session.execute(stmt).scalars().all()
+
+
+def requested_scholarship_ids(data):
+    """
+    Ids from a save/unsave body: scholarship_id, or a scholarship_ids list
+    
+    Returns:
+        tuple: (unique ids in request order, is_batch)
+    """
+    if data.get('scholarship_ids') is not None:
+        ids = data['scholarship_ids']
+        if not isinstance(ids, list):
+            raise ValueError('scholarship_ids must be a list')
+        if len(ids) > MAX_SAVE_BATCH:
+            raise ValueError(f'At most {MAX_SAVE_BATCH} scholarship_ids per request')
+        return list(dict.fromkeys(str(scholarship_id) for scholarship_id in ids)), True
+    scholarship_id = data.get('scholarship_id')
+    return ([scholarship_id] if scholarship_id else []), False
+
+
 @scholarship_bp.route('/scholarships/save', methods=['POST'])
 def save_scholarship():
-    """Save a scholarship for later"""
+    """Save one scholarship (scholarship_id) or a batch (scholarship_ids) for later"""
     try:
         data = request.get_json()
         firebase_uid = data.get('firebase_uid')
-        scholarship_id = data.get('scholarship_id')
+        try:
+            scholarship_ids, is_batch = requested_scholarship_ids(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        if not all([firebase_uid, scholarship_id]):
+        if not firebase_uid or not scholarship_ids:
             return jsonify({'error': 'Missing required fields'}), 400
         
-        user = User.query.filter_by(id=firebase_uid).first()
-        if not user:
+        if not db.session.query(User.id).filter_by(id=firebase_uid).first():
             return jsonify({'error': 'User not found'}), 404
         
-        scholarship = Scholarship.query.get(scholarship_id)
-        if not scholarship:
+        existing = set(db.session.execute(
+            select(Scholarship.id).where(Scholarship.id.in_(scholarship_ids))
+        ).scalars())
+        not_found = [scholarship_id for scholarship_id in scholarship_ids if scholarship_id not in existing]
+        if not is_batch and not_found:
             return jsonify({'error': 'Scholarship not found'}), 404
         
-        if scholarship not in user.saved_scholarships:
-            user.saved_scholarships.append(scholarship)
-            db.session.commit()
-            return jsonify({'message': 'Scholarship saved successfully'}), 200
-        else:
-            return jsonify({'message': 'Scholarship already saved'}), 200
+        to_save = [scholarship_id for scholarship_id in scholarship_ids if scholarship_id in existing]
+        saved = save_scholarships(firebase_uid, to_save) if to_save else []
+        db.session.commit()
+        
+        if not is_batch:
+            message = 'Scholarship saved successfully' if saved else 'Scholarship already saved'
+            return jsonify({'message': message}), 200
+        newly_saved = set(saved)
+        return jsonify({
+            'message': f'{len(saved)} scholarships saved',
+            'saved': saved,
+            'already_saved': [scholarship_id for scholarship_id in to_save if scholarship_id not in newly_saved],
+            'not_found': not_found
+        }), 200
         
     except Exception as e:
         db.session.rollback()
@@ -212,29 +565,37 @@ def save_scholarship():
 
 @scholarship_bp.route('/scholarships/unsave', methods=['POST'])
 def unsave_scholarship():
-    """Remove a saved scholarship"""
+    """Remove one saved scholarship (scholarship_id) or a batch (scholarship_ids)"""
     try:
         data = request.get_json()
         firebase_uid = data.get('firebase_uid')
-        scholarship_id = data.get('scholarship_id')
+        try:
+            scholarship_ids, is_batch = requested_scholarship_ids(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        if not all([firebase_uid, scholarship_id]):
+        if not firebase_uid or not scholarship_ids:
             return jsonify({'error': 'Missing required fields'}), 400
         
-        user = User.query.filter_by(id=firebase_uid).first()
-        if not user:
+        if not db.session.query(User.id).filter_by(id=firebase_uid).first():
             return jsonify({'error': 'User not found'}), 404
         
-        scholarship = Scholarship.query.get(scholarship_id)
-        if not scholarship:
-            return jsonify({'error': 'Scholarship not found'}), 404
+        removed = unsave_scholarships(firebase_uid, scholarship_ids)
+        db.session.commit()
         
-        if scholarship in user.saved_scholarships:
-            user.saved_scholarships.remove(scholarship)
-            db.session.commit()
-            return jsonify({'message': 'Scholarship removed successfully'}), 200
-        else:
+        if not is_batch:
+            if removed:
+                return jsonify({'message': 'Scholarship removed successfully'}), 200
+            # Keep the single-id 404 for unknown scholarships
+            if not db.session.query(Scholarship.id).filter_by(id=scholarship_ids[0]).first():
+                return jsonify({'error': 'Scholarship not found'}), 404
             return jsonify({'message': 'Scholarship not in saved list'}), 200
+        removed_ids = set(removed)
+        return jsonify({
+            'message': f'{len(removed)} scholarships removed',
+            'removed': removed,
+            'not_saved': [scholarship_id for scholarship_id in scholarship_ids if scholarship_id not in removed_ids]
+        }), 200
         
     except Exception as e:
         db.session.rollback()
@@ -289,6 +650,9 @@ def get_scholarship_details(scholarship_id):
             'provider': scholarship.provider,
             'amount': scholarship.amount,
             'currency': scholarship.currency,
+            'amount_min': scholarship.amount_min,
+            'amount_max': scholarship.amount_max,
+            'amount_currency': CANONICAL_CURRENCY,
             'application_deadline': scholarship.application_deadline.isoformat(),
             'website_url': scholarship.website_url,
             'country': scholarship.country,
@@ -0,0 +1,128 @@
+"""
+Cache Service - In-memory TTL cache with tag-based invalidation
+
+Every entry remembers the generation of each tag it depends on. Bumping a
+tag's generation makes all dependent entries stale in O(1), no key scans.
+
+Generations come from one clock, so cache_token() taken before reading
+the data lets set_cache() refuse a value that an invalidation overtook
+while it was being read.
+
+The cache lives in each process. Invalidations reach only the process
+that makes them, so CLI jobs do not call them; other processes catch up
+when their entries expire (each caller's TTL is the staleness bound).
+"""
+
+import threading
+from datetime import datetime, timedelta
+
+
+class TaggedCache:
+    """TTL cache whose entries are invalidated through tag generations"""
+    
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = {}  # key -> (value, expiry, ((tag, generation), ...))
+        self._generations = {}  # tag -> (clock value at its last invalidation, when)
+        self._clock = 0
+        self._max_seconds = 0  # Longest TTL seen; older generations guard nothing
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """Get cached value if not expired and none of its tags were bumped"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            
+            value, expiry, tags = entry
+            if datetime.utcnow() >= expiry or any(
+                self._generation(tag) != generation for tag, generation in tags
+            ):
+                del self._entries[key]
+                return None
+            return value
+    
+    def token(self):
+        """Clock value to take before reading data that will be cached"""
+        with self._lock:
+            return self._clock
+    
+    def set(self, key, value, seconds, tags=(), since=None):
+        """
+        Cache value for seconds, depending on the given tags
+        
+        With since (a token() from before the value was read), the value is
+        dropped if any of its tags was invalidated in the meantime.
+        """
+        with self._lock:
+            self._max_seconds = max(self._max_seconds, seconds)
+            if len(self._entries) >= self.max_entries and key not in self._entries:
+                self._prune()
+            snapshot = tuple((tag, self._generation(tag)) for tag in tags)
+            if since is not None and any(generation > since for _, generation in snapshot):
+                return
+            self._entries[key] = (value, datetime.utcnow() + timedelta(seconds=seconds), snapshot)
+    
+    def delete(self, key):
+        """Drop a single key"""
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def invalidate(self, *tags):
+        """Invalidate every entry depending on any of the tags"""
+        with self._lock:
+            self._clock += 1
+            now = datetime.utcnow()
+            for tag in tags:
+                self._generations[tag] = (self._clock, now)
+            if len(self._generations) >= self.max_entries:
+                self._prune_generations()
+    
+    def _generation(self, tag):
+        """Current generation of a tag, 0 if never invalidated (lock held)"""
+        return self._generations.get(tag, (0, None))[0]
+    
+    def _prune(self):
+        """Drop expired entries, then the oldest quarter if still full (lock held)"""
+        now = datetime.utcnow()
+        for key in [key for key, (_, expiry, _) in self._entries.items() if now >= expiry]:
+            del self._entries[key]
+        
+        if len(self._entries) >= self.max_entries:
+            # Dicts keep insertion order, so the first keys are the oldest writes
+            for key in list(self._entries)[:self.max_entries // 4]:
+                del self._entries[key]
+        
+        self._prune_generations()
+    
+    def _prune_generations(self):
+        """
+        Forget invalidations older than the longest TTL (lock held)
+        
+        Every entry snapshotted before such an invalidation has expired by
+        now; one snapshotted after it just misses once more.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=self._max_seconds)
+        for tag in [tag for tag, (_, invalidated_at) in self._generations.items() if invalidated_at < cutoff]:
+            del self._generations[tag]
+
+
+# Shared instance for all blueprints
+_cache = TaggedCache()
+
+def get_cached(key):
+    """Get cached value if present and still valid"""
+    return _cache.get(key)
+
+def cache_token():
+    """Take before reading data to cache; pass to set_cache as since"""
+    return _cache.token()
+
+def set_cache(key, value, seconds=300, tags=(), since=None):
+    """Set cache with expiry and dependency tags, unless invalidated since the token"""
+    _cache.set(key, value, seconds, tags, since)
+
+def invalidate_tags(*tags):
+    """Invalidate all cache entries depending on any of the tags"""
+    _cache.invalidate(*tags)
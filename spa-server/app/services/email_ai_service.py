@@ -5,7 +5,9 @@ Email AI Service - Using Gemini for summarization
 import os
 import json
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import google.generativeai as genai
+from app.services.email_categorizer import get_categorizer
 
 
 class EmailAIService:
@@ -17,6 +19,28 @@ class EmailAIService:
         'shopping', 'promotions', 'spam', 'other'
     ]
     
+    # Summarization limits
+    MAX_BODY_CHARS = 8000
+    MAX_WORKERS = int(os.getenv('EMAIL_AI_MAX_WORKERS', 4))
+    
+    # Packing short emails into one prompt
+    PACK_MAX_BODY_CHARS = 1500
+    PACK_MAX_EMAILS = 5
+    PACK_MAX_PROMPT_CHARS = 6000
+    
+    # Map-reduce for emails longer than MAX_BODY_CHARS
+    CHUNK_CHARS = 6000
+    SMALL_CHUNK_CHARS = 800  # Passed to the merge step as-is, no map call
+    MAX_CHUNKS = 30
+    
+    # Reply and forward headers start a new section, so chunks of older
+    # messages keep the same text (and hash) when a thread grows
+    SECTION_BOUNDARY = re.compile(
+        r'^(?:On .{1,200}wrote:|-{2,}\s*(?:Original Message|Forwarded message)\s*-{2,}|_{10,}|From: .+)$',
+        re.IGNORECASE | re.MULTILINE
+    )
+    QUOTE_PREFIX = re.compile(r'^[ \t]*(?:>[ \t]?)+', re.MULTILINE)
+    
     def __init__(self):
         """Initialize AI clients"""
         self.gemini_model = None
@@ -55,38 +79,8 @@ class EmailAIService:
     
     def _quick_categorize(self, subject, sender_email, snippet):
         """Quick rule-based categorization"""
-        subject_lower = (subject or '').lower()
-        sender_lower = (sender_email or '').lower()
-        snippet_lower = (snippet or '').lower()
-        
-        combined = f"{subject_lower} {sender_lower} {snippet_lower}"
-        
-        # Finance keywords
-        finance_keywords = ['invoice', 'payment', 'bank', 'transaction', 'receipt', 
-                           'billing', 'card', 'account statement', 'paypal', 'stripe']
-        if any(kw in combined for kw in finance_keywords):
-            return 'finance'
-        
-        # Shopping keywords
-        shopping_keywords = ['order', 'shipped', 'delivery', 'tracking', 'amazon', 
-                            'ebay', 'purchase', 'cart', 'discount']
-        if any(kw in combined for kw in shopping_keywords):
-            return 'shopping'
-        
-        # Spam/Promotions indicators
-        spam_keywords = ['unsubscribe', 'click here', 'limited time', 'act now', 
-                        'congratulations', 'winner', 'claim your', 'viagra']
-        spam_domains = ['noreply@', 'no-reply@', 'notifications@']
-        if any(kw in combined for kw in spam_keywords) or any(d in sender_lower for d in spam_domains):
-            return 'promotions'
-        
-        # Work-related
-        work_keywords = ['meeting', 'deadline', 'project', 'team', 'report', 
-                        'presentation', 'schedule', 'calendar']
-        if any(kw in combined for kw in work_keywords):
-            return 'work'
-        
-        return None
+        match = get_categorizer().classify(subject, sender_email, snippet)
+        return match.category if match else None
     
     def summarize_email(self, subject, sender_name, body_text):
         """
@@ -101,9 +95,8 @@ class EmailAIService:
             dict: Summary data
         """
         # Truncate body if too long
-        max_chars = 8000
-        if len(body_text) > max_chars:
-            body_text = body_text[:max_chars] + "..."
+        if len(body_text) > self.MAX_BODY_CHARS:
+            body_text = body_text[:self.MAX_BODY_CHARS] + "..."
         
         # Try Gemini
         if self.gemini_model:
@@ -144,60 +137,387 @@ SENTIMENT: [positive/neutral/negative]"""
 
         try:
             response = self.gemini_model.generate_content(prompt)
-            text = response.text
-            
-            # Parse the response
-            summary_match = re.search(r'SUMMARY:\s*(.+?)(?=KEY POINTS:|$)', text, re.DOTALL)
-            key_points_match = re.search(r'KEY POINTS:\s*(.+?)(?=ACTION ITEMS:|$)', text, re.DOTALL)
-            action_items_match = re.search(r'ACTION ITEMS:\s*(.+?)(?=PRIORITY:|$)', text, re.DOTALL)
-            priority_match = re.search(r'PRIORITY:\s*(\w+)', text)
-            sentiment_match = re.search(r'SENTIMENT:\s*(\w+)', text)
-            
-            # Extract and clean data
-            summary_text = summary_match.group(1).strip() if summary_match else text[:200]
-            
-            # Extract key points
-            key_points = []
-            if key_points_match:
-                points_text = key_points_match.group(1)
-                key_points = [
-                    p.strip().lstrip('- •*').strip() 
-                    for p in points_text.split('\n') 
-                    if p.strip() and p.strip() not in ['', '-', '•', '*']
-                ][:5]  # Max 5 points
-            
-            # Extract action items
-            action_items = []
-            if action_items_match:
-                actions_text = action_items_match.group(1)
-                action_items = [
-                    a.strip().lstrip('- •*').strip() 
-                    for a in actions_text.split('\n') 
-                    if a.strip() and a.strip().lower() not in ['', '-', '•', '*', 'none', 'n/a']
-                ][:5]  # Max 5 actions
-            
-            priority = priority_match.group(1).lower() if priority_match else 'medium'
-            sentiment = sentiment_match.group(1).lower() if sentiment_match else 'neutral'
-            
-            # Validate priority and sentiment
-            if priority not in ['low', 'medium', 'high', 'urgent']:
-                priority = 'medium'
-            if sentiment not in ['positive', 'neutral', 'negative']:
-                sentiment = 'neutral'
-            
-            return {
-                'summary_text': summary_text,
-                'key_points': key_points,
-                'action_items': action_items,
-                'priority': priority,
-                'sentiment': sentiment,
-                'model_used': 'gemini-pro'
-            }
+            return self._parse_summary_response(response.text)
             
         except Exception as e:
             print(f"Gemini parsing error: {e}")
             raise
     
+    def _parse_summary_response(self, text):
+        """Parse the SUMMARY / KEY POINTS / ... response format into summary data"""
+        summary_match = re.search(r'SUMMARY:\s*(.+?)(?=KEY POINTS:|$)', text, re.DOTALL)
+        key_points_match = re.search(r'KEY POINTS:\s*(.+?)(?=ACTION ITEMS:|$)', text, re.DOTALL)
+        action_items_match = re.search(r'ACTION ITEMS:\s*(.+?)(?=PRIORITY:|$)', text, re.DOTALL)
+        priority_match = re.search(r'PRIORITY:\s*(\w+)', text)
+        sentiment_match = re.search(r'SENTIMENT:\s*(\w+)', text)
+        
+        # Extract and clean data
+        summary_text = summary_match.group(1).strip() if summary_match else text[:200]
+        
+        # Extract key points
+        key_points = []
+        if key_points_match:
+            points_text = key_points_match.group(1)
+            key_points = [
+                p.strip().lstrip('- •*').strip() 
+                for p in points_text.split('\n') 
+                if p.strip() and p.strip() not in ['', '-', '•', '*']
+            ][:5]  # Max 5 points
+        
+        # Extract action items
+        action_items = []
+        if action_items_match:
+            actions_text = action_items_match.group(1)
+            action_items = [
+                a.strip().lstrip('- •*').strip() 
+                for a in actions_text.split('\n') 
+                if a.strip() and a.strip().lower() not in ['', '-', '•', '*', 'none', 'n/a']
+            ][:5]  # Max 5 actions
+        
+        priority = priority_match.group(1).lower() if priority_match else 'medium'
+        sentiment = sentiment_match.group(1).lower() if sentiment_match else 'neutral'
+        
+        # Validate priority and sentiment
+        if priority not in ['low', 'medium', 'high', 'urgent']:
+            priority = 'medium'
+        if sentiment not in ['positive', 'neutral', 'negative']:
+            sentiment = 'neutral'
+        
+        return {
+            'summary_text': summary_text,
+            'key_points': key_points,
+            'action_items': action_items,
+            'priority': priority,
+            'sentiment': sentiment,
+            'model_used': 'gemini-pro'
+        }
+    
+    def summarize_batch(self, items, max_workers=None):
+        """
+        Summarize many emails on a bounded worker pool
+        
+        Short emails are packed several to a prompt; long ones get their own call.
+        
+        Args:
+            items: List of dicts with 'key', 'subject', 'sender_name', 'body_text'
+            max_workers: Pool size (defaults to EMAIL_AI_MAX_WORKERS)
+        
+        Yields:
+            tuple: (key, summary data) in completion order
+        """
+        if not items:
+            return
+        
+        for item in items:
+            if len(item['body_text']) > self.MAX_BODY_CHARS:
+                item['body_text'] = item['body_text'][:self.MAX_BODY_CHARS] + "..."
+        
+        if not self.gemini_model:
+            for item in items:
+                yield item['key'], self._fallback_summary(item['subject'], item['body_text'])
+            return
+        
+        max_workers = max_workers or self.MAX_WORKERS
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self._summarize_group, group): group
+                for group in self._pack_items(items)
+            }
+            for future in as_completed(futures):
+                group = futures[future]
+                try:
+                    results = future.result()
+                except Exception as e:
+                    print(f"Gemini batch summarization failed: {e}")
+                    results = {
+                        item['key']: self._fallback_summary(item['subject'], item['body_text'])
+                        for item in group
+                    }
+                for item in group:
+                    yield item['key'], results[item['key']]
+    
+    def _pack_items(self, items):
+        """Group short emails into shared prompts, long emails go alone"""
+        groups = []
+        current = []
+        current_chars = 0
+        
+        for item in items:
+            size = len(item['body_text'])
+            if size > self.PACK_MAX_BODY_CHARS:
+                groups.append([item])
+                continue
+            
+            if current and (len(current) >= self.PACK_MAX_EMAILS or
+                            current_chars + size > self.PACK_MAX_PROMPT_CHARS):
+                groups.append(current)
+                current = []
+                current_chars = 0
+            
+            current.append(item)
+            current_chars += size
+        
+        if current:
+            groups.append(current)
+        return groups
+    
+    def _summarize_group(self, group):
+        """Summarize one packed group, returns {key: summary data}"""
+        if len(group) == 1:
+            item = group[0]
+            return {item['key']: self.summarize_email(item['subject'], item['sender_name'], item['body_text'])}
+        
+        emails_text = "\n\n".join(
+            f"=== EMAIL {index} ===\nSubject: {item['subject']}\nFrom: {item['sender_name']}\n\n{item['body_text']}"
+            for index, item in enumerate(group, start=1)
+        )
+        prompt = f"""Analyze each of the following {len(group)} emails separately and provide a concise summary for each.
+
+{emails_text}
+
+For EVERY email, start a block with its marker line (e.g. === EMAIL 1 ===) and then use this exact format (no markdown, no code blocks):
+
+SUMMARY:
+[2-3 sentence summary of the email]
+
+KEY POINTS:
+- [First key point]
+- [Second key point]
+- [Third key point]
+
+ACTION ITEMS:
+- [Action item 1 if any, or write "None"]
+- [Action item 2 if any]
+
+PRIORITY: [low/medium/high/urgent]
+SENTIMENT: [positive/neutral/negative]"""
+
+        response = self.gemini_model.generate_content(prompt)
+        sections = re.split(r'===\s*EMAIL\s+(\d+)\s*===', response.text)
+        
+        # re.split with a group gives [preamble, index, block, index, block, ...]
+        parsed = {}
+        for index, block in zip(sections[1::2], sections[2::2]):
+            position = int(index) - 1
+            if 0 <= position < len(group) and 'SUMMARY:' in block:
+                parsed[group[position]['key']] = self._parse_summary_response(block)
+        
+        # Anything the model dropped gets its own call
+        for item in group:
+            if item['key'] not in parsed:
+                parsed[item['key']] = self.summarize_email(item['subject'], item['sender_name'], item['body_text'])
+        return parsed
+    
+    def split_into_chunks(self, body_text):
+        """
+        Split a long body on structural boundaries
+        
+        Sections break after reply/forward headers; each section is packed
+        paragraph by paragraph into chunks of at most CHUNK_CHARS. Quote
+        markers are dropped so a quoted message chunks like the original.
+        
+        Returns:
+            tuple: (chunk strings in body order, at most MAX_CHUNKS;
+            True when chunks past MAX_CHUNKS were dropped)
+        """
+        text = self.QUOTE_PREFIX.sub('', body_text.replace('\r\n', '\n'))
+        
+        # The header line stays with the reply above it, so the quoted text matches the original
+        starts = [0] + [match.end() for match in self.SECTION_BOUNDARY.finditer(text) if match.start() > 0]
+        sections = [text[start:end] for start, end in zip(starts, starts[1:] + [len(text)])]
+        
+        chunks = []
+        for section in sections:
+            chunks.extend(self._pack_paragraphs(section))
+        return chunks[:self.MAX_CHUNKS], len(chunks) > self.MAX_CHUNKS
+    
+    def _pack_paragraphs(self, section):
+        """Greedy paragraph packing; oversized paragraphs are cut at sentence or line ends"""
+        pieces = []
+        for paragraph in re.split(r'\n\s*\n', section):
+            paragraph = paragraph.strip()
+            while len(paragraph) > self.CHUNK_CHARS:
+                cut = max(paragraph.rfind('. ', 0, self.CHUNK_CHARS), paragraph.rfind('\n', 0, self.CHUNK_CHARS)) + 1
+                if cut < self.CHUNK_CHARS // 2:
+                    cut = self.CHUNK_CHARS
+                pieces.append(paragraph[:cut].strip())
+                paragraph = paragraph[cut:].strip()
+            if paragraph:
+                pieces.append(paragraph)
+        
+        chunks = []
+        current = ''
+        for piece in pieces:
+            if current and len(current) + len(piece) + 2 > self.CHUNK_CHARS:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current}\n\n{piece}" if current else piece
+        if current:
+            chunks.append(current)
+        return chunks
+    
+    def summarize_chunked(self, subject, sender_name, chunks, known=None, truncated=False):
+        """
+        Map-reduce summary of a long email
+        
+        Chunks are summarized concurrently (skipping ones already in known),
+        then the partial summaries are merged in one final call.
+        
+        Args:
+            chunks: List of (content_hash, text) in body order
+            known: {content_hash: partial summary} from earlier runs
+            truncated: The chunks stop before the end of the email
+        
+        Returns:
+            tuple: (summary data, {content_hash: partial summary} for new chunks)
+        """
+        known = known or {}
+        if not self.gemini_model:
+            return self._fallback_summary(subject, chunks[0][1] if chunks else ''), {}
+        
+        partials = dict(known)
+        new_partials = {}
+        to_map = {}
+        for content_hash, text in chunks:
+            if content_hash in partials:
+                continue
+            if len(text) <= self.SMALL_CHUNK_CHARS:
+                partials[content_hash] = text
+            else:
+                to_map[content_hash] = text
+        
+        if to_map:
+            with ThreadPoolExecutor(max_workers=min(self.MAX_WORKERS, len(to_map))) as executor:
+                futures = {
+                    executor.submit(self._summarize_chunk, subject, text): content_hash
+                    for content_hash, text in to_map.items()
+                }
+                for future in as_completed(futures):
+                    content_hash = futures[future]
+                    try:
+                        partials[content_hash] = new_partials[content_hash] = future.result()
+                    except Exception as e:
+                        # Not cached, so the next run tries again
+                        print(f"Gemini chunk summarization failed: {e}")
+                        partials[content_hash] = to_map[content_hash][:self.SMALL_CHUNK_CHARS]
+        
+        notes = "\n\n".join(
+            f"--- Part {index} of {len(chunks)} ---\n{partials[content_hash]}"
+            for index, (content_hash, _) in enumerate(chunks, start=1)
+        )
+        
+        coverage = (
+            " They only cover the beginning; the rest of the email was too long to read, so do not guess at it."
+            if truncated else ""
+        )
+        prompt = f"""The notes below cover consecutive parts of one long email.{coverage} Combine them into a single concise summary of the whole email.
+
+Subject: {subject}
+From: {sender_name}
+
+{notes}
+
+Provide your response in this exact format (no markdown, no code blocks):
+
+SUMMARY:
+[2-3 sentence summary of the email]
+
+KEY POINTS:
+- [First key point]
+- [Second key point]
+- [Third key point]
+
+ACTION ITEMS:
+- [Action item 1 if any, or write "None"]
+- [Action item 2 if any]
+
+PRIORITY: [low/medium/high/urgent]
+SENTIMENT: [positive/neutral/negative]"""
+
+        try:
+            response = self.gemini_model.generate_content(prompt)
+            return self._parse_summary_response(response.text), new_partials
+        except Exception as e:
+            print(f"Gemini summary merge failed: {e}")
+            return self._fallback_summary(subject, notes), new_partials
+    
+    def _summarize_chunk(self, subject, text):
+        """Map step: short factual notes for one chunk"""
+        prompt = f"""This is one part of a longer email with the subject "{subject}".
+Write brief plain-text notes (at most 120 words) on this part only: the main points, any requests or deadlines, and any names, dates or amounts that matter. No markdown.
+
+{text}"""
+        response = self.gemini_model.generate_content(prompt)
+        return response.text.strip()
+    
+    def summarize_thread(self, subject, messages, previous=None):
+        """
+        Summarize a thread, folding new messages into an earlier summary
+        
+        Args:
+            subject: Thread subject
+            messages: New messages as dicts with 'sender_name', 'email_date', 'body_text' (oldest first)
+            previous: Summary data from the last run, or None for a fresh thread
+        
+        Returns:
+            dict: Summary data
+        """
+        per_message = max(self.MAX_BODY_CHARS // max(len(messages), 1), 500)
+        conversation = "\n\n".join(
+            f"--- {message['sender_name']} ({message['email_date']}) ---\n"
+            f"{message['body_text'][:per_message]}"
+            for message in messages
+        )
+        
+        if not self.gemini_model:
+            return self._fallback_summary(subject, conversation)
+        
+        if previous:
+            context = f"""Existing summary of the earlier messages in this conversation:
+{previous['summary_text']}
+
+Earlier key points:
+{chr(10).join('- ' + point for point in previous.get('key_points') or [])}
+
+Earlier action items:
+{chr(10).join('- ' + item for item in previous.get('action_items') or []) or '- None'}
+
+New messages since that summary:"""
+        else:
+            context = "Messages in this conversation:"
+        
+        prompt = f"""Analyze this email conversation and provide a concise summary of the whole thread.
+
+Subject: {subject}
+
+{context}
+{conversation}
+
+Provide your response in this exact format (no markdown, no code blocks):
+
+SUMMARY:
+[2-3 sentence summary of the whole conversation so far]
+
+KEY POINTS:
+- [First key point]
+- [Second key point]
+- [Third key point]
+
+ACTION ITEMS:
+- [Open action item 1 if any, or write "None"]
+- [Open action item 2 if any]
+
+PRIORITY: [low/medium/high/urgent]
+SENTIMENT: [positive/neutral/negative]"""
+
+        try:
+            response = self.gemini_model.generate_content(prompt)
+            return self._parse_summary_response(response.text)
+        except Exception as e:
+            print(f"Gemini thread summarization failed: {e}")
+            return self._fallback_summary(subject, conversation)
+    
     def _fallback_summary(self, subject, body_text):
         """Simple fallback when AI is not available"""
         # Extract first few sentences
@@ -0,0 +1,152 @@
+"""
+Email Body Store - Persistent, size-capped cache of full message bodies
+"""
+
+import os
+import zlib
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app import db
+from app.models.email_summarizer import EmailBody
+
+
+class EmailBodyStore:
+    """Compressed body storage with LRU eviction"""
+    
+    MAX_TOTAL_BYTES = int(os.getenv('EMAIL_BODY_STORE_MAX_BYTES', 256 * 1024 * 1024))
+    MAX_BODY_BYTES = 2 * 1024 * 1024  # Skip pathological messages
+    
+    # Sync prefill window
+    PREFILL_DAYS = 2
+    PREFILL_LIMIT = 25
+    
+    # Avoid a write per read just to bump the LRU clock
+    TOUCH_INTERVAL = timedelta(hours=1)
+    
+    def get(self, email_id):
+        """Get body data for one email, or None if not stored"""
+        return self.get_many([email_id]).get(email_id)
+    
+    def get_many(self, email_ids):
+        """
+        Get stored bodies for several emails
+        
+        Returns:
+            dict: {email_id: {'body_text', 'body_html', 'truncated', 'attachments', 'links'}}
+        """
+        if not email_ids:
+            return {}
+        
+        rows = EmailBody.query.filter(EmailBody.email_id.in_(list(email_ids))).all()
+        
+        now = datetime.utcnow()
+        stale = [row.email_id for row in rows if now - row.last_accessed_at > self.TOUCH_INTERVAL]
+        if stale:
+            EmailBody.query.filter(EmailBody.email_id.in_(stale)).update(
+                {'last_accessed_at': now}, synchronize_session=False
+            )
+            db.session.commit()
+        
+        return {row.email_id: self._unpack(row) for row in rows}
+    
+    def put(self, email_id, body_data):
+        """Store body data as returned by the detail view"""
+        self.put_many({email_id: body_data})
+    
+    def put_many(self, bodies):
+        """
+        Store several bodies in one upsert
+        
+        Args:
+            bodies: {email_id: {'body_text', 'body_html', 'truncated', 'attachments', 'links'}}
+        """
+        now = datetime.utcnow()
+        rows = []
+        for email_id, body_data in bodies.items():
+            text_data = zlib.compress((body_data.get('body_text') or '').encode('utf-8'))
+            html_data = zlib.compress((body_data.get('body_html') or '').encode('utf-8'))
+            size_bytes = len(text_data) + len(html_data)
+            if size_bytes > self.MAX_BODY_BYTES:
+                continue
+            
+            rows.append({
+                'email_id': email_id,
+                'text_data': text_data,
+                'html_data': html_data,
+                'truncated': bool(body_data.get('truncated')),
+                'attachments': body_data.get('attachments') or [],
+                'links': body_data.get('links') or [],
+                'size_bytes': size_bytes,
+                'last_accessed_at': now,
+                'created_at': now
+            })
+        
+        if not rows:
+            return
+        
+        stmt = pg_insert(EmailBody).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['email_id'],
+            set_={
+                'text_data': stmt.excluded.text_data,
+                'html_data': stmt.excluded.html_data,
+                'truncated': stmt.excluded.truncated,
+                'attachments': stmt.excluded.attachments,
+                'links': stmt.excluded.links,
+                'size_bytes': stmt.excluded.size_bytes,
+                'last_accessed_at': stmt.excluded.last_accessed_at
+            }
+        )
+        db.session.execute(stmt)
+        db.session.commit()
+    
+    def evict(self):
+        """
+        Drop least-recently-used bodies until the store is under its cap
+        
+        Returns:
+            int: Number of bodies evicted
+        """
+        total = db.session.query(func.coalesce(func.sum(EmailBody.size_bytes), 0)).scalar()
+        if total <= self.MAX_TOTAL_BYTES:
+            return 0
+        
+        # Keep the most recently used bodies that fit in 90% of the cap
+        running = select(
+            EmailBody.email_id,
+            func.sum(EmailBody.size_bytes).over(
+                order_by=(EmailBody.last_accessed_at.desc(), EmailBody.email_id.desc())
+            ).label('running_bytes')
+        ).subquery()
+        overflow = select(running.c.email_id).where(
+            running.c.running_bytes > int(self.MAX_TOTAL_BYTES * 0.9)
+        )
+        
+        evicted = EmailBody.query.filter(EmailBody.email_id.in_(overflow)).delete(
+            synchronize_session=False
+        )
+        db.session.commit()
+        print(f"🧹 Evicted {evicted} stored email bodies")
+        return evicted
+    
+    def _unpack(self, row):
+        """Decompress a stored row into body data"""
+        return {
+            'body_text': zlib.decompress(row.text_data).decode('utf-8') if row.text_data else '',
+            'body_html': zlib.decompress(row.html_data).decode('utf-8') if row.html_data else '',
+            'truncated': row.truncated,
+            'attachments': row.attachments or [],
+            'links': row.links or []
+        }
+
+
+# Singleton instance
+_body_store = None
+
+def get_body_store():
+    """Get or create body store instance"""
+    global _body_store
+    if _body_store is None:
+        _body_store = EmailBodyStore()
+    return _body_store
@@ -0,0 +1,133 @@
+"""
+Email Categorizer - Compiled keyword rules for rule-based categorization
+
+All keyword tables are compiled into one regex. Rules are checked in
+priority order, so a batch of emails is classified in a single scan
+with the same result as testing each keyword list in turn.
+"""
+
+import bisect
+import hashlib
+import re
+from collections import namedtuple
+
+
+# Ordered by priority: the first category whose keyword appears wins
+KEYWORD_RULES = [
+    ('finance', ['invoice', 'payment', 'bank', 'transaction', 'receipt',
+                 'billing', 'card', 'account statement', 'paypal', 'stripe']),
+    ('shopping', ['order', 'shipped', 'delivery', 'tracking', 'amazon',
+                  'ebay', 'purchase', 'cart', 'discount']),
+    ('promotions', ['unsubscribe', 'click here', 'limited time', 'act now',
+                    'congratulations', 'winner', 'claim your', 'viagra']),
+    ('work', ['meeting', 'deadline', 'project', 'team', 'report',
+              'presentation', 'schedule', 'calendar']),
+]
+
+# Matched against the sender address only
+SENDER_RULES = [
+    ('promotions', ['noreply@', 'no-reply@', 'notifications@']),
+]
+
+# Which rule fired, e.g. ('finance', 'keyword:invoice') or ('promotions', 'sender:noreply@')
+CategoryMatch = namedtuple('CategoryMatch', ['category', 'rule'])
+
+_SEPARATOR = '\x00'
+
+
+class EmailCategorizer:
+    """Single-pass keyword categorizer built once from the rule tables"""
+    
+    def __init__(self, keyword_rules=KEYWORD_RULES, sender_rules=SENDER_RULES):
+        self.keyword_rules = keyword_rules
+        self.sender_rules = sender_rules
+        
+        self._priorities = {}
+        for category, _ in keyword_rules + sender_rules:
+            self._priorities.setdefault(category, len(self._priorities))
+        
+        self._keyword_pattern = self._compile(keyword_rules)
+        self._sender_pattern = self._compile(sender_rules)
+        
+        # Changes whenever the rule tables do
+        self.version = hashlib.md5(repr((keyword_rules, sender_rules)).encode()).hexdigest()[:12]
+    
+    def _compile(self, rules):
+        """
+        One alternation per category inside a lookahead
+        
+        The lookahead makes matches zero-width, so every position is tried
+        and overlapping keywords are never skipped (same as `kw in text`).
+        At a position, categories are tried in priority order.
+        """
+        groups = [
+            f"(?P<r{index}>{'|'.join(re.escape(keyword) for keyword in sorted(keywords, key=len, reverse=True))})"
+            for index, (_, keywords) in enumerate(rules)
+        ]
+        return re.compile(f"(?=(?:{'|'.join(groups)}))")
+    
+    def classify(self, subject, sender_email, snippet):
+        """
+        Categorize one email
+        
+        Returns:
+            CategoryMatch or None if no rule fires
+        """
+        return self.classify_batch([(subject, sender_email, snippet)])[0]
+    
+    def classify_batch(self, emails):
+        """
+        Categorize many emails with one regex scan over the whole batch
+        
+        Args:
+            emails: Iterable of (subject, sender_email, snippet) tuples
+        
+        Returns:
+            list: CategoryMatch or None per email, in input order
+        """
+        emails = list(emails)
+        if not emails:
+            return []
+        
+        texts = []
+        senders = []
+        for subject, sender_email, snippet in emails:
+            sender_lower = (sender_email or '').lower()
+            texts.append(f"{(subject or '').lower()} {sender_lower} {(snippet or '').lower()}")
+            senders.append(sender_lower)
+        
+        best = [None] * len(emails)
+        self._scan(self._keyword_pattern, self.keyword_rules, texts, best, 'keyword')
+        self._scan(self._sender_pattern, self.sender_rules, senders, best, 'sender')
+        
+        return [CategoryMatch(match[1], match[2]) if match else None for match in best]
+    
+    def _scan(self, pattern, rules, texts, best, kind):
+        """Run pattern over the joined texts, keeping the best match per text"""
+        # Start offset of each text in the joined string
+        starts = []
+        offset = 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text) + len(_SEPARATOR)
+        
+        for match in pattern.finditer(_SEPARATOR.join(texts)):
+            index = bisect.bisect_right(starts, match.start()) - 1
+            group = match.lastgroup
+            category = rules[int(group[1:])][0]
+            priority = self._priorities[category]
+            
+            current = best[index]
+            if current is None or priority < current[0]:
+                best[index] = (priority, category, f"{kind}:{match.group(group)}")
+
+
+# Singleton instance
+_categorizer = None
+
+def get_categorizer():
+    """Get or create categorizer instance"""
+    global _categorizer
+    if _categorizer is None:
+        _categorizer = EmailCategorizer()
+    return _categorizer
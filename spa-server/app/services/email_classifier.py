@@ -0,0 +1,281 @@
+"""
+Email Classifier - Locally trained category model
+
+Multinomial naive Bayes over hashed token features, in NumPy. It covers
+emails that no keyword rule matches. Training uses stored emails labelled
+by rules or by users, and user corrections count extra. The model's own
+predictions are never trained on.
+
+Only `flask email train-classifier` writes the model file; every process
+reloads it when its mtime changes. Corrections are also learned in memory
+on a background thread so they apply at once, and they are stored on the
+email row, so the next training run makes them permanent.
+"""
+
+import os
+import queue
+import re
+import threading
+import zlib
+import numpy as np
+from app.models.email_summarizer import EMAIL_CATEGORIES
+
+
+class EmailCategoryClassifier:
+    """Hashed-feature naive Bayes with incremental updates"""
+    
+    N_FEATURES = 2 ** 18
+    ALPHA = 0.1  # Laplace smoothing
+    MIN_CONFIDENCE = 0.8
+    MIN_TRAINING_EMAILS = 50
+    USER_WEIGHT = 5.0  # A correction outweighs several rule-labelled emails
+    
+    # 'important' comes from Gmail labels, not from content
+    CLASSES = [category for category in EMAIL_CATEGORIES if category != 'important']
+    
+    TOKEN_PATTERN = re.compile(r'[a-z0-9]{2,}')
+    
+    def __init__(self, model_path=None):
+        self.model_path = model_path
+        self._class_index = {category: index for index, category in enumerate(self.CLASSES)}
+        self._lock = threading.Lock()
+        self._reset()
+        self._queue = queue.Queue()
+        self._worker = None
+        self._loaded_mtime = None
+    
+    def _reset(self):
+        self.feature_counts = np.zeros((len(self.CLASSES), self.N_FEATURES), dtype=np.float32)
+        self.class_counts = np.zeros(len(self.CLASSES), dtype=np.float64)
+        self._log_prior = None
+        self._feature_log_prob = None
+    
+    # ------------------------------------------------------------------
+    # Features
+    # ------------------------------------------------------------------
+    
+    def features(self, subject, sender_email, snippet):
+        """Hashed feature indices for one email (binary bag of tokens)"""
+        sender = (sender_email or '').lower()
+        local, _, domain = sender.partition('@')
+        tokens = set(self.TOKEN_PATTERN.findall(f"{subject or ''} {snippet or ''}".lower()))
+        tokens.add(f"from:{local}")
+        tokens.add(f"domain:{domain}")
+        return [zlib.crc32(token.encode('utf-8')) % self.N_FEATURES for token in tokens]
+    
+    # ------------------------------------------------------------------
+    # Training
+    # ------------------------------------------------------------------
+    
+    def partial_fit(self, examples):
+        """
+        Add labelled examples to the model
+        
+        Args:
+            examples: Iterable of (subject, sender_email, snippet, category, weight)
+        """
+        rows = []
+        for subject, sender_email, snippet, category, weight in examples:
+            class_index = self._class_index.get(category)
+            if class_index is not None:
+                rows.append((class_index, self.features(subject, sender_email, snippet), weight))
+        if not rows:
+            return
+        
+        with self._lock:
+            for class_index, feature_indices, weight in rows:
+                self.feature_counts[class_index, feature_indices] += weight
+                self.class_counts[class_index] += weight
+            self._log_prior = None
+    
+    def fit(self, example_batches):
+        """
+        Train a fresh model and swap it in atomically
+        
+        Args:
+            example_batches: Iterable of example lists as accepted by partial_fit
+        """
+        fresh = EmailCategoryClassifier()
+        for examples in example_batches:
+            fresh.partial_fit(examples)
+        
+        with self._lock:
+            self.feature_counts = fresh.feature_counts
+            self.class_counts = fresh.class_counts
+            self._log_prior = None
+    
+    def _refresh_probabilities(self):
+        """Recompute log probabilities after counts changed (lock held)"""
+        totals = self.feature_counts.sum(axis=1, keepdims=True)
+        self._feature_log_prob = (
+            np.log(self.feature_counts + self.ALPHA) - np.log(totals + self.ALPHA * self.N_FEATURES)
+        ).astype(np.float32)
+        self._log_prior = np.log((self.class_counts + 1.0) / (self.class_counts.sum() + len(self.CLASSES)))
+    
+    # ------------------------------------------------------------------
+    # Inference
+    # ------------------------------------------------------------------
+    
+    @property
+    def is_trained(self):
+        return self.class_counts.sum() >= self.MIN_TRAINING_EMAILS
+    
+    def predict_batch(self, emails):
+        """
+        Predict categories for many emails at once
+        
+        Args:
+            emails: Iterable of (subject, sender_email, snippet)
+        
+        Returns:
+            list: Category or None (not confident / not trained) per email
+        """
+        self._ensure_loaded()
+        emails = list(emails)
+        if not emails or not self.is_trained:
+            return [None] * len(emails)
+        
+        feature_lists = [self.features(*email) for email in emails]
+        lengths = np.array([len(features) for features in feature_lists])
+        flat = np.fromiter((index for features in feature_lists for index in features), dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        
+        with self._lock:
+            if self._log_prior is None:
+                self._refresh_probabilities()
+            # (classes, total tokens) summed per email -> (classes, emails)
+            scores = np.add.reduceat(self._feature_log_prob[:, flat], offsets, axis=1)
+            scores += self._log_prior[:, None]
+        
+        scores -= scores.max(axis=0, keepdims=True)
+        probabilities = np.exp(scores)
+        probabilities /= probabilities.sum(axis=0, keepdims=True)
+        best = probabilities.argmax(axis=0)
+        confidence = probabilities[best, np.arange(len(emails))]
+        
+        predictions = []
+        for class_index, score in zip(best, confidence):
+            category = self.CLASSES[class_index]
+            predictions.append(category if score >= self.MIN_CONFIDENCE and category != 'other' else None)
+        return predictions
+    
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    
+    def save(self):
+        """Write counts to disk (trainer only)"""
+        if not self.model_path:
+            return
+        with self._lock:
+            feature_counts = self.feature_counts.copy()
+            class_counts = self.class_counts.copy()
+        tmp_path = f"{self.model_path}.tmp.npz"
+        np.savez_compressed(tmp_path, feature_counts=feature_counts, class_counts=class_counts,
+                            classes=np.array(self.CLASSES))
+        os.replace(tmp_path, self.model_path)
+        self._loaded_mtime = os.path.getmtime(self.model_path)
+    
+    def _ensure_loaded(self):
+        """Load saved counts on first use and whenever the trainer wrote a new file"""
+        if not self.model_path:
+            return
+        try:
+            mtime = os.path.getmtime(self.model_path)
+        except OSError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+        self._loaded_mtime = mtime
+        try:
+            data = np.load(self.model_path)
+            if list(data['classes']) == self.CLASSES and data['feature_counts'].shape[1] == self.N_FEATURES:
+                with self._lock:
+                    self.feature_counts = data['feature_counts'].astype(np.float32)
+                    self.class_counts = data['class_counts']
+                    self._log_prior = None
+        except Exception as e:
+            print(f"⚠️ Could not load email classifier: {e}")
+    
+    # ------------------------------------------------------------------
+    # Background training
+    # ------------------------------------------------------------------
+    
+    def learn_async(self, examples):
+        """Queue examples for in-memory training off the request path (not saved)"""
+        self._submit(('learn', list(examples)))
+    
+    def _submit(self, task):
+        self._ensure_loaded()
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name='email-classifier', daemon=True)
+            self._worker.start()
+        self._queue.put(task)
+    
+    def _run(self):
+        while True:
+            kind, payload = self._queue.get()
+            try:
+                if kind == 'learn':
+                    self._ensure_loaded()
+                    self.partial_fit(payload)
+            except Exception as e:
+                print(f"⚠️ Email classifier training failed: {e}")
+            finally:
+                self._queue.task_done()
+
+
+def training_batches(batch_size=5000):
+    """
+    Labelled examples from stored emails, in primary-key batches
+    
+    User corrections are weighted up and rule labels count once. Model
+    labels are left out so the classifier never learns from its own
+    guesses; rule emails that fell through to 'other' carry no signal.
+    """
+    from sqlalchemy import or_
+    from app.models.email_summarizer import Email
+    
+    last_id = 0
+    while True:
+        rows = Email.query.with_entities(
+            Email.id, Email.subject, Email.sender_email, Email.snippet, Email.category, Email.category_source
+        ).filter(
+            Email.id > last_id,
+            Email.category_source.in_(('user', 'rule')),
+            Email.category != 'important',
+            or_(Email.category != 'other', Email.category_source == 'user')
+        ).order_by(Email.id).limit(batch_size).all()
+        if not rows:
+            return
+        
+        yield [
+            (row.subject, row.sender_email, row.snippet, row.category,
+             EmailCategoryClassifier.USER_WEIGHT if row.category_source == 'user' else 1.0)
+            for row in rows
+        ]
+        last_id = rows[-1].id
+
+
+def train_from_database(classifier=None):
+    """Retrain from all stored emails and persist the model"""
+    classifier = classifier or get_classifier()
+    classifier.fit(training_batches())
+    classifier.save()
+    print(f"🧠 Email classifier trained on {int(classifier.class_counts.sum())} weighted examples")
+    return classifier
+
+
+# Singleton instance
+_classifier = None
+
+def get_classifier():
+    """Get or create classifier instance (model stored in the app instance folder)"""
+    global _classifier
+    if _classifier is None:
+        from flask import current_app
+        model_path = os.getenv('EMAIL_CLASSIFIER_PATH') or os.path.join(
+            current_app.instance_path, 'email_classifier.npz'
+        )
+        _classifier = EmailCategoryClassifier(model_path=model_path)
+    return _classifier
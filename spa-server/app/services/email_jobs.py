@@ -0,0 +1,213 @@
+"""
+Email Jobs - Batch maintenance jobs run from the CLI / cron
+
+The jobs run in their own process and cannot reach the web workers'
+in-memory caches; cached mailbox pages pick up their changes when they
+expire (at most 3 minutes).
+"""
+
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import delete, or_, select, text, update
+from app import db
+from app.models.email_summarizer import Email
+from app.services.email_categorizer import get_categorizer
+from app.services.email_classifier import get_classifier
+from app.services.email_stats_service import rebuild_email_stats, record_emails_removed
+
+RETENTION_DAYS = int(os.getenv('EMAIL_RETENTION_DAYS', 5))
+
+
+def recategorize_emails(account_id=None, batch_size=1000):
+    """
+    Re-run the keyword rules over stored emails after the rules change
+    
+    Walks emails by primary key in batches, classifies each batch in one
+    pass and writes only rows whose category changed. Gmail-important
+    emails and user corrections keep their category.
+    
+    Args:
+        account_id: Limit to one account (default: all accounts)
+        batch_size: Rows per batch
+    
+    Returns:
+        dict: {'scanned': n, 'updated': n, 'accounts': n}
+    """
+    categorizer = get_categorizer()
+    scanned = 0
+    updated = 0
+    touched_accounts = set()
+    last_id = 0
+    
+    while True:
+        query = db.session.query(
+            Email.id, Email.account_id, Email.subject, Email.sender_email, Email.snippet,
+            Email.category, Email.category_source
+        ).filter(
+            Email.id > last_id,
+            Email.category != 'important',
+            or_(Email.category_source == None, Email.category_source != 'user')
+        )
+        if account_id is not None:
+            query = query.filter(Email.account_id == account_id)
+        rows = query.order_by(Email.id).limit(batch_size).all()
+        if not rows:
+            break
+        
+        matches = categorizer.classify_batch((row.subject, row.sender_email, row.snippet) for row in rows)
+        changes = []
+        for row, match in zip(rows, matches):
+            if match:
+                category, category_source = match.category, 'rule'
+            elif row.category_source == 'model':
+                continue  # No rule applies, keep the model's call
+            else:
+                category, category_source = 'other', 'rule'
+            
+            if category != row.category:
+                changes.append({'id': row.id, 'category': category, 'category_source': category_source})
+                touched_accounts.add(row.account_id)
+        
+        if changes:
+            db.session.execute(update(Email), changes)
+            db.session.commit()
+        
+        scanned += len(rows)
+        updated += len(changes)
+        last_id = rows[-1].id
+    
+    for touched in touched_accounts:
+        rebuild_email_stats(touched)
+    db.session.commit()
+    
+    print(f"🏷️ Recategorized {updated}/{scanned} emails (rules {categorizer.version})")
+    return {'scanned': scanned, 'updated': updated, 'accounts': len(touched_accounts)}
+
+
+def classify_unmatched_emails(account_id=None, batch_size=1000):
+    """
+    Let the local model categorize stored emails that no rule matched
+    
+    Returns:
+        dict: {'scanned': n, 'updated': n, 'accounts': n}
+    """
+    classifier = get_classifier()
+    scanned = 0
+    updated = 0
+    touched_accounts = set()
+    last_id = 0
+    
+    while True:
+        query = db.session.query(
+            Email.id, Email.account_id, Email.subject, Email.sender_email, Email.snippet
+        ).filter(
+            Email.id > last_id,
+            Email.category == 'other',
+            Email.category_source == 'rule'
+        )
+        if account_id is not None:
+            query = query.filter(Email.account_id == account_id)
+        rows = query.order_by(Email.id).limit(batch_size).all()
+        if not rows:
+            break
+        
+        predictions = classifier.predict_batch((row.subject, row.sender_email, row.snippet) for row in rows)
+        changes = [
+            {'id': row.id, 'category': category, 'category_source': 'model'}
+            for row, category in zip(rows, predictions) if category
+        ]
+        touched_accounts.update(row.account_id for row, category in zip(rows, predictions) if category)
+        
+        if changes:
+            db.session.execute(update(Email), changes)
+            db.session.commit()
+        
+        scanned += len(rows)
+        updated += len(changes)
+        last_id = rows[-1].id
+    
+    for touched in touched_accounts:
+        rebuild_email_stats(touched)
+    db.session.commit()
+    
+    print(f"🧠 Model categorized {updated}/{scanned} uncategorized emails")
+    return {'scanned': scanned, 'updated': updated, 'accounts': len(touched_accounts)}
+
+
+def purge_old_emails(retention_days=RETENTION_DAYS, account_id=None, batch_size=500):
+    """
+    Delete unstarred emails older than the retention window
+    
+    Each batch deletes a bounded set of primary keys in its own short
+    transaction; rows locked by in-flight requests are skipped until the
+    next run. Summaries and stored bodies go with their email through the
+    ON DELETE CASCADE foreign keys, and the deleted rows come back via
+    RETURNING to adjust the stats counters without a recount.
+    
+    Returns:
+        dict: Counts of purged emails, batches, thread summaries, chunk notes and accounts
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    
+    candidates = select(Email.id).where(
+        Email.email_date < cutoff,
+        Email.is_starred == False
+    )
+    if account_id:
+        candidates = candidates.where(Email.account_id == account_id)
+    candidates = candidates.order_by(Email.id).limit(batch_size).with_for_update(skip_locked=True)
+    
+    stmt = delete(Email).where(Email.id.in_(candidates.scalar_subquery())).returning(
+        Email.account_id, Email.is_read, Email.is_starred, Email.category, Email.email_date
+    )
+    
+    purged = 0
+    batches = 0
+    touched_accounts = set()
+    while True:
+        rows = db.session.execute(stmt).all()
+        if not rows:
+            db.session.rollback()
+            break
+        
+        by_account = {}
+        for row in rows:
+            by_account.setdefault(row.account_id, []).append(row)
+        for touched, removed in by_account.items():
+            record_emails_removed(touched, removed)
+        db.session.commit()
+        
+        purged += len(rows)
+        batches += 1
+        touched_accounts.update(by_account)
+        if len(rows) < batch_size:
+            break
+    
+    # Thread summaries are keyed by thread, not by email, so clear orphans separately
+    thread_summaries = db.session.execute(text("""
+        DELETE FROM email_thread_summaries ts
+        WHERE ts.last_email_date < :cutoff
+          AND (CAST(:account_id AS integer) IS NULL OR ts.account_id = :account_id)
+          AND NOT EXISTS (
+              SELECT 1 FROM emails e
+              WHERE e.account_id = ts.account_id AND coalesce(e.thread_id, e.message_id) = ts.thread_id
+          )
+    """), {'cutoff': cutoff, 'account_id': account_id}).rowcount
+    
+    # Chunk notes are shared by content hash rather than owned by an email;
+    # past the retention window they are unlikely to be hit again
+    chunk_summaries = db.session.execute(text("""
+        DELETE FROM email_chunk_summaries cs
+        WHERE cs.created_at < :cutoff
+          AND (CAST(:account_id AS integer) IS NULL OR cs.account_id = :account_id)
+    """), {'cutoff': cutoff, 'account_id': account_id}).rowcount
+    db.session.commit()
+    
+    print(f"🧹 Purged {purged} emails older than {retention_days} days in {batches} batches")
+    return {
+        'purged': purged,
+        'batches': batches,
+        'thread_summaries': thread_summaries,
+        'chunk_summaries': chunk_summaries,
+        'accounts': len(touched_accounts)
+    }
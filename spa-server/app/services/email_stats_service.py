@@ -0,0 +1,157 @@
+"""
+Email Stats Service - Mailbox counters maintained on write
+"""
+
+from datetime import datetime, timezone
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app import db
+from app.models.email_summarizer import Email, EmailAccountStats, EMAIL_CATEGORIES
+
+
+def compute_email_stats(account_id):
+    """
+    Count an account's mailbox in one aggregate query
+    
+    Returns:
+        dict: total/unread/starred/today counts and per-category counts
+    """
+    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    columns = [
+        func.count(Email.id).label('total'),
+        func.count(Email.id).filter(Email.is_read == False).label('unread'),
+        func.count(Email.id).filter(Email.is_starred == True).label('starred'),
+        func.count(Email.id).filter(Email.email_date >= today_start).label('today'),
+    ]
+    columns += [
+        func.count(Email.id).filter(Email.category == category).label(f'category_{category}')
+        for category in EMAIL_CATEGORIES
+    ]
+    
+    row = db.session.query(*columns).filter(Email.account_id == account_id).one()
+    
+    return {
+        'total_count': row.total,
+        'unread_count': row.unread,
+        'starred_count': row.starred,
+        'today_date': today_start.date(),
+        'today_count': row.today,
+        'category_counts': {
+            category: getattr(row, f'category_{category}')
+            for category in EMAIL_CATEGORIES
+            if getattr(row, f'category_{category}')
+        }
+    }
+
+
+def rebuild_email_stats(account_id):
+    """Recount an account and overwrite its counters row (caller commits)"""
+    counts = compute_email_stats(account_id)
+    values = {'account_id': account_id, 'updated_at': datetime.utcnow(), **counts}
+    
+    stmt = pg_insert(EmailAccountStats).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['account_id'],
+        set_={key: stmt.excluded[key] for key in values if key != 'account_id'}
+    )
+    db.session.execute(stmt)
+    return counts
+
+
+def get_email_stats(account_id):
+    """Read the counters row, building it on first use"""
+    stats = db.session.get(EmailAccountStats, account_id)
+    if stats is None:
+        rebuild_email_stats(account_id)
+        db.session.commit()
+        stats = db.session.get(EmailAccountStats, account_id)
+    return stats
+
+
+def utc_naive(value):
+    """Naive UTC datetime; aware values (parsed Date headers) are converted, not just stripped"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def stats_delta(emails, sign=1):
+    """
+    Counter changes for emails being added (sign=1) or removed (sign=-1)
+    
+    Args:
+        emails: Objects or rows with is_read, is_starred, category, email_date
+    """
+    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    delta = {'total': 0, 'unread': 0, 'starred': 0, 'today': 0, 'categories': {}}
+    
+    for email in emails:
+        delta['total'] += sign
+        if not email.is_read:
+            delta['unread'] += sign
+        if email.is_starred:
+            delta['starred'] += sign
+        if email.email_date and utc_naive(email.email_date) >= today_start:
+            delta['today'] += sign
+        category = email.category or 'other'
+        delta['categories'][category] = delta['categories'].get(category, 0) + sign
+    
+    return delta
+
+
+def apply_stats_delta(account_id, total=0, unread=0, starred=0, today=0, categories=None):
+    """
+    Adjust an account's counters in the caller's transaction
+    
+    Accounts without a counters row are skipped; it is rebuilt on next read.
+    """
+    categories = {category: count for category, count in (categories or {}).items() if count}
+    if not any([total, unread, starred, today, categories]):
+        return
+    
+    params = {
+        'account_id': account_id,
+        'total': total,
+        'unread': unread,
+        'starred': starred,
+        'today': today,
+        'today_date': datetime.utcnow().date(),
+    }
+    
+    category_expr = 'category_counts'
+    for index, (category, count) in enumerate(categories.items()):
+        params[f'category_{index}'] = category
+        params[f'count_{index}'] = count
+        category_expr = (
+            f"jsonb_set({category_expr}, ARRAY[:category_{index}], "
+            f"to_jsonb(COALESCE((category_counts->>:category_{index})::int, 0) + :count_{index}))"
+        )
+    
+    db.session.execute(text(f"""
+        UPDATE email_account_stats SET
+            total_count = total_count + :total,
+            unread_count = unread_count + :unread,
+            starred_count = starred_count + :starred,
+            today_count = CASE WHEN today_date = :today_date
+                               THEN today_count + :today
+                               ELSE GREATEST(:today, 0) END,
+            today_date = :today_date,
+            category_counts = {category_expr},
+            updated_at = NOW()
+        WHERE account_id = :account_id
+    """), params)
+
+
+def record_emails_added(account_id, emails):
+    """Count newly stored emails"""
+    delta = stats_delta(emails, sign=1)
+    apply_stats_delta(account_id, delta['total'], delta['unread'], delta['starred'],
+                      delta['today'], delta['categories'])
+
+
+def record_emails_removed(account_id, emails):
+    """Uncount deleted emails"""
+    delta = stats_delta(emails, sign=-1)
+    apply_stats_delta(account_id, delta['total'], delta['unread'], delta['starred'],
+                      delta['today'], delta['categories'])
@@ -0,0 +1,314 @@
+"""
+Email Sync Service - Full and incremental (history) Gmail sync
+
+Full sync lists recent inbox mail and stores what is new. Incremental sync
+replays users.history since the account's stored history ID (sync_token),
+so a push notification only costs the changes it announces.
+"""
+
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import or_
+from app import db
+from app.models.email_summarizer import EmailAccount, Email, GmailOutbox
+from app.services.cache_service import invalidate_tags
+from app.services.email_body_store import get_body_store
+from app.services.email_categorizer import get_categorizer
+from app.services.email_classifier import get_classifier
+from app.services.email_stats_service import apply_stats_delta, record_emails_added, record_emails_removed, utc_naive
+from app.services.gmail_service import HistoryExpiredError
+from app.services.gmail_token_manager import gmail_service_for
+
+PUSH_TOPIC = os.getenv('GMAIL_PUSH_TOPIC')  # projects/<project>/topics/<topic>
+WATCH_RENEW_BEFORE = timedelta(days=1)  # Watches last 7 days; renew daily
+
+
+def to_body_data(full_message):
+    """Flatten get_message_with_attachments output into cached body data"""
+    return {
+        'body_text': full_message['body']['text'],
+        'body_html': full_message['body']['html'],
+        'truncated': full_message['body']['truncated'],
+        'attachments': full_message['attachments'],
+        'links': full_message['links']
+    }
+
+
+def prefill_body_store(email_account, gmail_service, emails):
+    """Store bodies of freshly synced recent mail so opening them skips Gmail"""
+    body_store = get_body_store()
+    cutoff = datetime.utcnow() - timedelta(days=body_store.PREFILL_DAYS)
+    recent = [
+        email for email in emails
+        if email.email_date and utc_naive(email.email_date) >= cutoff
+    ][:body_store.PREFILL_LIMIT]
+    if not recent:
+        return
+    
+    try:
+        fetched = gmail_service.get_messages_with_attachments([email.message_id for email in recent])
+        body_store.put_many({
+            email.id: to_body_data(fetched[email.message_id])
+            for email in recent
+            if email.message_id in fetched
+        })
+        body_store.evict()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Body prefill error (non-critical): {e}")
+
+
+def invalidate_user_caches(firebase_uid):
+    """Drop every cached view derived from a user's mailbox"""
+    invalidate_tags(f"user:{firebase_uid}:emails", f"user:{firebase_uid}:account", f"user:{firebase_uid}:threads")
+
+
+def store_new_emails(email_account, emails_data):
+    """
+    Categorize and add emails not stored yet (caller commits)
+    
+    Args:
+        emails_data: Dicts in the fetch_emails format
+    
+    Returns:
+        list: The new Email rows
+    """
+    message_ids = [email_data['message_id'] for email_data in emails_data]
+    if not message_ids:
+        return []
+    
+    existing_ids = {
+        message_id for (message_id,) in db.session.query(Email.message_id).filter(
+            Email.message_id.in_(message_ids)
+        ).all()
+    }
+    emails_data = [email_data for email_data in emails_data if email_data['message_id'] not in existing_ids]
+    
+    matches = get_categorizer().classify_batch(
+        (email_data['subject'], email_data['sender_email'], email_data['snippet'])
+        for email_data in emails_data
+    )
+    
+    # Emails no rule matched go to the local model
+    unmatched = [
+        (email_data['subject'], email_data['sender_email'], email_data['snippet'])
+        for email_data, match in zip(emails_data, matches) if not match
+    ]
+    predictions = iter(get_classifier().predict_batch(unmatched))
+    
+    new_emails = []
+    for email_data, match in zip(emails_data, matches):
+        if match:
+            category, category_source = match.category, 'rule'
+        else:
+            category = next(predictions)
+            category, category_source = (category, 'model') if category else ('other', 'rule')
+        
+        if email_data.get('is_important'):
+            category, category_source = 'important', 'gmail'
+        
+        email = Email(
+            account_id=email_account.id,
+            message_id=email_data['message_id'],
+            thread_id=email_data['thread_id'],
+            subject=email_data['subject'],
+            sender_email=email_data['sender_email'],
+            sender_name=email_data['sender_name'],
+            snippet=email_data['snippet'],
+            category=category,
+            category_source=category_source,
+            is_starred=email_data['is_starred'],
+            is_read=email_data['is_read'],
+            has_attachments=email_data['has_attachments'],
+            email_date=email_data['email_date']
+        )
+        
+        db.session.add(email)
+        new_emails.append(email)
+    
+    record_emails_added(email_account.id, new_emails)
+    return new_emails
+
+
+def full_sync(email_account, gmail_service=None, max_results=50, days_back=5):
+    """
+    List recent inbox mail (last days_back days, starred, important) and store what is new
+    
+    Returns:
+        dict: {'mode': 'full', 'synced_count': int}
+    """
+    gmail_service = gmail_service or gmail_service_for(email_account)
+    
+    after_date = (datetime.utcnow() - timedelta(days=days_back)).strftime('%Y/%m/%d')
+    query = f'(after:{after_date} OR is:starred OR is:important) in:inbox'
+    
+    result = gmail_service.fetch_emails(max_results=max_results, query=query)
+    new_emails = store_new_emails(email_account, result['emails'])
+    
+    # Update last sync time (UTC)
+    email_account.last_sync_at = datetime.utcnow()
+    
+    history_id = gmail_service.get_history_id()
+    if history_id:
+        email_account.sync_token = str(history_id)
+    
+    db.session.commit()
+    
+    prefill_body_store(email_account, gmail_service, new_emails)
+    invalidate_user_caches(email_account.user_id)
+    
+    return {'mode': 'full', 'synced_count': len(new_emails)}
+
+
+def history_sync(account_id, notified_history_id=None):
+    """
+    Apply Gmail changes since the stored history ID for one account
+    
+    The account row is locked for the duration, so overlapping
+    notifications for one mailbox run one after another. Falls back to a
+    full sync when there is no history ID yet or Gmail no longer has it.
+    
+    Returns:
+        dict: What was applied, or {'mode': 'skipped'} when already up to date
+    """
+    email_account = EmailAccount.query.filter_by(id=account_id, is_active=True).with_for_update().first()
+    if not email_account:
+        db.session.rollback()
+        return {'mode': 'skipped'}
+    
+    if (notified_history_id and email_account.sync_token
+            and int(notified_history_id) <= int(email_account.sync_token)):
+        db.session.rollback()
+        return {'mode': 'skipped'}
+    
+    gmail_service = gmail_service_for(email_account)
+    if not email_account.sync_token:
+        return full_sync(email_account, gmail_service)
+    
+    try:
+        changes = gmail_service.list_history(email_account.sync_token)
+    except HistoryExpiredError:
+        print(f"⚠️ History expired for account {account_id}, running full sync")
+        return full_sync(email_account, gmail_service)
+    
+    new_emails = store_new_emails(email_account, gmail_service.get_messages_details(changes['added']))
+    
+    removed = 0
+    if changes['deleted']:
+        gone = Email.query.filter(
+            Email.account_id == account_id,
+            Email.message_id.in_(changes['deleted'])
+        ).all()
+        record_emails_removed(account_id, gone)
+        for email in gone:
+            db.session.delete(email)
+        removed = len(gone)
+    
+    updated = _apply_label_changes(account_id, changes['labels'])
+    
+    email_account.sync_token = changes['history_id']
+    email_account.last_sync_at = datetime.utcnow()
+    db.session.commit()
+    
+    prefill_body_store(email_account, gmail_service, new_emails)
+    if new_emails or removed or updated:
+        invalidate_user_caches(email_account.user_id)
+    
+    return {'mode': 'history', 'added': len(new_emails), 'removed': removed, 'updated': updated}
+
+
+def _apply_label_changes(account_id, labels):
+    """
+    Mirror read/star label changes onto stored emails (caller commits)
+    
+    Messages with changes still waiting in the outbox keep their local
+    state; Gmail has not caught up with them yet.
+    """
+    if not labels:
+        return 0
+    
+    pending = {
+        message_id for (message_id,) in db.session.query(GmailOutbox.message_id).filter(
+            GmailOutbox.account_id == account_id,
+            GmailOutbox.status == 'pending',
+            GmailOutbox.message_id.in_(list(labels))
+        ).all()
+    }
+    
+    emails = Email.query.filter(
+        Email.account_id == account_id,
+        Email.message_id.in_([message_id for message_id in labels if message_id not in pending])
+    ).all()
+    
+    unread_delta = 0
+    starred_delta = 0
+    updated = 0
+    for email in emails:
+        label_ids = labels[email.message_id]
+        is_read = 'UNREAD' not in label_ids
+        is_starred = 'STARRED' in label_ids
+        if email.is_read == is_read and email.is_starred == is_starred:
+            continue
+        
+        if email.is_read != is_read:
+            unread_delta += -1 if is_read else 1
+        if email.is_starred != is_starred:
+            starred_delta += 1 if is_starred else -1
+        email.is_read = is_read
+        email.is_starred = is_starred
+        updated += 1
+    
+    apply_stats_delta(account_id, unread=unread_delta, starred=starred_delta)
+    return updated
+
+
+def start_watch(email_account, gmail_service=None):
+    """
+    Register (or renew) the Gmail push watch for an account (caller commits)
+    
+    Returns:
+        bool: False when push is not configured
+    """
+    if not PUSH_TOPIC:
+        return False
+    
+    gmail_service = gmail_service or gmail_service_for(email_account)
+    watch = gmail_service.watch(PUSH_TOPIC)
+    email_account.watch_expiration = watch['expiration']
+    
+    # Without a starting point the first notification would trigger a full sync
+    if not email_account.sync_token:
+        email_account.sync_token = watch['history_id']
+    return True
+
+
+def renew_watches(renew_before=WATCH_RENEW_BEFORE):
+    """
+    Renew push watches that expire soon (or were never started)
+    
+    Returns:
+        dict: Counts of renewed and failed accounts
+    """
+    if not PUSH_TOPIC:
+        raise ValueError("GMAIL_PUSH_TOPIC must be set to use push notifications")
+    
+    deadline = datetime.utcnow() + renew_before
+    accounts = EmailAccount.query.filter(
+        EmailAccount.is_active == True,
+        or_(EmailAccount.watch_expiration.is_(None), EmailAccount.watch_expiration < deadline)
+    ).all()
+    
+    renewed = 0
+    failed = 0
+    for email_account in accounts:
+        try:
+            start_watch(email_account)
+            db.session.commit()
+            renewed += 1
+        except Exception as e:
+            db.session.rollback()
+            failed += 1
+            print(f"⚠️ Watch renewal failed for account {email_account.id}: {e}")
+    
+    print(f"🔔 Renewed {renewed} Gmail watches ({failed} failed)")
+    return {'renewed': renewed, 'failed': failed}
@@ -0,0 +1,279 @@
+"""
+Gmail Outbox - Write-behind queue for Gmail mutations
+
+Read, star and delete actions update the local row and add an outbox entry
+in the same transaction, so the request never waits on Gmail. A background
+worker drains the outbox. It coalesces repeated actions on one message into
+the final state, then sends one batchModify call per label change set.
+Failed entries retry with exponential backoff.
+
+A message's pending entries always travel together: when any of them is
+due, the older ones still backing off are sent with it as part of the
+coalesced state, so an old action is never replayed after a newer one
+reached Gmail.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from googleapiclient.errors import HttpError
+from sqlalchemy import func
+from app import db
+from app.models.email_summarizer import EmailAccount, GmailOutbox
+from app.services.gmail_token_manager import gmail_service_for
+
+ACTIONS = ('read', 'unread', 'star', 'unstar', 'trash')
+
+FLUSH_LIMIT = 1000  # batchModify accepts at most 1000 IDs
+MAX_ATTEMPTS = 8
+BASE_BACKOFF_SECONDS = 30
+MAX_BACKOFF_SECONDS = 3600
+
+
+def enqueue_gmail_action(account_id, message_id, action):
+    """
+    Add an outbox entry to the current session
+    
+    The caller commits it together with the local change.
+    """
+    if action not in ACTIONS:
+        raise ValueError(f"Unknown Gmail action: {action}")
+    
+    db.session.add(GmailOutbox(
+        account_id=account_id,
+        message_id=message_id,
+        action=action,
+        next_attempt_at=datetime.utcnow()
+    ))
+
+
+def coalesce_actions(entries):
+    """
+    Reduce outbox entries to the final Gmail state per message
+    
+    Args:
+        entries: GmailOutbox rows in creation order
+    
+    Returns:
+        tuple: ({(add_labels, remove_labels): [message_ids]}, [trashed message_ids])
+    """
+    states = {}
+    for entry in entries:
+        state = states.setdefault(entry.message_id, {'read': None, 'star': None, 'trash': False})
+        if entry.action == 'trash':
+            state['trash'] = True
+        elif entry.action in ('read', 'unread'):
+            state['read'] = entry.action == 'read'
+        else:
+            state['star'] = entry.action == 'star'
+    
+    label_groups = {}
+    trashed = []
+    for message_id, state in states.items():
+        if state['trash']:
+            trashed.append(message_id)
+            continue
+        
+        add, remove = [], []
+        if state['read'] is not None:
+            (remove if state['read'] else add).append('UNREAD')
+        if state['star'] is not None:
+            (add if state['star'] else remove).append('STARRED')
+        label_groups.setdefault((tuple(add), tuple(remove)), []).append(message_id)
+    
+    return label_groups, trashed
+
+
+def _backoff(attempts):
+    return timedelta(seconds=min(BASE_BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS))
+
+
+def _batch_modify(gmail_service, message_ids, add, remove, errors):
+    """
+    batchModify that isolates bad message ids
+    
+    Gmail rejects the whole call when one id is invalid (400/404), so such
+    a failure is retried on each half until the bad ids are found. Other
+    errors (auth, quota, outages) fail the group as a whole.
+    """
+    try:
+        gmail_service.batch_modify(message_ids, add_label_ids=add, remove_label_ids=remove)
+    except HttpError as e:
+        if e.resp.status not in (400, 404):
+            errors.update((message_id, str(e)) for message_id in message_ids)
+        elif len(message_ids) > 1:
+            middle = len(message_ids) // 2
+            _batch_modify(gmail_service, message_ids[:middle], add, remove, errors)
+            _batch_modify(gmail_service, message_ids[middle:], add, remove, errors)
+        elif e.resp.status != 404:  # A message that is gone needs no labels
+            errors[message_ids[0]] = str(e)
+    except Exception as e:
+        errors.update((message_id, str(e)) for message_id in message_ids)
+
+
+def _send_account(account, entries):
+    """
+    Push one account's entries to Gmail
+    
+    Returns:
+        dict: message_id -> error text for messages that failed
+    """
+    errors = {}
+    try:
+        gmail_service = gmail_service_for(account)
+    except Exception as e:
+        return {entry.message_id: str(e) for entry in entries}
+    
+    label_groups, trashed = coalesce_actions(entries)
+    
+    for (add, remove), message_ids in label_groups.items():
+        _batch_modify(gmail_service, message_ids, add, remove, errors)
+    
+    if trashed:
+        try:
+            for message_id in gmail_service.trash_messages(trashed):
+                errors[message_id] = 'trash failed'
+        except Exception as e:
+            errors.update((message_id, str(e)) for message_id in trashed)
+    
+    return errors
+
+
+def flush_outbox(limit=FLUSH_LIMIT):
+    """
+    Send due outbox entries to Gmail
+    
+    Entries are claimed with SKIP LOCKED, so several workers or a cron run
+    can flush at the same time without sending an action twice. Every
+    pending entry of a due message is claimed with it; a message whose
+    entries are partly held by another worker waits for the next flush.
+    
+    Returns:
+        dict: Counts of sent, retrying and failed entries
+    """
+    now = datetime.utcnow()
+    due = GmailOutbox.query.filter(
+        GmailOutbox.status == 'pending',
+        GmailOutbox.next_attempt_at <= now
+    ).order_by(GmailOutbox.id).limit(limit).with_for_update(skip_locked=True).all()
+    
+    result = {'sent': 0, 'retrying': 0, 'failed': 0}
+    if not due:
+        db.session.rollback()
+        return result
+    
+    # Older entries still backing off are folded into the newer state
+    message_ids = list({entry.message_id for entry in due})
+    backing_off = GmailOutbox.query.filter(
+        GmailOutbox.status == 'pending',
+        GmailOutbox.message_id.in_(message_ids),
+        GmailOutbox.id.notin_([entry.id for entry in due])
+    ).with_for_update(skip_locked=True).all()
+    
+    pending_counts = {
+        (account_id, message_id): count
+        for account_id, message_id, count in db.session.query(
+            GmailOutbox.account_id, GmailOutbox.message_id, func.count()
+        ).filter(
+            GmailOutbox.status == 'pending',
+            GmailOutbox.message_id.in_(message_ids)
+        ).group_by(GmailOutbox.account_id, GmailOutbox.message_id).all()
+    }
+    claimed = {}
+    for entry in due + backing_off:
+        claimed.setdefault((entry.account_id, entry.message_id), []).append(entry)
+    
+    entries = sorted(
+        (
+            entry
+            for key, message_entries in claimed.items()
+            if len(message_entries) >= pending_counts.get(key, 0)
+            for entry in message_entries
+        ),
+        key=lambda entry: entry.id
+    )
+    
+    by_account = {}
+    for entry in entries:
+        by_account.setdefault(entry.account_id, []).append(entry)
+    
+    accounts = {
+        account.id: account
+        for account in EmailAccount.query.filter(EmailAccount.id.in_(list(by_account))).all()
+    }
+    
+    for account_id, account_entries in by_account.items():
+        account = accounts.get(account_id)
+        if account is None:
+            continue  # Disconnected; the entries go with the account
+        errors = _send_account(account, account_entries)
+        
+        for entry in account_entries:
+            error = errors.get(entry.message_id)
+            if error is None:
+                db.session.delete(entry)
+                result['sent'] += 1
+                continue
+            
+            entry.attempts += 1
+            entry.last_error = error[:1000]
+            if entry.attempts >= MAX_ATTEMPTS:
+                entry.status = 'failed'
+                result['failed'] += 1
+            else:
+                entry.next_attempt_at = now + _backoff(entry.attempts)
+                result['retrying'] += 1
+    
+    db.session.commit()
+    
+    if result['retrying'] or result['failed']:
+        print(f"⚠️ Gmail outbox: {result['retrying']} retrying, {result['failed']} failed")
+    return result
+
+
+class GmailOutboxWorker:
+    """Background thread that drains the outbox after writes and on a timer"""
+    
+    POLL_SECONDS = 30  # Picks up retries and entries written by other processes
+    COALESCE_SECONDS = 2  # Let rapid taps on the same email collapse into one call
+    
+    def __init__(self):
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._app = None
+    
+    def notify(self):
+        """Wake the worker; call after committing outbox entries"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._app = current_app._get_current_object()
+                self._thread = threading.Thread(target=self._run, name='gmail-outbox', daemon=True)
+                self._thread.start()
+        self._wake.set()
+    
+    def _run(self):
+        while True:
+            self._wake.wait(self.POLL_SECONDS)
+            self._wake.clear()
+            time.sleep(self.COALESCE_SECONDS)
+            
+            with self._app.app_context():
+                try:
+                    while sum(flush_outbox().values()) >= FLUSH_LIMIT:
+                        pass
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"⚠️ Gmail outbox flush failed: {e}")
+
+
+# Singleton instance
+_outbox_worker = None
+
+def get_outbox_worker():
+    """Get or create outbox worker singleton"""
+    global _outbox_worker
+    if _outbox_worker is None:
+        _outbox_worker = GmailOutboxWorker()
+    return _outbox_worker
@@ -7,9 +7,12 @@ from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from datetime import datetime, timedelta
-import base64
 import os
-import re
+from app.services.mime_extractor import MimeBodyExtractor
+
+
+class HistoryExpiredError(Exception):
+    """The stored history ID is too old for users.history.list; a full sync is needed"""
 
 
 class GmailService:
@@ -20,14 +23,21 @@ class GmailService:
         'https://www.googleapis.com/auth/gmail.modify'
     ]
     
-    def __init__(self, access_token, refresh_token=None):
+    def __init__(self, access_token=None, refresh_token=None, credentials=None):
         """
         Initialize Gmail service with OAuth tokens
         
         Args:
             access_token: Google access token
             refresh_token: Google refresh token (REQUIRED for auto-refresh)
+            credentials: Prebuilt Credentials (e.g. from the token manager); skips the refresh here
         """
+        if credentials is not None:
+            self.credentials = credentials
+            self.service = build('gmail', 'v1', credentials=credentials)
+            self.updated_token = credentials.token
+            return
+        
         # Get OAuth2 credentials from environment
         client_id = os.getenv('GOOGLE_CLIENT_ID')
         client_secret = os.getenv('GOOGLE_CLIENT_SECRET')
@@ -187,59 +197,20 @@ class GmailService:
                 format='full'
             ).execute()
             
-            payload = message['payload']
-            
-            # Extract body
-            body_text = ''
-            body_html = ''
-            
-            if 'parts' in payload:
-                # Multipart message
-                for part in payload['parts']:
-                    body_text, body_html = self._extract_part_body(part, body_text, body_html)
-            else:
-                # Single part message
-                body = payload.get('body', {})
-                data = body.get('data', '')
-                
-                if data:
-                    decoded = base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
-                    mime_type = payload.get('mimeType')
-                    
-                    if mime_type == 'text/plain':
-                        body_text = decoded
-                    elif mime_type == 'text/html':
-                        body_html = decoded
-            
-            return {
-                'text': body_text.strip(),
-                'html': body_html.strip()
-            }
+            return self._parse_message_body(message['payload'])
         
         except HttpError as error:
             print(f"Error getting message body: {error}")
             raise
     
-    def _extract_part_body(self, part, body_text='', body_html=''):
-        """Recursively extract body from message parts"""
-        mime_type = part.get('mimeType')
-        body = part.get('body', {})
-        data = body.get('data', '')
-        
-        if data:
-            decoded = base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
-            
-            if mime_type == 'text/plain':
-                body_text += decoded
-            elif mime_type == 'text/html':
-                body_html += decoded
-        
-        # Recursively check nested parts
-        if 'parts' in part:
-            for nested_part in part['parts']:
-                body_text, body_html = self._extract_part_body(nested_part, body_text, body_html)
-        
-        return body_text, body_html
+    def _parse_message_body(self, payload):
+        """Extract plain text and HTML body from a message payload"""
+        extracted = MimeBodyExtractor().extract(payload)
+        return {
+            'text': extracted['text'] or extracted['html_text'],
+            'html': extracted['html'],
+            'truncated': extracted['truncated']
+        }
     
     def mark_as_read(self, message_id):
         """Mark an email as read"""
@@ -297,6 +268,46 @@ class GmailService:
             print(f"Error deleting message: {error}")
             return False
     
+    def batch_modify(self, message_ids, add_label_ids=None, remove_label_ids=None):
+        """
+        Change labels on up to 1000 messages in one call
+        
+        Raises HttpError so callers can retry.
+        """
+        body = {'ids': list(message_ids)}
+        if add_label_ids:
+            body['addLabelIds'] = list(add_label_ids)
+        if remove_label_ids:
+            body['removeLabelIds'] = list(remove_label_ids)
+        
+        self.service.users().messages().batchModify(userId='me', body=body).execute()
+        return True
+    
+    def trash_messages(self, message_ids, chunk_size=50):
+        """
+        Move many messages to trash using Gmail batch requests
+        
+        Returns:
+            list: Message IDs that failed
+        """
+        failed = []
+        
+        def handle_response(request_id, response, exception):
+            if exception is not None:
+                # Already gone counts as done
+                if not (isinstance(exception, HttpError) and exception.resp.status == 404):
+                    print(f"Error trashing message {request_id}: {exception}")
+                    failed.append(request_id)
+        
+        message_ids = list(dict.fromkeys(message_ids))
+        for start in range(0, len(message_ids), chunk_size):
+            batch = self.service.new_batch_http_request(callback=handle_response)
+            for message_id in message_ids[start:start + chunk_size]:
+                batch.add(self.service.users().messages().trash(userId='me', id=message_id), request_id=message_id)
+            batch.execute()
+        
+        return failed
+    
     def get_history_id(self):
         """Get current history ID for incremental sync"""
         try:
@@ -306,6 +317,102 @@ class GmailService:
             print(f"Error getting history ID: {error}")
             return None
     
+    def watch(self, topic_name, label_ids=('INBOX',)):
+        """
+        Start (or renew) push notifications to a Pub/Sub topic
+        
+        Returns:
+            dict: {'history_id': str, 'expiration': datetime (UTC)}
+        """
+        response = self.service.users().watch(userId='me', body={
+            'topicName': topic_name,
+            'labelIds': list(label_ids),
+            'labelFilterBehavior': 'include'
+        }).execute()
+        
+        return {
+            'history_id': str(response['historyId']),
+            'expiration': datetime.utcfromtimestamp(int(response['expiration']) / 1000)
+        }
+    
+    def stop_watch(self):
+        """Stop push notifications for this mailbox"""
+        self.service.users().stop(userId='me').execute()
+        return True
+    
+    def list_history(self, start_history_id, label_id='INBOX'):
+        """
+        Changes since a history ID, folded into the final state per message
+        
+        Returns:
+            dict: {
+                'history_id': latest history ID,
+                'added': [message IDs added to the label],
+                'deleted': [message IDs deleted or trashed],
+                'labels': {message ID: current label IDs} for label changes
+            }
+        
+        Raises:
+            HistoryExpiredError: start_history_id is too old (Gmail answers 404)
+        """
+        added = {}
+        deleted = set()
+        labels = {}
+        history_id = str(start_history_id)
+        page_token = None
+        
+        while True:
+            params = {
+                'userId': 'me',
+                'startHistoryId': start_history_id,
+                'historyTypes': ['messageAdded', 'messageDeleted', 'labelAdded', 'labelRemoved'],
+                'labelId': label_id
+            }
+            if page_token:
+                params['pageToken'] = page_token
+            
+            try:
+                response = self.service.users().history().list(**params).execute()
+            except HttpError as error:
+                if error.resp.status == 404:
+                    raise HistoryExpiredError(str(error))
+                raise
+            
+            for record in response.get('history', []):
+                for item in record.get('messagesAdded', []):
+                    added[item['message']['id']] = True
+                for item in record.get('messagesDeleted', []):
+                    deleted.add(item['message']['id'])
+                for item in record.get('labelsAdded', []) + record.get('labelsRemoved', []):
+                    message = item['message']
+                    labels[message['id']] = message.get('labelIds', [])
+                    if 'TRASH' in message.get('labelIds', []):
+                        deleted.add(message['id'])
+            
+            history_id = str(response.get('historyId', history_id))
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+        
+        return {
+            'history_id': history_id,
+            'added': [message_id for message_id in added if message_id not in deleted],
+            'deleted': list(deleted),
+            'labels': {
+                message_id: label_ids for message_id, label_ids in labels.items()
+                if message_id not in deleted
+            }
+        }
+    
+    def get_messages_details(self, message_ids):
+        """Metadata for several messages, same shape as fetch_emails entries"""
+        emails = []
+        for message_id in message_ids:
+            email_data = self._get_message_details(message_id)
+            if email_data:
+                emails.append(email_data)
+        return emails
+    
     # Helper methods
     
     def _get_header(self, headers, name):
@@ -346,102 +453,54 @@ class GmailService:
                 format='full'
             ).execute()
             
-            payload = message['payload']
-            
-            # Extract body
-            body_text = ''
-            body_html = ''
-            attachments = []
-            
-            if 'parts' in payload:
-                for part in payload['parts']:
-                    body_text, body_html, attachments = self._extract_parts(
-                        part, body_text, body_html, attachments
-                    )
-            else:
-                body = payload.get('body', {})
-                data = body.get('data', '')
-                
-                if data:
-                    decoded = base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
-                    mime_type = payload.get('mimeType')
-                    
-                    if mime_type == 'text/plain':
-                        body_text = decoded
-                    elif mime_type == 'text/html':
-                        body_html = decoded
-            
-            # Extract links from body
-            links = self._extract_links(body_text + body_html)
-            # # If still no HTML but we have text, wrap it nicely
-            # if not body_html and body_text:
-            #     body_html = "<pre style='white-space:pre-wrap;font-family:inherit;'>" + body_text + "</pre>"
-
-            
-            return {
-                'body': {
-                    'text': body_text.strip(),
-                    'html': body_html.strip()
-                },
-                'attachments': attachments,
-                'links': links
-            }
+            return self._parse_message_with_attachments(message['payload'])
         
         except HttpError as error:
             print(f"Error getting message with attachments: {error}")
             raise
 
 
-    def _extract_parts(self, part, body_text='', body_html='', attachments=[]):
-        """Extract body, attachments recursively (supports nested MIME parts)"""
-        mime_type = part.get('mimeType', '')
-        filename = part.get('filename', '')
-        body = part.get('body', {})
-        data = body.get('data', '')
-
-        # If it's an attachment
-        if filename and body.get('attachmentId'):
-            attachments.append({
-                'filename': filename,
-                'mimeType': mime_type,
-                'size': body.get('size', 0),
-                'attachmentId': body.get('attachmentId')
-            })
-        elif data:
-            # Decode normal body data
-            decoded = base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
-            if mime_type == 'text/plain':
-                body_text += decoded
-            elif mime_type == 'text/html':
-                body_html += decoded
-
-        # Recursively explore nested parts (for multipart/alternative, related, etc.)
-        if 'parts' in part:
-            for nested_part in part['parts']:
-                body_text, body_html, attachments = self._extract_parts(
-                    nested_part, body_text, body_html, attachments
-                )
-
-        # Handle "multipart/alternative" preference — prefer HTML over plain text
-        if mime_type == 'multipart/alternative' and body_html.strip():
-            # If we found an HTML version inside, prefer that
-            body_text = ''
-        return body_text, body_html, attachments
-
-
-
-    def _extract_links(self, text):
-        """Extract URLs from text"""
-        url_pattern = re.compile(
-            r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
-        )
+    def get_messages_with_attachments(self, message_ids, chunk_size=50):
+        """
+        Batch version of get_message_with_attachments
         
-        links = url_pattern.findall(text)
+        Returns:
+            dict: {message_id: full message data}, failed IDs are omitted
+        """
+        messages = {}
         
-        # Remove duplicates and limit to 10
-        unique_links = list(dict.fromkeys(links))[:10]
+        def handle_response(request_id, response, exception):
+            if exception is not None:
+                print(f"Error getting message {request_id}: {exception}")
+                return
+            messages[request_id] = self._parse_message_with_attachments(response['payload'])
+        
+        message_ids = list(dict.fromkeys(message_ids))
+        for start in range(0, len(message_ids), chunk_size):
+            batch = self.service.new_batch_http_request(callback=handle_response)
+            for message_id in message_ids[start:start + chunk_size]:
+                batch.add(
+                    self.service.users().messages().get(userId='me', id=message_id, format='full'),
+                    request_id=message_id
+                )
+            batch.execute()
+        
+        return messages
+
+    def _parse_message_with_attachments(self, payload):
+        """Extract body, attachments and links from a message payload in one pass"""
+        extracted = MimeBodyExtractor().extract(payload)
         
-        return unique_links
+        return {
+            'body': {
+                # Plain text part, or a rendition of the HTML when there is none
+                'text': extracted['text'] or extracted['html_text'],
+                'html': extracted['html'],
+                'truncated': extracted['truncated']  # Decoding stopped at the size budget
+            },
+            'attachments': extracted['attachments'],
+            'links': extracted['links']
+        }
 
 def create_gmail_service(access_token, refresh_token=None):
     """Factory function to create GmailService instance"""
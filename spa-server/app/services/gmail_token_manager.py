@@ -0,0 +1,282 @@
+"""
+Gmail Token Manager - Shared OAuth credentials per email account
+
+Keeps one Credentials object per account in memory. Tokens close to expiry
+are refreshed on a background pool, ahead of time, and only once even when
+many requests ask at the same moment. Refreshed tokens are written back to
+email_accounts in batches by a flusher thread, so requests only wait on
+Google's token endpoint when a token has already expired.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from sqlalchemy import DateTime, Integer, Text, cast, column, update, values
+from app import db
+from app.models.email_summarizer import EmailAccount
+from app.services.gmail_service import GmailService
+
+
+class GmailTokenManager:
+    """In-memory credential cache with ahead-of-expiry refresh"""
+    
+    REFRESH_MARGIN = timedelta(minutes=5)  # Refresh when this close to expiry
+    EXPIRED_WAIT_SECONDS = 30  # Longest a request waits on an expired token
+    SWEEP_SECONDS = 60  # Background check for cached tokens nearing expiry
+    FLUSH_SECONDS = 10  # How often refreshed tokens are saved
+    IDLE_SECONDS = 3600  # Accounts unused this long are dropped, not refreshed
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._credentials = {}  # account_id -> Credentials
+        self._refreshing = {}  # account_id -> Future, one refresh per account at a time
+        self._saved_tokens = {}  # account_id -> access token last seen in the database
+        self._stored_refresh_tokens = {}  # account_id -> refresh token the cached credentials came from
+        self._dirty = set()  # account_ids with tokens not yet saved
+        self._last_used = {}  # account_id -> datetime
+        self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='gmail-token')
+        self._thread = None
+        self._app = None
+        self._client_id = os.getenv('GOOGLE_CLIENT_ID')
+        self._client_secret = os.getenv('GOOGLE_CLIENT_SECRET')
+    
+    def get_credentials(self, account):
+        """
+        Valid credentials for an account
+        
+        Returns the cached token straight away while it is valid; one
+        that is inside the refresh margin is refreshed in the background.
+        
+        Args:
+            account: EmailAccount row
+        """
+        self._ensure_started()
+        
+        with self._lock:
+            credentials = self._credentials.get(account.id)
+            if credentials is None:
+                credentials = self._build(account)
+                self._credentials[account.id] = credentials
+                self._saved_tokens[account.id] = account.access_token
+                self._stored_refresh_tokens[account.id] = account.refresh_token
+            self._last_used[account.id] = datetime.utcnow()
+        
+        if credentials.expiry is None or not credentials.refresh_token:
+            return credentials
+        
+        remaining = credentials.expiry - datetime.utcnow()
+        if remaining > self.REFRESH_MARGIN:
+            return credentials
+        
+        future = self._refresh_async(account.id)
+        if remaining <= timedelta(0):
+            try:
+                future.result(timeout=self.EXPIRED_WAIT_SECONDS)
+            except Exception:
+                pass  # Logged by _finish_refresh; the API client retries on a 401
+        return credentials
+    
+    def forget(self, account_id):
+        """Drop the cached credentials, e.g. after the user reconnects"""
+        with self._lock:
+            self._credentials.pop(account_id, None)
+            self._saved_tokens.pop(account_id, None)
+            self._stored_refresh_tokens.pop(account_id, None)
+            self._last_used.pop(account_id, None)
+            self._dirty.discard(account_id)
+    
+    def _build(self, account):
+        if not self._client_id or not self._client_secret:
+            raise ValueError("GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET must be set in environment")
+        
+        return Credentials(
+            token=account.access_token,
+            refresh_token=account.refresh_token,
+            token_uri='https://oauth2.googleapis.com/token',
+            client_id=self._client_id,
+            client_secret=self._client_secret,
+            scopes=GmailService.SCOPES,
+            expiry=account.token_expires_at
+        )
+    
+    # ------------------------------------------------------------------
+    # Refresh
+    # ------------------------------------------------------------------
+    
+    def _refresh_async(self, account_id):
+        """Start a refresh, or join the one already running for this account"""
+        with self._lock:
+            future = self._refreshing.get(account_id)
+            if future is None:
+                future = self._pool.submit(self._refresh, account_id)
+                self._refreshing[account_id] = future
+                future.add_done_callback(lambda done: self._finish_refresh(account_id, done))
+            return future
+    
+    def _finish_refresh(self, account_id, future):
+        with self._lock:
+            self._refreshing.pop(account_id, None)
+        if future.exception() is not None:
+            print(f"⚠️ Token refresh failed for account {account_id}: {future.exception()}")
+    
+    def _refresh(self, account_id):
+        credentials = self._credentials.get(account_id)
+        if credentials is None:
+            return
+        credentials.refresh(Request())
+        with self._lock:
+            self._dirty.add(account_id)
+        print(f"✅ Token refreshed for account {account_id}")
+    
+    # ------------------------------------------------------------------
+    # Background sweep and persistence
+    # ------------------------------------------------------------------
+    
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._app = current_app._get_current_object()
+                self._thread = threading.Thread(target=self._run, name='gmail-token-flusher', daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        last_sweep = datetime.utcnow()
+        while True:
+            time.sleep(self.FLUSH_SECONDS)
+            
+            if datetime.utcnow() - last_sweep >= timedelta(seconds=self.SWEEP_SECONDS):
+                self._sweep()
+                last_sweep = datetime.utcnow()
+            
+            with self._app.app_context():
+                try:
+                    self.flush()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"⚠️ Saving refreshed tokens failed: {e}")
+    
+    def _sweep(self):
+        """Drop idle accounts and refresh tokens that expire before the next sweep"""
+        now = datetime.utcnow()
+        horizon = now + self.REFRESH_MARGIN + timedelta(seconds=self.SWEEP_SECONDS)
+        idle_before = now - timedelta(seconds=self.IDLE_SECONDS)
+        with self._lock:
+            for account_id, last_used in list(self._last_used.items()):
+                if last_used < idle_before and account_id not in self._dirty:
+                    self._credentials.pop(account_id, None)
+                    self._saved_tokens.pop(account_id, None)
+                    self._stored_refresh_tokens.pop(account_id, None)
+                    del self._last_used[account_id]
+            
+            due = [
+                account_id for account_id, credentials in self._credentials.items()
+                if credentials.refresh_token and credentials.expiry and credentials.expiry <= horizon
+            ]
+        for account_id in due:
+            self._refresh_async(account_id)
+    
+    def flush(self):
+        """
+        Save refreshed tokens in one batched UPDATE
+        
+        Also picks up tokens the API client refreshed on its own after a 401.
+        A row is only written while it still holds the refresh token the
+        cached credentials were built from; if the user reconnected in the
+        meantime, the stale credentials are dropped instead of overwriting
+        the new tokens.
+        
+        Returns:
+            int: Accounts written
+        """
+        with self._lock:
+            for account_id, credentials in self._credentials.items():
+                if credentials.token != self._saved_tokens.get(account_id):
+                    self._dirty.add(account_id)
+            
+            rows = []
+            for account_id in self._dirty:
+                credentials = self._credentials.get(account_id)
+                if credentials is None:
+                    continue
+                rows.append((
+                    account_id,
+                    self._stored_refresh_tokens.get(account_id),
+                    credentials.token,
+                    credentials.refresh_token,
+                    credentials.expiry
+                ))
+            snapshot = {row[0]: self._credentials[row[0]] for row in rows}
+            self._dirty = set()
+        
+        if not rows:
+            return 0
+        
+        refreshed = values(
+            column('id', Integer),
+            column('stored_refresh_token', Text),
+            column('access_token', Text),
+            column('refresh_token', Text),
+            column('token_expires_at', DateTime),
+            name='refreshed'
+        ).data(rows)
+        stmt = update(EmailAccount).where(
+            EmailAccount.id == refreshed.c.id,
+            EmailAccount.refresh_token.is_not_distinct_from(refreshed.c.stored_refresh_token)
+        ).values(
+            access_token=refreshed.c.access_token,
+            refresh_token=refreshed.c.refresh_token,
+            token_expires_at=cast(refreshed.c.token_expires_at, DateTime),  # An all-NULL VALUES column reads as text
+            updated_at=datetime.utcnow()
+        ).returning(EmailAccount.id)
+        
+        try:
+            written = set(db.session.execute(stmt).scalars())
+            db.session.commit()
+        except Exception:
+            with self._lock:
+                self._dirty.update(row[0] for row in rows)
+            raise
+        
+        with self._lock:
+            for account_id, _, access_token, refresh_token, _ in rows:
+                if self._credentials.get(account_id) is not snapshot[account_id]:
+                    continue  # Forgotten or rebuilt while saving
+                if account_id in written:
+                    self._saved_tokens[account_id] = access_token
+                    self._stored_refresh_tokens[account_id] = refresh_token
+                else:
+                    # Reconnected (or deleted) since these credentials were built
+                    self._credentials.pop(account_id, None)
+                    self._saved_tokens.pop(account_id, None)
+                    self._stored_refresh_tokens.pop(account_id, None)
+                    self._last_used.pop(account_id, None)
+        
+        stale = len(rows) - len(written)
+        print(f"💾 Saved refreshed tokens for {len(written)} accounts" + (f", dropped {stale} stale" if stale else ""))
+        return len(written)
+
+
+# Singleton instance
+_token_manager = None
+_token_manager_lock = threading.Lock()
+
+def get_token_manager():
+    """Get or create token manager singleton"""
+    global _token_manager
+    if _token_manager is None:
+        with _token_manager_lock:
+            if _token_manager is None:
+                _token_manager = GmailTokenManager()
+    return _token_manager
+
+
+def gmail_service_for(account):
+    """GmailService for an account using the shared, managed credentials"""
+    return GmailService(credentials=get_token_manager().get_credentials(account))
@@ -0,0 +1,145 @@
+"""
+MIME Extractor - Single-pass walker over Gmail message payloads
+
+Collects text and HTML chunks into lists, decodes base64url only for the
+parts it keeps, renders HTML to plain text and gathers links in the same
+walk. Decoded output is capped by a byte budget so huge messages stay
+bounded in memory.
+"""
+
+import base64
+import re
+from html.parser import HTMLParser
+
+
+URL_PATTERN = re.compile(
+    r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
+)
+
+
+class _HtmlTextRenderer(HTMLParser):
+    """Incremental HTML to text conversion that also collects hrefs"""
+    
+    BLOCK_TAGS = {'p', 'div', 'br', 'li', 'tr', 'table', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+                  'blockquote', 'pre', 'hr', 'section', 'article', 'header', 'footer'}
+    SKIP_TAGS = {'script', 'style', 'head', 'title'}
+    
+    def __init__(self, on_link):
+        super().__init__(convert_charrefs=True)
+        self.chunks = []
+        self._on_link = on_link
+        self._skip_depth = 0
+    
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self.chunks.append('\n')
+        if tag == 'a':
+            href = dict(attrs).get('href')
+            if href and href.startswith(('http://', 'https://')):
+                self._on_link(href)
+    
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+        elif tag in self.BLOCK_TAGS:
+            self.chunks.append('\n')
+    
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.chunks.append(data)
+    
+    def text(self):
+        """Rendered text with runs of blank lines and spaces collapsed"""
+        lines = (' '.join(line.split()) for line in ''.join(self.chunks).splitlines())
+        return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip()
+
+
+class MimeBodyExtractor:
+    """Walks a message payload once, producing text, HTML, a text rendition, attachments and links"""
+    
+    MAX_DECODED_BYTES = 1024 * 1024  # Per message, text and HTML combined
+    MAX_LINKS = 10
+    
+    def __init__(self, max_decoded_bytes=None, max_links=None):
+        self.max_decoded_bytes = max_decoded_bytes or self.MAX_DECODED_BYTES
+        self.max_links = max_links or self.MAX_LINKS
+    
+    def extract(self, payload):
+        """
+        Extract everything from a Gmail message payload
+        
+        Returns:
+            dict: {'text', 'html', 'html_text', 'attachments', 'links', 'truncated'}
+        """
+        text_chunks = []
+        html_chunks = []
+        attachments = []
+        links = {}  # Insertion-ordered set
+        budget = [self.max_decoded_bytes]
+        truncated = False
+        
+        def add_link(url):
+            if len(links) < self.max_links:
+                links.setdefault(url, None)
+        
+        renderer = _HtmlTextRenderer(add_link)
+        
+        # Iterative depth-first walk in document order
+        stack = [payload]
+        while stack:
+            part = stack.pop()
+            mime_type = part.get('mimeType', '')
+            body = part.get('body', {})
+            
+            if part.get('filename') and body.get('attachmentId'):
+                attachments.append({
+                    'filename': part['filename'],
+                    'mimeType': mime_type,
+                    'size': body.get('size', 0),
+                    'attachmentId': body.get('attachmentId')
+                })
+            elif mime_type in ('text/plain', 'text/html') and body.get('data'):
+                decoded, clipped = self._decode(body['data'], budget)
+                truncated = truncated or clipped
+                
+                if mime_type == 'text/plain':
+                    text_chunks.append(decoded)
+                    for url in URL_PATTERN.findall(decoded):
+                        add_link(url)
+                else:
+                    html_chunks.append(decoded)
+                    renderer.feed(decoded)
+            
+            stack.extend(reversed(part.get('parts', [])))
+        
+        renderer.close()
+        
+        return {
+            'text': ''.join(text_chunks).strip(),
+            'html': ''.join(html_chunks).strip(),
+            'html_text': renderer.text(),
+            'attachments': attachments,
+            'links': list(links),
+            'truncated': truncated
+        }
+    
+    def _decode(self, data, budget):
+        """Decode base64url data within the remaining budget, returns (text, clipped)"""
+        if budget[0] <= 0:
+            return '', True
+        
+        clipped = len(data) * 3 // 4 > budget[0]
+        if clipped:
+            # Only decode as many 4-char groups as the budget allows
+            data = data[:(budget[0] // 3 + 1) * 4]
+        
+        raw = base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))[:budget[0]]
+        budget[0] -= len(raw)
+        return raw.decode('utf-8', errors='ignore'), clipped
+
+
+def extract_message(payload, max_decoded_bytes=None):
+    """Convenience wrapper around MimeBodyExtractor.extract"""
+    return MimeBodyExtractor(max_decoded_bytes=max_decoded_bytes).extract(payload)
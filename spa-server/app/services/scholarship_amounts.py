@@ -0,0 +1,221 @@
+"""
+Scholarship Amounts - Parse free-text award amounts into canonical numbers
+
+Scholarship.amount is free text ("₹50,000", "Up to $10k", "1-2 lakh").
+Whenever a scholarship is written, the text is parsed into amount_min and
+amount_max in CANONICAL_CURRENCY, using the currency_rates table (cached in
+memory), so amount filters and sorts can run in SQL.
+"""
+
+import re
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app import db
+from app.models.scholarships import CurrencyRate, Scholarship
+
+CANONICAL_CURRENCY = 'INR'
+
+# A figure followed by % or "percent" (e.g. "50% tuition waiver") is not an amount;
+# the lookahead spans the rest of the digits so backtracking cannot keep "5" of "50%"
+FIGURE_PATTERN = re.compile(
+    r'(\d[\d,]*(?:\.\d+)?)(?![\d,.]*\s*(?:%|per\s*cent))\s*(k|lakhs?|lacs?|crores?|cr)?\b', re.IGNORECASE
+)
+UNIT_MULTIPLIERS = {'k': 1e3, 'lakh': 1e5, 'lac': 1e5, 'crore': 1e7, 'cr': 1e7}
+RANGE_PATTERN = re.compile(r'\d\s*[a-z]*\s*(?:-|–|to)\s*\D{0,4}\d', re.IGNORECASE)
+UP_TO_PATTERN = re.compile(r'\b(?:up\s*to|upto|max(?:imum)?|not exceeding)\b', re.IGNORECASE)
+
+CURRENCY_MARKERS = [
+    (re.compile(r'₹|\brs\.?(?=\s|\d)|\binr\b', re.IGNORECASE), 'INR'),
+    (re.compile(r'\bc\$|\bcad\b', re.IGNORECASE), 'CAD'),
+    (re.compile(r'\ba\$|\baud\b', re.IGNORECASE), 'AUD'),
+    (re.compile(r'\bs\$|\bsgd\b', re.IGNORECASE), 'SGD'),
+    (re.compile(r'\$|\busd\b', re.IGNORECASE), 'USD'),
+    (re.compile(r'€|\beur\b', re.IGNORECASE), 'EUR'),
+    (re.compile(r'£|\bgbp\b', re.IGNORECASE), 'GBP'),
+    (re.compile(r'¥|\bjpy\b', re.IGNORECASE), 'JPY'),
+]
+
+
+def parse_amount_range(text):
+    """
+    Figures and currency mentioned in a free-text amount
+    
+    Returns:
+        tuple: (low, high, currency) in the text's own currency; low is None
+        for "up to" amounts, all three are None when there is no figure
+        (percentages do not count) and currency is None when the text does
+        not name one
+    """
+    if not text:
+        return None, None, None
+    
+    matches = FIGURE_PATTERN.findall(text)
+    if not matches:
+        return None, None, None
+    
+    is_range = len(matches) >= 2 and RANGE_PATTERN.search(text) is not None
+    if is_range and not matches[0][1]:
+        # "1-2 lakh": the unit after a range applies to both ends
+        matches[0] = (matches[0][0], matches[-1][1])
+    
+    figures = [
+        float(number.replace(',', '')) * (UNIT_MULTIPLIERS[unit.lower().rstrip('s')] if unit else 1)
+        for number, unit in matches
+    ]
+    
+    currency = next((code for pattern, code in CURRENCY_MARKERS if pattern.search(text)), None)
+    
+    high = max(figures)
+    if UP_TO_PATTERN.search(text):
+        return None, high, currency
+    if is_range:
+        return min(figures), high, currency
+    return high, high, currency
+
+
+def normalize_amount(text, currency=None, rates=None):
+    """
+    Parse an amount into CANONICAL_CURRENCY
+    
+    Args:
+        text: Free-text amount
+        currency: Scholarship.currency, used when the text names none
+        rates: {currency: rate_to_inr}; defaults to the cached table
+    
+    Returns:
+        tuple: (amount_min, amount_max), (None, None) when the text has no
+        figure or the currency has no known rate
+    """
+    low, high, detected = parse_amount_range(text)
+    if high is None:
+        return None, None
+    
+    code = (detected or currency or CANONICAL_CURRENCY).upper()
+    if code == CANONICAL_CURRENCY:
+        rate = 1.0
+    else:
+        rate = (get_currency_rates().get() if rates is None else rates).get(code)
+    if rate is None:
+        return None, None
+    return (round(low * rate, 2) if low is not None else None), round(high * rate, 2)
+
+
+class CurrencyRates:
+    """In-memory copy of currency_rates, reloaded every TTL_SECONDS"""
+    
+    TTL_SECONDS = 3600
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rates = {}
+        self._loaded_at = None
+    
+    def get(self, connection=None):
+        """
+        {currency: rate_to_inr}
+        
+        Args:
+            connection: Connection to load through (e.g. inside a flush);
+                defaults to the session
+        """
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.TTL_SECONDS:
+                return self._rates
+        
+        query = select(CurrencyRate.currency, CurrencyRate.rate_to_inr)
+        rows = (connection or db.session).execute(query).all()
+        with self._lock:
+            self._rates = {code.upper(): rate for code, rate in rows}
+            self._loaded_at = time.monotonic()
+            return self._rates
+    
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+
+# Singleton instance
+_currency_rates = None
+
+def get_currency_rates():
+    """Get or create currency rate cache singleton"""
+    global _currency_rates
+    if _currency_rates is None:
+        _currency_rates = CurrencyRates()
+    return _currency_rates
+
+
+@event.listens_for(Scholarship, 'before_insert')
+@event.listens_for(Scholarship, 'before_update')
+def _normalize_on_write(mapper, connection, target):
+    """Keep amount_min/amount_max in step with amount and currency"""
+    state = inspect(target)
+    if state.persistent and not (
+        state.attrs.amount.history.has_changes() or state.attrs.currency.history.has_changes()
+    ):
+        return
+    target.amount_min, target.amount_max = normalize_amount(
+        target.amount, target.currency, get_currency_rates().get(connection)
+    )
+
+
+def set_currency_rate(currency, rate_to_inr):
+    """Insert or update one exchange rate (caller commits)"""
+    stmt = pg_insert(CurrencyRate).values(
+        currency=currency.upper(), rate_to_inr=rate_to_inr, updated_at=datetime.utcnow()
+    )
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['currency'],
+        set_={'rate_to_inr': stmt.excluded.rate_to_inr, 'updated_at': stmt.excluded.updated_at}
+    ))
+    get_currency_rates().invalidate()
+
+
+def backfill_amounts(only_missing=True, batch_size=500):
+    """
+    Re-parse stored amounts in id order, one batched UPDATE per batch
+    
+    Args:
+        only_missing: Skip rows that already have amount_max
+    
+    Returns:
+        dict: Counts of rows scanned and normalized
+    """
+    rates = get_currency_rates().get()
+    result = {'scanned': 0, 'normalized': 0}
+    last_id = ''
+    
+    while True:
+        query = db.session.query(Scholarship.id, Scholarship.amount, Scholarship.currency).filter(
+            Scholarship.id > last_id,
+            Scholarship.amount.isnot(None)
+        )
+        if only_missing:
+            query = query.filter(Scholarship.amount_max.is_(None))
+        rows = query.order_by(Scholarship.id).limit(batch_size).all()
+        if not rows:
+            break
+        
+        now = datetime.utcnow()
+        updates = []
+        for scholarship_id, amount, currency in rows:
+            amount_min, amount_max = normalize_amount(amount, currency, rates)
+            updates.append({
+                'id': scholarship_id,
+                'amount_min': amount_min,
+                'amount_max': amount_max,
+                'updated_at': now  # So the search index poll sees the new amounts
+            })
+        
+        db.session.execute(update(Scholarship), updates)
+        db.session.commit()
+        
+        result['scanned'] += len(rows)
+        result['normalized'] += sum(1 for row in updates if row['amount_max'] is not None)
+        last_id = rows[-1].id
+    
+    print(f"💱 Normalized {result['normalized']} of {result['scanned']} scholarship amounts")
+    return result
@@ -0,0 +1,514 @@
+"""
+Scholarship Index - In-memory eligibility bitmaps for scholarship search
+
+Every active scholarship gets a slot. For each eligibility value (branch,
+year, gender, country, type) there is a uint64 bitmap with one bit per
+slot, plus a wildcard bitmap per array field for rows where the column is
+NULL ("open to everyone"). A search is a handful of bitwise ANDs/ORs over
+those bitmaps instead of OR-with-NULL predicates in Postgres. Required
+skills and normalized award amounts are kept per slot for ranking and the
+min_amount filter.
+
+The index follows the database three ways: ORM commits that touch
+scholarships mark them dirty, a poll on updated_at picks up writes from
+other processes (the bulk jobs run from the CLI), and a periodic rebuild
+drops deleted and expired rows.
+"""
+
+import bisect
+import os
+import threading
+import time
+from datetime import date, timedelta
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models.scholarships import Scholarship
+from app.services import scholarship_ranking
+from app.services.cache_service import invalidate_tags
+
+# field name -> (column, is an eligibility array where NULL means "any")
+FIELDS = {
+    'branch': ('eligible_branches', True),
+    'year': ('eligible_years', True),
+    'gender': ('eligible_genders', True),
+    'country': ('country', False),
+    'type': ('scholarship_type', False),
+    'skill': ('required_skills', True),  # Ranking only, never filtered on
+}
+
+SIMILARITY_FIELDS = ('type', 'country', 'skill')
+
+INDEX_COLUMNS = [
+    Scholarship.id, Scholarship.is_active, Scholarship.application_deadline, Scholarship.updated_at,
+    Scholarship.eligible_branches, Scholarship.eligible_years, Scholarship.eligible_genders,
+    Scholarship.country, Scholarship.scholarship_type, Scholarship.required_skills, Scholarship.amount_max
+]
+
+
+def normalize_skill(skill):
+    return skill.strip().lower()
+
+
+class ScholarshipEligibilityIndex:
+    """Slot-per-scholarship bitmaps with incremental updates"""
+    
+    INITIAL_CAPACITY = 1024  # Slots; always a multiple of 64
+    POLL_SECONDS = 30  # How often to look for rows changed by other processes
+    # Each poll re-reads this far behind the newest updated_at seen: a row
+    # stamped before that one may commit after it (long ingests, sweeps)
+    POLL_OVERLAP_SECONDS = 120
+    REBUILD_SECONDS = 3600  # Full reload, drops deleted and expired rows
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._reset(self.INITIAL_CAPACITY)
+        self._built_at = None
+        self._polled_at = 0.0
+        self._high_water = None  # Newest updated_at seen
+        self._dirty = set()
+    
+    def _reset(self, capacity):
+        self._capacity = capacity
+        self._slots = {}  # scholarship id -> slot
+        self._free = []
+        self._slot_values = {}  # slot -> {field: values}, to clear bits on update
+        self._ids = np.empty(capacity, dtype='<U36')
+        self._deadlines = np.full(capacity, -1, dtype=np.int32)  # date ordinals
+        self._amounts = np.full(capacity, np.nan)
+        self._skill_counts = np.zeros(capacity, dtype=np.int16)
+        self._live = self._empty()
+        self._bitmaps = {field: {} for field in FIELDS}
+        self._wildcards = {field: self._empty() for field, (_, is_array) in FIELDS.items() if is_array}
+        self._version = 0
+        self._deadline_cache = None
+    
+    def _empty(self):
+        return np.zeros(self._capacity // 64, dtype=np.uint64)
+    
+    def __len__(self):
+        return len(self._slots)
+    
+    # ------------------------------------------------------------------
+    # Bit operations
+    # ------------------------------------------------------------------
+    
+    @staticmethod
+    def _set(bitmap, slot):
+        bitmap[slot >> 6] |= np.uint64(1) << np.uint64(slot & 63)
+    
+    @staticmethod
+    def _clear(bitmap, slot):
+        bitmap[slot >> 6] &= ~(np.uint64(1) << np.uint64(slot & 63))
+    
+    @staticmethod
+    def _bits(bitmap, slots):
+        """0/1 float array with the bit of each slot in slots"""
+        return ((bitmap[slots >> 6] >> (slots & 63).astype(np.uint64)) & np.uint64(1)).astype(np.float64)
+    
+    def _grow(self):
+        """Double capacity, padding every bitmap with zero words"""
+        old_words = self._capacity // 64
+        self._capacity *= 2
+        pad = self._capacity // 64 - old_words
+        
+        def grown(bitmap):
+            return np.concatenate([bitmap, np.zeros(pad, dtype=np.uint64)])
+        
+        self._ids = np.concatenate([self._ids, np.empty(self._capacity - len(self._ids), dtype='<U36')])
+        self._deadlines = np.concatenate([
+            self._deadlines, np.full(self._capacity - len(self._deadlines), -1, dtype=np.int32)
+        ])
+        self._amounts = np.concatenate([self._amounts, np.full(self._capacity - len(self._amounts), np.nan)])
+        self._skill_counts = np.concatenate([
+            self._skill_counts, np.zeros(self._capacity - len(self._skill_counts), dtype=np.int16)
+        ])
+        self._live = grown(self._live)
+        self._wildcards = {field: grown(bitmap) for field, bitmap in self._wildcards.items()}
+        self._bitmaps = {
+            field: {value: grown(bitmap) for value, bitmap in values.items()}
+            for field, values in self._bitmaps.items()
+        }
+    
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+    
+    def upsert(self, row):
+        """
+        Add or replace one scholarship
+        
+        Args:
+            row: Object with the INDEX_COLUMNS attributes; inactive rows are removed
+        """
+        with self._lock:
+            if not row.is_active:
+                self.remove(row.id)
+                return
+            
+            slot = self._slots.get(row.id)
+            if slot is None:
+                if self._free:
+                    slot = self._free.pop()
+                else:
+                    slot = len(self._slots)
+                    if slot >= self._capacity:
+                        self._grow()
+                self._slots[row.id] = slot
+            else:
+                self._clear_slot(slot)
+            
+            values = {}
+            for field, (column, is_array) in FIELDS.items():
+                value = getattr(row, column)
+                if is_array:
+                    if value is None:
+                        self._set(self._wildcards[field], slot)
+                        values[field] = None
+                        continue
+                    if field == 'skill':
+                        value = map(normalize_skill, value)
+                    values[field] = list(set(value))
+                else:
+                    values[field] = [] if value is None else [value]
+                
+                for item in values[field]:
+                    bitmap = self._bitmaps[field].get(item)
+                    if bitmap is None:
+                        bitmap = self._bitmaps[field][item] = self._empty()
+                    self._set(bitmap, slot)
+            
+            self._slot_values[slot] = values
+            self._ids[slot] = row.id
+            self._deadlines[slot] = row.application_deadline.toordinal()
+            self._amounts[slot] = np.nan if row.amount_max is None else row.amount_max
+            self._skill_counts[slot] = len(values['skill'] or ())
+            self._set(self._live, slot)
+            self._version += 1
+    
+    def remove(self, scholarship_id):
+        """Drop a scholarship if indexed"""
+        with self._lock:
+            slot = self._slots.pop(scholarship_id, None)
+            if slot is None:
+                return
+            self._clear_slot(slot)
+            self._ids[slot] = ''
+            self._deadlines[slot] = -1
+            self._amounts[slot] = np.nan
+            self._skill_counts[slot] = 0
+            self._free.append(slot)
+            self._version += 1
+    
+    def _clear_slot(self, slot):
+        self._clear(self._live, slot)
+        for field, values in self._slot_values.pop(slot, {}).items():
+            if values is None:
+                self._clear(self._wildcards[field], slot)
+                continue
+            for item in values:
+                self._clear(self._bitmaps[field][item], slot)
+    
+    def build(self, rows):
+        """Replace the whole index with rows"""
+        with self._lock:
+            self._reset(self.INITIAL_CAPACITY)
+            for row in rows:
+                self.upsert(row)
+    
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+    
+    def _deadline_mask(self, today_ordinal):
+        """Bitmap of slots whose deadline has not passed, cached per day and version"""
+        key = (today_ordinal, self._version, self._capacity)
+        if self._deadline_cache is None or self._deadline_cache[0] != key:
+            mask = np.packbits(self._deadlines >= today_ordinal, bitorder='little').view(np.uint64)
+            self._deadline_cache = (key, mask)
+        return self._deadline_cache[1]
+    
+    def _match_slots(self, branch, year, gender, countries, types, min_amount, today):
+        """Slots of eligible, open scholarships; caller holds the lock"""
+        result = self._live & self._deadline_mask(today.toordinal())
+        
+        if min_amount:
+            # Unknown amounts (NaN) pass, like amount_max IS NULL in SQL
+            result &= np.packbits(~(self._amounts < min_amount), bitorder='little').view(np.uint64)
+        
+        for field, value in (('branch', branch), ('year', year), ('gender', gender)):
+            if value:
+                bitmap = self._bitmaps[field].get(value)
+                result &= self._wildcards[field] if bitmap is None else (bitmap | self._wildcards[field])
+        
+        for field, wanted in (('country', countries), ('type', types)):
+            if wanted:
+                allowed = self._empty()
+                for value in wanted:
+                    bitmap = self._bitmaps[field].get(value)
+                    if bitmap is not None:
+                        allowed |= bitmap
+                result &= allowed
+        
+        return np.flatnonzero(np.unpackbits(result.view(np.uint8), bitorder='little'))
+    
+    def match(self, branch=None, year=None, gender=None, countries=None, types=None, min_amount=None, today=None):
+        """
+        Eligible, open scholarships for one set of preferences
+        
+        Same semantics as the SQL filters: an array field matches when it
+        contains the value or is NULL; country and type must be in the lists;
+        amount_max must reach min_amount unless it is unknown.
+        
+        Returns:
+            tuple: (ids ordered by deadline then id, numpy array of deadline ordinals)
+        """
+        today = today or date.today()
+        with self._lock:
+            slots = self._match_slots(branch, year, gender, countries, types, min_amount, today)
+            ids = self._ids[slots]
+            deadlines = self._deadlines[slots]
+        
+        order = np.lexsort((ids, deadlines))
+        return ids[order].tolist(), deadlines[order]
+    
+    def rank(self, branch=None, year=None, gender=None, countries=None, types=None,
+             skills=None, min_amount=None, saved_ids=(), today=None):
+        """
+        Eligible, open scholarships ordered by relevance (see scholarship_ranking)
+        
+        Args:
+            skills: The student's skills
+            min_amount: Smallest award the student is interested in
+            saved_ids: Ids the student saved, for similarity
+        
+        Returns:
+            tuple: (ids ordered by score descending then id, numpy array of scores)
+        """
+        today = today or date.today()
+        skills = {normalize_skill(skill) for skill in skills or ()}
+        with self._lock:
+            slots = self._match_slots(branch, year, gender, countries, types, min_amount, today)
+            
+            overlap = np.zeros(len(slots))
+            for skill in skills:
+                bitmap = self._bitmaps['skill'].get(skill)
+                if bitmap is not None:
+                    overlap += self._bits(bitmap, slots)
+            
+            components = {
+                'skills': scholarship_ranking.skill_scores(overlap, self._skill_counts[slots], bool(skills)),
+                'amount': scholarship_ranking.amount_scores(self._amounts[slots], min_amount),
+                'deadline': scholarship_ranking.deadline_scores(self._deadlines[slots], today.toordinal()),
+                'similarity': self._similarity(slots, saved_ids)
+            }
+            ids = self._ids[slots]
+        
+        scores = scholarship_ranking.combine(components)
+        order = np.lexsort((ids, -scores))
+        return ids[order].tolist(), scores[order]
+    
+    def _similarity(self, slots, saved_ids):
+        """
+        Resemblance of each slot to the saved scholarships; caller holds the lock
+        
+        Each saved value weighs the share of saved scholarships that have it.
+        A candidate scores the mean, over SIMILARITY_FIELDS, of the weights of
+        its values (skills averaged over the candidate's skill count).
+        """
+        saved = [self._slots[scholarship_id] for scholarship_id in saved_ids if scholarship_id in self._slots]
+        if not saved:
+            return np.full(len(slots), scholarship_ranking.NEUTRAL)
+        
+        total = np.zeros(len(slots))
+        for field in SIMILARITY_FIELDS:
+            weights = {}
+            for slot in saved:
+                for value in self._slot_values[slot][field] or ():
+                    weights[value] = weights.get(value, 0) + 1 / len(saved)
+            
+            component = np.zeros(len(slots))
+            for value, weight in weights.items():
+                component += weight * self._bits(self._bitmaps[field][value], slots)
+            if field == 'skill':
+                component /= np.maximum(self._skill_counts[slots], 1)
+            total += component
+        
+        return total / len(SIMILARITY_FIELDS)
+    
+    def match_preferences(self, preferences, today=None):
+        """match() for a UserScholarshipPreference row (or None for no filters)"""
+        if preferences is None:
+            return self.match(today=today)
+        return self.match(
+            branch=preferences.branch,
+            year=preferences.current_year,
+            gender=preferences.gender,
+            countries=preferences.preferred_countries,
+            types=preferences.preferred_types,
+            min_amount=preferences.min_amount,
+            today=today
+        )
+    
+    def rank_preferences(self, preferences, saved_ids=(), today=None):
+        """rank() for a UserScholarshipPreference row (or None for no filters)"""
+        if preferences is None:
+            return self.rank(saved_ids=saved_ids, today=today)
+        return self.rank(
+            branch=preferences.branch,
+            year=preferences.current_year,
+            gender=preferences.gender,
+            countries=preferences.preferred_countries,
+            types=preferences.preferred_types,
+            skills=preferences.skills,
+            min_amount=preferences.min_amount,
+            saved_ids=saved_ids,
+            today=today
+        )
+    
+    # ------------------------------------------------------------------
+    # Keeping up with the database
+    # ------------------------------------------------------------------
+    
+    def mark_dirty(self, scholarship_ids):
+        with self._lock:
+            self._dirty.update(scholarship_ids)
+    
+    def ensure_fresh(self):
+        """Rebuild or apply pending changes when due; cheap when nothing changed"""
+        now = time.monotonic()
+        if self._built_at is not None and not self._dirty and now - self._polled_at < self.POLL_SECONDS:
+            return
+        
+        # One refresher at a time; others search the current snapshot
+        if not self._refresh_lock.acquire(blocking=self._built_at is None):
+            return
+        try:
+            if self._built_at is None or now - self._built_at >= self.REBUILD_SECONDS:
+                self.rebuild_from_db()
+            else:
+                self.refresh_from_db()
+        finally:
+            self._refresh_lock.release()
+    
+    def rebuild_from_db(self):
+        """Load every active, open scholarship"""
+        started = time.perf_counter()
+        rows = Scholarship.query.with_entities(*INDEX_COLUMNS).filter(
+            Scholarship.is_active == True,
+            Scholarship.application_deadline >= date.today()
+        ).all()
+        
+        with self._lock:
+            self.build(rows)
+            self._dirty = set()
+            self._high_water = max((row.updated_at for row in rows if row.updated_at), default=None)
+            self._built_at = self._polled_at = time.monotonic()
+        
+        print(f"📇 Scholarship index built: {len(rows)} rows in {(time.perf_counter() - started) * 1000:.0f}ms")
+    
+    def refresh_from_db(self):
+        """Apply ORM-marked changes and rows updated since the last poll"""
+        with self._lock:
+            dirty = self._dirty
+            self._dirty = set()
+            high_water = self._high_water
+        
+        query = Scholarship.query.with_entities(*INDEX_COLUMNS)
+        if high_water is not None:
+            condition = Scholarship.updated_at >= high_water - timedelta(seconds=self.POLL_OVERLAP_SECONDS)
+            if dirty:
+                condition = condition | Scholarship.id.in_(list(dirty))
+            rows = query.filter(condition).all()
+        else:
+            rows = query.filter(Scholarship.id.in_(list(dirty))).all() if dirty else []
+        
+        with self._lock:
+            for row in rows:
+                self.upsert(row)
+                if row.updated_at and (self._high_water is None or row.updated_at > self._high_water):
+                    self._high_water = row.updated_at
+            
+            # Marked but gone: deleted
+            for scholarship_id in dirty - {row.id for row in rows}:
+                self.remove(scholarship_id)
+            
+            self._polled_at = time.monotonic()
+
+
+# ------------------------------------------------------------------
+# Change tracking: ORM writes are collected per session and applied to
+# this process's index and search cache after commit
+# ------------------------------------------------------------------
+
+SEARCH_CACHE_TAG = 'scholarships'  # Every cached search page depends on it
+
+
+def scholarships_changed(scholarship_ids=()):
+    """Mark committed scholarship writes: index rows dirty, search cache stale"""
+    if scholarship_ids and _scholarship_index is not None:
+        _scholarship_index.mark_dirty(scholarship_ids)
+    invalidate_tags(SEARCH_CACHE_TAG)
+
+
+def _record_change(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('scholarship_changes', set()).add(target.id)
+
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Scholarship, _event_name, _record_change)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    changes = session.info.pop('scholarship_changes', None)
+    if changes:
+        scholarships_changed(changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('scholarship_changes', None)
+
+
+# Singleton instance
+_scholarship_index = None
+_scholarship_index_lock = threading.Lock()
+
+def index_enabled():
+    """SCHOLARSHIP_INDEX=off falls back to the SQL filters"""
+    return os.getenv('SCHOLARSHIP_INDEX', 'on').lower() not in ('off', 'false', '0')
+
+
+def get_scholarship_index():
+    """Get or create the index singleton, brought up to date"""
+    global _scholarship_index
+    if _scholarship_index is None:
+        with _scholarship_index_lock:
+            if _scholarship_index is None:
+                _scholarship_index = ScholarshipEligibilityIndex()
+    _scholarship_index.ensure_fresh()
+    return _scholarship_index
+
+
+def keyset_slice(ids, deadlines, after=None, limit=None):
+    """
+    Page of match() output following a (deadline, id) cursor
+    
+    Args:
+        ids: Ordered ids from match()
+        deadlines: Matching deadline ordinals from match()
+        after: (date, id) of the last row already returned, or None
+        limit: Maximum ids to return
+    """
+    start = 0
+    if after is not None:
+        deadline, scholarship_id = after
+        ordinal = deadline.toordinal()
+        low = int(np.searchsorted(deadlines, ordinal, side='left'))
+        high = int(np.searchsorted(deadlines, ordinal, side='right'))
+        start = bisect.bisect_right(ids, scholarship_id, low, high)
+    return ids[start:start + limit] if limit is not None else ids[start:]
@@ -0,0 +1,272 @@
+"""
+Scholarship Matching - Reverse index from preference values to users
+
+The search index answers "which scholarships fit this user". This one
+answers the opposite: for every preference value (branch, year, gender,
+country, type) it keeps the set of user ids that chose it, plus the set
+of users who left the field open. A new or changed scholarship resolves to
+its audience by a few set unions and one intersection, instead of running
+every user's search, and the notifications go out in one bulk insert.
+"""
+
+import threading
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app import db
+from app.models.notifications import Notification, UserNotificationPreference
+from app.models.scholarships import Scholarship, UserScholarshipPreference
+from app.models.utils import generate_uuid
+
+# field -> (preference column, scholarship column, scholarship side is an eligibility array)
+FIELDS = {
+    'branch': ('branch', 'eligible_branches', True),
+    'year': ('current_year', 'eligible_years', True),
+    'gender': ('gender', 'eligible_genders', True),
+    'country': ('preferred_countries', 'country', False),
+    'type': ('preferred_types', 'scholarship_type', False),
+}
+
+PREFERENCE_COLUMNS = [
+    UserScholarshipPreference.user_id, UserScholarshipPreference.updated_at,
+    UserScholarshipPreference.min_amount,
+] + [getattr(UserScholarshipPreference, column) for column, _, _ in FIELDS.values()]
+
+NOTIFY_BATCH_SIZE = 1000
+
+
+class PreferenceMatchIndex:
+    """value -> user ids, per preference field"""
+    
+    POLL_SECONDS = 30  # Pick up preference changes
+    POLL_OVERLAP_SECONDS = 120  # Rows stamped earlier may commit later; re-reading is harmless
+    REBUILD_SECONDS = 3600  # Full reload, drops deleted preferences
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self._built_at = None
+        self._polled_at = 0.0
+        self._high_water = None
+    
+    def _reset(self):
+        self._by_value = {field: {} for field in FIELDS}
+        self._unrestricted = {field: set() for field in FIELDS}  # Users who left the field empty
+        self._user_values = {}  # user_id -> {field: values}, to undo on update
+        self._min_amounts = {}  # user_id -> min_amount (INR), only when set
+    
+    def __len__(self):
+        return len(self._user_values)
+    
+    def upsert(self, row):
+        """Add or replace one user's preferences (a PREFERENCE_COLUMNS row)"""
+        with self._lock:
+            self.remove(row.user_id)
+            
+            values = {}
+            for field, (column, _, _) in FIELDS.items():
+                value = getattr(row, column)
+                if value is None:
+                    items = []
+                elif isinstance(value, (list, tuple)):
+                    items = list(value)
+                else:
+                    items = [value]
+                values[field] = items
+                if not items:
+                    self._unrestricted[field].add(row.user_id)
+                for item in items:
+                    self._by_value[field].setdefault(item, set()).add(row.user_id)
+            
+            self._user_values[row.user_id] = values
+            if row.min_amount:
+                self._min_amounts[row.user_id] = row.min_amount
+    
+    def remove(self, user_id):
+        with self._lock:
+            values = self._user_values.pop(user_id, None)
+            if values is None:
+                return
+            for field, items in values.items():
+                self._unrestricted[field].discard(user_id)
+                for item in items:
+                    users = self._by_value[field].get(item)
+                    if users is not None:
+                        users.discard(user_id)
+                        if not users:
+                            del self._by_value[field][item]
+            self._min_amounts.pop(user_id, None)
+    
+    def build(self, rows):
+        with self._lock:
+            self._reset()
+            for row in rows:
+                self.upsert(row)
+    
+    def match(self, scholarship):
+        """
+        Users whose search would return this scholarship
+        
+        Mirrors the search filters: an eligibility array that is NULL is
+        open to everyone, a user's empty field accepts anything, country and
+        type must be in the user's lists, and amount_max must reach the
+        user's min_amount unless it is unknown.
+        
+        Args:
+            scholarship: Object with the Scholarship eligibility columns and amount_max
+        
+        Returns:
+            set: Matching user ids
+        """
+        with self._lock:
+            allowed_sets = []
+            for field, (_, column, is_array) in FIELDS.items():
+                value = getattr(scholarship, column)
+                if is_array and value is None:
+                    continue  # Open to everyone
+                
+                allowed = set(self._unrestricted[field])
+                for item in (value if is_array else [value] if value is not None else []):
+                    allowed |= self._by_value[field].get(item, set())
+                allowed_sets.append(allowed)
+            
+            if allowed_sets:
+                allowed_sets.sort(key=len)
+                users = allowed_sets[0].intersection(*allowed_sets[1:])
+            else:
+                users = set(self._user_values)
+            
+            amount_max = getattr(scholarship, 'amount_max', None)
+            if amount_max is not None and self._min_amounts:
+                users = {user_id for user_id in users if self._min_amounts.get(user_id, 0) <= amount_max}
+            return users
+    
+    # ------------------------------------------------------------------
+    # Keeping up with the database
+    # ------------------------------------------------------------------
+    
+    def ensure_fresh(self):
+        now = time.monotonic()
+        if self._built_at is None or now - self._built_at >= self.REBUILD_SECONDS:
+            rows = UserScholarshipPreference.query.with_entities(*PREFERENCE_COLUMNS).all()
+            with self._lock:
+                self.build(rows)
+                self._high_water = max((row.updated_at for row in rows if row.updated_at), default=None)
+                self._built_at = self._polled_at = now
+            return
+        
+        if now - self._polled_at < self.POLL_SECONDS:
+            return
+        query = UserScholarshipPreference.query.with_entities(*PREFERENCE_COLUMNS)
+        if self._high_water is not None:
+            query = query.filter(
+                UserScholarshipPreference.updated_at >= self._high_water - timedelta(seconds=self.POLL_OVERLAP_SECONDS)
+            )
+        with self._lock:
+            for row in query.all():
+                self.upsert(row)
+                if row.updated_at and (self._high_water is None or row.updated_at > self._high_water):
+                    self._high_water = row.updated_at
+            self._polled_at = now
+
+
+# Singleton instance
+_match_index = None
+_match_index_lock = threading.Lock()
+
+def get_match_index():
+    """Get or create the reverse preference index, brought up to date"""
+    global _match_index
+    if _match_index is None:
+        with _match_index_lock:
+            if _match_index is None:
+                _match_index = PreferenceMatchIndex()
+    _match_index.ensure_fresh()
+    return _match_index
+
+
+def match_notification(user_id, scholarship, now):
+    """Notification row for one user and one new scholarship match"""
+    return {
+        'id': generate_uuid(),
+        'user_id': user_id,
+        'title': 'New scholarship match',
+        'message': (
+            f"{scholarship.title}"
+            + (f" by {scholarship.provider}" if scholarship.provider else '')
+            + f" - apply by {scholarship.application_deadline.strftime('%d %b %Y')}"
+        ),
+        'feature': 'scholarship',
+        'source_id': scholarship.id,
+        'source_type': 'scholarship',
+        'action_url': f"/scholarships/{scholarship.id}",
+        'action_data': {
+            'scholarship_id': scholarship.id,
+            'application_deadline': scholarship.application_deadline.isoformat()
+        },
+        'dedupe_key': f"scholarship_match:{scholarship.id}",
+        'is_read': False,
+        'created_at': now
+    }
+
+
+def insert_notifications(rows):
+    """
+    Bulk insert notification dicts, skipping (user_id, dedupe_key) pairs
+    that already exist (caller commits)
+    
+    Returns:
+        int: Notifications actually inserted
+    """
+    inserted = 0
+    for start in range(0, len(rows), NOTIFY_BATCH_SIZE):
+        stmt = pg_insert(Notification).values(rows[start:start + NOTIFY_BATCH_SIZE]).on_conflict_do_nothing(
+            index_elements=['user_id', 'dedupe_key']
+        )
+        inserted += db.session.execute(stmt).rowcount
+    return inserted
+
+
+def notify_matching_users(scholarship_ids):
+    """
+    Notify every user whose preferences match the given scholarships
+    
+    Safe to repeat: each user gets at most one notification per
+    scholarship, so updated scholarships only reach newly matching users.
+    Users with notifications turned off are skipped.
+    
+    Returns:
+        dict: Counts of scholarships checked, matches and notifications created
+    """
+    result = {'scholarships': 0, 'matched': 0, 'notified': 0}
+    if not scholarship_ids:
+        return result
+    
+    scholarships = Scholarship.query.filter(
+        Scholarship.id.in_(list(scholarship_ids)),
+        Scholarship.is_active == True,
+        Scholarship.application_deadline >= date.today()
+    ).all()
+    if not scholarships:
+        return result
+    
+    index = get_match_index()
+    muted = {
+        user_id for (user_id,) in db.session.query(UserNotificationPreference.user_id).filter(
+            UserNotificationPreference.notifications_enabled == False
+        ).all()
+    }
+    
+    now = datetime.utcnow()
+    rows = []
+    for scholarship in scholarships:
+        users = index.match(scholarship) - muted
+        result['matched'] += len(users)
+        rows.extend(match_notification(user_id, scholarship, now) for user_id in users)
+    
+    result['scholarships'] = len(scholarships)
+    result['notified'] = insert_notifications(rows)
+    db.session.commit()
+    
+    print(f"🔔 {result['notified']} scholarship match notifications for {len(scholarships)} scholarships")
+    return result
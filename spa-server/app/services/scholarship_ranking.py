@@ -0,0 +1,79 @@
+"""
+Scholarship Ranking - Vectorized relevance scores for search candidates
+
+Every component is a numpy array over the candidate set, scaled to 0..1,
+and the final score is their weighted sum:
+
+- skills: share of a scholarship's required skills the student has
+- amount: award amount (amount_max, INR) against the student's min_amount
+- deadline: closer deadlines first, halving every DEADLINE_HALF_LIFE_DAYS
+- similarity: resemblance to the scholarships the student has saved
+"""
+
+import numpy as np
+
+WEIGHTS = {
+    'skills': 0.35,
+    'amount': 0.25,
+    'deadline': 0.2,
+    'similarity': 0.2,
+}
+
+DEADLINE_HALF_LIFE_DAYS = 30
+AMOUNT_SCALE_INR = 1_000_000  # Awards at or above this score 1.0 without a min_amount
+NEUTRAL = 0.5  # Score for candidates the component cannot judge
+
+def skill_scores(overlap, required_counts, has_skills):
+    """Matched share of required skills; neutral when nothing is required"""
+    if not has_skills:
+        return np.full(len(overlap), NEUTRAL)
+    return np.where(required_counts > 0, overlap / np.maximum(required_counts, 1), NEUTRAL)
+
+
+def amount_scores(amounts, min_amount=None):
+    """
+    Award amount score
+    
+    With min_amount: the share of it the award covers (1.0 at or above).
+    Without: log-scaled against the fixed AMOUNT_SCALE_INR, so a score
+    does not move when the candidate set does.
+    """
+    known = ~np.isnan(amounts)
+    if min_amount:
+        return np.where(known, np.clip(np.nan_to_num(amounts) / min_amount, 0.0, 1.0), NEUTRAL)
+    
+    scaled = np.log1p(np.maximum(np.nan_to_num(amounts), 0.0)) / np.log1p(AMOUNT_SCALE_INR)
+    return np.where(known, np.minimum(scaled, 1.0), NEUTRAL)
+
+
+def deadline_scores(deadlines, today_ordinal):
+    """1.0 for a deadline today, halving every DEADLINE_HALF_LIFE_DAYS"""
+    days_left = np.maximum(deadlines - today_ordinal, 0)
+    return np.power(0.5, days_left / DEADLINE_HALF_LIFE_DAYS)
+
+
+def combine(components):
+    """Weighted sum of the component arrays"""
+    return sum(WEIGHTS[name] * values for name, values in components.items())
+
+
+def relevance_keyset_slice(ids, scores, after=None, limit=None):
+    """
+    Page of rank() output following a (score, id) cursor
+    
+    Args:
+        ids: Ids ordered by score descending, then id
+        scores: Matching scores
+        after: (score, id) of the last row already returned, or None
+        limit: Maximum ids to return
+    
+    Returns:
+        tuple: (ids, scores) of the page
+    """
+    start = 0
+    if after is not None:
+        score, scholarship_id = after
+        later = (scores < score) | ((scores == score) & (np.asarray(ids) > scholarship_id))
+        start = int(np.argmax(later)) if later.any() else len(ids)
+    end = start + limit if limit is not None else len(ids)
+    return ids[start:end], scores[start:end]
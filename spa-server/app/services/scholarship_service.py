@@ -0,0 +1,479 @@
+"""
+Scholarship Service - Bulk feed ingestion, expiry sweeps and deadline reminders
+
+Feeds (CSV with a header row, a JSON array, or JSON Lines) are parsed and
+validated record by record and streamed into a temporary staging table
+with COPY, so memory stays flat however large the feed is. One set-based
+pass then dedupes the feed on provider + title + deadline (last record
+wins), updates scholarships that already exist and changed, inserts the
+rest and upserts their ScholarshipCriteria. Users matching the inserted
+or changed scholarships are notified afterwards.
+
+COPY bypasses the ORM, so amounts are normalized here and updated_at is
+set explicitly; the search index picks the rows up on its next poll.
+
+Deadline reminders for saved scholarships are one INSERT ... SELECT over
+user_saved_scholarships; dedupe keys make reruns harmless.
+"""
+
+import csv
+import io
+import json
+import uuid
+from datetime import date, datetime
+from sqlalchemy import select, text, update
+from app import db
+from app.models.scholarships import Scholarship
+from app.services.scholarship_amounts import get_currency_rates, normalize_amount
+from app.services.scholarship_matching import notify_matching_users
+
+INGEST_LOCK_KEY = 7240046  # pg_advisory_xact_lock key; one ingest at a time
+MAX_REPORTED_ERRORS = 20
+
+ARRAY_FIELDS = ('eligible_branches', 'eligible_years', 'eligible_genders', 'required_skills')
+CRITERIA_FIELDS = ('min_gpa', 'min_percentage', 'max_family_income', 'income_currency')
+
+# Staging column order; also the COPY column list
+STAGING_COLUMNS = (
+    'row_no', 'id', 'title', 'description', 'provider', 'website_url', 'application_deadline',
+    'amount', 'currency', 'amount_min', 'amount_max', 'is_active',
+    'eligible_branches', 'eligible_years', 'eligible_genders', 'required_skills',
+    'country', 'scholarship_type',
+    'min_gpa', 'min_percentage', 'max_family_income', 'income_currency'
+)
+
+# Columns copied from the feed onto scholarships
+SCHOLARSHIP_COLUMNS = (
+    'title', 'description', 'provider', 'website_url', 'application_deadline',
+    'amount', 'currency', 'amount_min', 'amount_max', 'is_active',
+    'eligible_branches', 'eligible_years', 'eligible_genders', 'required_skills',
+    'country', 'scholarship_type'
+)
+
+# Days before the deadline; a saved scholarship gets one reminder per window
+REMINDER_WINDOWS = (7, 3, 1)
+
+DEDUPE_KEY = "coalesce({0}.provider, ''), {0}.title, {0}.application_deadline"
+
+
+# ------------------------------------------------------------------
+# Feed parsing
+# ------------------------------------------------------------------
+
+def read_feed(stream, feed_format):
+    """
+    Yield raw records from a feed
+    
+    JSON Lines records are yielded as unparsed lines; clean_record parses
+    them, so a malformed line counts as one invalid record.
+    
+    Args:
+        stream: Text file object
+        feed_format: 'csv', 'json' (array) or 'jsonl'
+    """
+    if feed_format == 'csv':
+        yield from csv.DictReader(stream)
+    elif feed_format == 'jsonl':
+        for line in stream:
+            if line.strip():
+                yield line
+    elif feed_format == 'json':
+        records = json.load(stream)
+        if isinstance(records, dict):
+            records = records.get('scholarships', [])
+        yield from records
+    else:
+        raise ValueError(f"Unknown feed format: {feed_format}")
+
+
+def _text(value, max_length=None):
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value:
+        return None
+    if max_length and len(value) > max_length:
+        raise ValueError(f"longer than {max_length} characters: {value[:40]}...")
+    return value
+
+
+def _number(value):
+    value = _text(value)
+    return float(value) if value is not None else None
+
+
+def _list(value, item_type=str):
+    """Array field from a JSON list or a '|', ';' or ',' separated string"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        separator = next((sep for sep in ('|', ';', ',') if sep in value), None)
+        value = value.split(separator) if separator else [value]
+    items = [item_type(str(item).strip()) for item in value if str(item).strip()]
+    return items or None
+
+
+def _flag(value, default=True):
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y', 't')
+
+
+def clean_record(record, rates):
+    """
+    Validate one feed record (a dict, or a JSON Lines line) into a staging row dict
+    
+    Raises:
+        ValueError: When a record is not valid JSON, a required field is
+            missing or a value is malformed
+    """
+    if isinstance(record, str):
+        record = json.loads(record)
+    if not isinstance(record, dict):
+        raise ValueError("record is not an object")
+    
+    title = _text(record.get('title'), 128)
+    website_url = _text(record.get('website_url'), 512)
+    deadline = _text(record.get('application_deadline'))
+    if not title or not website_url or not deadline:
+        raise ValueError("title, website_url and application_deadline are required")
+    
+    deadline = date.fromisoformat(deadline[:10])
+    amount = _text(record.get('amount'), 64)
+    currency = _text(record.get('currency'), 3)
+    amount_min, amount_max = normalize_amount(amount, currency, rates)
+    
+    return {
+        'title': title,
+        'description': _text(record.get('description')),
+        'provider': _text(record.get('provider'), 128),
+        'website_url': website_url,
+        'application_deadline': deadline,
+        'amount': amount,
+        'currency': currency.upper() if currency else None,
+        'amount_min': amount_min,
+        'amount_max': amount_max,
+        'is_active': _flag(record.get('is_active')) and deadline >= date.today(),  # Expired records land inactive
+        'eligible_branches': _list(record.get('eligible_branches')),
+        'eligible_years': _list(record.get('eligible_years'), int),
+        'eligible_genders': _list(record.get('eligible_genders')),
+        'required_skills': _list(record.get('required_skills')),
+        'country': _text(record.get('country'), 64),
+        'scholarship_type': _text(record.get('scholarship_type'), 32),
+        'min_gpa': _number(record.get('min_gpa')),
+        'min_percentage': _number(record.get('min_percentage')),
+        'max_family_income': _number(record.get('max_family_income')),
+        'income_currency': _text(record.get('income_currency'), 3),
+    }
+
+
+def _pg_array(items):
+    """Postgres array literal for COPY ('{"a","b"}')"""
+    if not items:
+        return None
+    quoted = ('"' + str(item).replace('\\', '\\\\').replace('"', '\\"') + '"' for item in items)
+    return '{' + ','.join(quoted) + '}'
+
+
+class _CopyStream:
+    """File-like view over an iterator of CSV lines, read by COPY in chunks"""
+    
+    def __init__(self, lines):
+        self._lines = lines
+        self._buffer = b''
+    
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line.encode('utf-8')
+        if size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+
+def _staging_lines(records, stats, rates):
+    """CSV lines for COPY; invalid records are counted and skipped"""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    for row_no, record in enumerate(records, start=1):
+        try:
+            row = clean_record(record, rates)
+        except (ValueError, TypeError, AttributeError) as e:
+            stats['invalid'] += 1
+            if len(stats['errors']) < MAX_REPORTED_ERRORS:
+                stats['errors'].append(f"record {row_no}: {e}")
+            continue
+        
+        row['row_no'] = row_no
+        row['id'] = str(uuid.uuid4())
+        for field in ARRAY_FIELDS:
+            row[field] = _pg_array(row[field])
+        row['is_active'] = 't' if row['is_active'] else 'f'
+        row['application_deadline'] = row['application_deadline'].isoformat()
+        
+        writer.writerow(['' if row[column] is None else row[column] for column in STAGING_COLUMNS])
+        stats['staged'] += 1
+        line = out.getvalue()
+        out.seek(0)
+        out.truncate()
+        yield line
+
+
+# ------------------------------------------------------------------
+# Ingestion
+# ------------------------------------------------------------------
+
+def ingest_scholarships(records, notify=True):
+    """
+    Load feed records in one transaction
+    
+    Args:
+        records: Iterable of dicts (see read_feed); streamed, never held in full
+        notify: Notify users matching inserted or changed scholarships
+    
+    Returns:
+        dict: Counts of staged, invalid, inserted, updated, unchanged,
+        criteria rows and notifications, plus the first few validation errors
+    """
+    stats = {'staged': 0, 'invalid': 0, 'errors': []}
+    rates = get_currency_rates().get()
+    try:
+        result = _load_feed(records, stats, rates)
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    changed_ids = result.pop('changed_ids')
+    result['notified'] = 0
+    if notify and changed_ids:
+        # The feed is already committed; a notification failure must not undo it
+        try:
+            result['notified'] = notify_matching_users(changed_ids)['notified']
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Scholarship match notifications failed: {e}")
+    
+    print(
+        f"📥 Scholarship feed: {result['inserted']} inserted, {result['updated']} updated, "
+        f"{result['unchanged']} unchanged, {result['invalid']} invalid"
+    )
+    return result
+
+
+def _load_feed(records, stats, rates):
+    """Stage, dedupe and merge in one transaction (ingest_scholarships)"""
+    
+    # One ingest at a time; a second run waits instead of racing the inserts
+    db.session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': INGEST_LOCK_KEY})
+    
+    db.session.execute(text("""
+        CREATE TEMP TABLE scholarship_staging (
+            row_no integer NOT NULL,
+            id varchar(36) NOT NULL,
+            title varchar(128) NOT NULL,
+            description text,
+            provider varchar(128),
+            website_url varchar(512) NOT NULL,
+            application_deadline date NOT NULL,
+            amount varchar(64),
+            currency varchar(3),
+            amount_min double precision,
+            amount_max double precision,
+            is_active boolean NOT NULL,
+            eligible_branches varchar(64)[],
+            eligible_years integer[],
+            eligible_genders varchar(10)[],
+            required_skills varchar(32)[],
+            country varchar(64),
+            scholarship_type varchar(32),
+            min_gpa double precision,
+            min_percentage double precision,
+            max_family_income double precision,
+            income_currency varchar(3)
+        ) ON COMMIT DROP
+    """))
+    
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert(
+        f"COPY scholarship_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+        _CopyStream(_staging_lines(records, stats, rates))
+    )
+    
+    # Last record wins within the feed; matched rows take the existing id
+    db.session.execute(text(f"""
+        CREATE TEMP TABLE scholarship_feed ON COMMIT DROP AS
+        SELECT DISTINCT ON ({DEDUPE_KEY.format('st')}) st.*, false AS matched
+        FROM scholarship_staging st
+        ORDER BY {DEDUPE_KEY.format('st')}, st.row_no DESC
+    """))
+    db.session.execute(text(f"""
+        UPDATE scholarship_feed f SET id = s.id, matched = true
+        FROM scholarships s
+        WHERE ({DEDUPE_KEY.format('s')}) = ({DEDUPE_KEY.format('f')})
+    """))
+    
+    # updated_at is the write time, not the transaction start, so the search
+    # index's updated_at poll cannot have moved past these rows already
+    now = datetime.utcnow()
+    stamp = "clock_timestamp() AT TIME ZONE 'UTC'"
+    assignments = ', '.join(f"{column} = f.{column}" for column in SCHOLARSHIP_COLUMNS)
+    current = ', '.join(f"s.{column}" for column in SCHOLARSHIP_COLUMNS)
+    incoming = ', '.join(f"f.{column}" for column in SCHOLARSHIP_COLUMNS)
+    updated_ids = db.session.execute(text(f"""
+        UPDATE scholarships s SET {assignments}, updated_at = {stamp}
+        FROM scholarship_feed f
+        WHERE s.id = f.id AND f.matched
+          AND ({current}) IS DISTINCT FROM ({incoming})
+        RETURNING s.id
+    """)).scalars().all()
+    
+    inserted_ids = db.session.execute(text(f"""
+        INSERT INTO scholarships (id, {', '.join(SCHOLARSHIP_COLUMNS)}, created_at, updated_at)
+        SELECT f.id, {incoming}, :now, {stamp}
+        FROM scholarship_feed f
+        WHERE NOT f.matched
+        RETURNING id
+    """), {'now': now}).scalars().all()
+    
+    criteria = db.session.execute(text(f"""
+        INSERT INTO scholarship_criteria (scholarship_id, {', '.join(CRITERIA_FIELDS)})
+        SELECT f.id, {', '.join(f'f.{column}' for column in CRITERIA_FIELDS)}
+        FROM scholarship_feed f
+        WHERE num_nonnulls({', '.join(f'f.{column}' for column in CRITERIA_FIELDS)}) > 0
+        ON CONFLICT (scholarship_id) DO UPDATE SET
+            {', '.join(f'{column} = excluded.{column}' for column in CRITERIA_FIELDS)}
+        WHERE ({', '.join(f'scholarship_criteria.{column}' for column in CRITERIA_FIELDS)})
+            IS DISTINCT FROM ({', '.join(f'excluded.{column}' for column in CRITERIA_FIELDS)})
+    """)).rowcount
+    
+    deduped = db.session.execute(text("SELECT count(*) FROM scholarship_feed")).scalar()
+    db.session.commit()
+    
+    return {
+        'staged': stats['staged'],
+        'invalid': stats['invalid'],
+        'duplicates': stats['staged'] - deduped,
+        'inserted': len(inserted_ids),
+        'updated': len(updated_ids),
+        'unchanged': deduped - len(inserted_ids) - len(updated_ids),
+        'criteria': criteria,
+        'errors': stats['errors'],
+        'changed_ids': inserted_ids + updated_ids,
+    }
+
+
+def ingest_feed(path, feed_format=None, notify=True):
+    """
+    Ingest a feed file; the format defaults to the file extension
+    
+    Returns:
+        dict: See ingest_scholarships
+    """
+    feed_format = feed_format or path.rsplit('.', 1)[-1].lower()
+    with open(path, newline='', encoding='utf-8-sig') as stream:
+        return ingest_scholarships(read_feed(stream, feed_format), notify=notify)
+
+
+# ------------------------------------------------------------------
+# Expiry
+# ------------------------------------------------------------------
+
+def sweep_expired(batch_size=1000):
+    """
+    Deactivate active scholarships whose deadline has passed
+    
+    Works in short batches like the email purge, so rows locked by an
+    in-flight ingest are picked up on the next run.
+    
+    Returns:
+        dict: Count of deactivated scholarships
+    """
+    candidates = select(Scholarship.id).where(
+        Scholarship.is_active == True,
+        Scholarship.application_deadline < date.today()
+    ).limit(batch_size).with_for_update(skip_locked=True)
+    
+    deactivated = 0
+    while True:
+        stmt = update(Scholarship).where(Scholarship.id.in_(candidates.scalar_subquery())).values(
+            is_active=False,
+            updated_at=datetime.utcnow()
+        ).execution_options(synchronize_session=False)
+        count = db.session.execute(stmt).rowcount
+        db.session.commit()
+        
+        deactivated += count
+        if count < batch_size:
+            break
+    
+    print(f"🗓️ Deactivated {deactivated} expired scholarships")
+    return {'deactivated': deactivated}
+
+
+def send_deadline_reminders(today=None):
+    """
+    Remind users of saved scholarships whose deadline is near
+    
+    Each (user, scholarship) pair falls into the smallest REMINDER_WINDOWS
+    window that still covers its deadline, and that window's reminder is
+    sent once, so a missed run catches up with the current window instead
+    of sending stale ones. Users with notifications turned off are skipped.
+    
+    Args:
+        today: Reference date, defaults to today
+    
+    Returns:
+        dict: Count of reminders created
+    """
+    today = today or date.today()
+    windows = sorted(REMINDER_WINDOWS)
+    window = 'CASE ' + ' '.join(
+        f"WHEN s.application_deadline - :today <= {days} THEN {days}" for days in windows
+    ) + ' END'
+    
+    created = db.session.execute(text(f"""
+        INSERT INTO notifications (
+            id, user_id, title, message, feature, is_read, source_id, source_type,
+            action_url, action_data, dedupe_key, created_at
+        )
+        SELECT
+            md5(d.user_id || ':' || d.dedupe_key)::uuid::text,
+            d.user_id,
+            'Scholarship deadline approaching',
+            d.title || CASE d.days_left
+                WHEN 0 THEN ' closes today'
+                WHEN 1 THEN ' closes tomorrow'
+                ELSE ' closes in ' || d.days_left || ' days'
+            END,
+            'scholarship', false, d.scholarship_id, 'scholarship',
+            '/scholarships/' || d.scholarship_id,
+            jsonb_build_object(
+                'scholarship_id', d.scholarship_id,
+                'application_deadline', d.application_deadline,
+                'days_left', d.days_left
+            ),
+            d.dedupe_key,
+            :now
+        FROM (
+            SELECT
+                us.user_id, s.id AS scholarship_id, s.title, s.application_deadline,
+                s.application_deadline - :today AS days_left,
+                'scholarship_deadline:' || s.id || ':' || ({window}) AS dedupe_key
+            FROM user_saved_scholarships us
+            JOIN scholarships s ON s.id = us.scholarship_id
+            LEFT JOIN user_notification_preferences p ON p.user_id = us.user_id
+            WHERE s.is_active
+              AND s.application_deadline BETWEEN :today AND :today + {windows[-1]}
+              AND coalesce(p.notifications_enabled, true)
+        ) d
+        ON CONFLICT (user_id, dedupe_key) DO NOTHING
+    """), {'today': today, 'now': datetime.utcnow()}).rowcount
+    db.session.commit()
+    
+    print(f"⏰ Created {created} scholarship deadline reminders")
+    return {'reminders': created}
@@ -0,0 +1,50 @@
+"""email summary content hash and thread summaries
+
+Revision ID: 005_email_summary_dedupe
+Revises: 004_separate_module_ai_cache
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '005_email_summary_dedupe'
+down_revision = '004_separate_module_ai_cache'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Normalized body hash so identical content can reuse a summary
+    op.add_column('email_summaries', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index('idx_email_summary_hash', 'email_summaries', ['content_hash'])
+
+    # Incremental per-thread summaries
+    op.create_table(
+        'email_thread_summaries',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('thread_id', sa.String(length=255), nullable=False),
+        sa.Column('summary_text', sa.Text(), nullable=False),
+        sa.Column('key_points', postgresql.ARRAY(sa.String()), nullable=True),
+        sa.Column('action_items', postgresql.ARRAY(sa.String()), nullable=True),
+        sa.Column('priority', sa.String(length=16), nullable=True),
+        sa.Column('sentiment', sa.String(length=16), nullable=True),
+        sa.Column('model_used', sa.String(length=32), nullable=True),
+        sa.Column('message_ids', postgresql.ARRAY(sa.String()), nullable=False, server_default='{}'),
+        sa.Column('last_email_date', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['account_id'], ['email_accounts.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('account_id', 'thread_id', name='uq_thread_summary_account_thread')
+    )
+
+
+def downgrade():
+    op.drop_table('email_thread_summaries')
+    op.drop_index('idx_email_summary_hash', table_name='email_summaries')
+    op.drop_column('email_summaries', 'content_hash')
@@ -0,0 +1,39 @@
+"""local compressed email body store
+
+Revision ID: 006_email_body_store
+Revises: 005_email_summary_dedupe
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '006_email_body_store'
+down_revision = '005_email_summary_dedupe'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'email_bodies',
+        sa.Column('email_id', sa.Integer(), nullable=False),
+        sa.Column('text_data', sa.LargeBinary(), nullable=True),  # zlib-compressed
+        sa.Column('html_data', sa.LargeBinary(), nullable=True),  # zlib-compressed
+        sa.Column('attachments', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('links', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('size_bytes', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_accessed_at', sa.DateTime(), nullable=False, server_default=sa.text('NOW()')),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['email_id'], ['emails.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('email_id')
+    )
+    op.create_index('idx_email_body_accessed', 'email_bodies', ['last_accessed_at'])
+
+
+def downgrade():
+    op.drop_index('idx_email_body_accessed', table_name='email_bodies')
+    op.drop_table('email_bodies')
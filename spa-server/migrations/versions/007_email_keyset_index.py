@@ -0,0 +1,29 @@
+"""composite index for keyset pagination of emails
+
+Revision ID: 007_email_keyset_index
+Revises: 006_email_body_store
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007_email_keyset_index'
+down_revision = '006_email_body_store'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Matches ORDER BY email_date DESC, id DESC for one account
+    op.create_index(
+        'idx_email_account_date_id',
+        'emails',
+        ['account_id', sa.text('email_date DESC'), sa.text('id DESC')]
+    )
+
+
+def downgrade():
+    op.drop_index('idx_email_account_date_id', table_name='emails')
@@ -0,0 +1,38 @@
+"""per-account email counters
+
+Revision ID: 008_email_account_stats
+Revises: 007_email_keyset_index
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '008_email_account_stats'
+down_revision = '007_email_keyset_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Rows are built lazily on first /email/stats read
+    op.create_table(
+        'email_account_stats',
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('total_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('unread_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('starred_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('category_counts', postgresql.JSONB(astext_type=sa.Text()), nullable=False, server_default='{}'),
+        sa.Column('today_date', sa.Date(), nullable=True),
+        sa.Column('today_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['account_id'], ['email_accounts.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('account_id')
+    )
+
+
+def downgrade():
+    op.drop_table('email_account_stats')
@@ -0,0 +1,26 @@
+"""track where an email's category came from
+
+Revision ID: 009_email_category_source
+Revises: 008_email_account_stats
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '009_email_category_source'
+down_revision = '008_email_account_stats'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # rule, model, user or gmail
+    op.add_column('emails', sa.Column('category_source', sa.String(length=16), nullable=True))
+    op.execute("UPDATE emails SET category_source = CASE WHEN category = 'important' THEN 'gmail' ELSE 'rule' END")
+
+
+def downgrade():
+    op.drop_column('emails', 'category_source')
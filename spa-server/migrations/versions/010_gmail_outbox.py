@@ -0,0 +1,41 @@
+"""outbox for write-behind Gmail mutations
+
+Revision ID: 010_gmail_outbox
+Revises: 009_email_category_source
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '010_gmail_outbox'
+down_revision = '009_email_category_source'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'gmail_outbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('message_id', sa.String(length=255), nullable=False),
+        sa.Column('action', sa.String(length=16), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False, server_default=sa.text('NOW()')),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['account_id'], ['email_accounts.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_gmail_outbox_due', 'gmail_outbox', ['status', 'next_attempt_at'])
+    op.create_index('idx_gmail_outbox_account', 'gmail_outbox', ['account_id'])
+
+
+def downgrade():
+    op.drop_index('idx_gmail_outbox_account', table_name='gmail_outbox')
+    op.drop_index('idx_gmail_outbox_due', table_name='gmail_outbox')
+    op.drop_table('gmail_outbox')
@@ -0,0 +1,82 @@
+"""full-text search vector on emails
+
+Revision ID: 011_email_search
+Revises: 010_gmail_outbox
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '011_email_search'
+down_revision = '010_gmail_outbox'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('emails', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+
+    # Weighted: subject > sender > snippet > summary
+    op.execute("""
+        CREATE OR REPLACE FUNCTION emails_search_vector_update() RETURNS trigger AS $$
+        DECLARE
+            summary_words text;
+        BEGIN
+            SELECT s.summary_text || ' ' || coalesce(array_to_string(s.key_points, ' '), '')
+              INTO summary_words
+              FROM email_summaries s
+             WHERE s.email_id = NEW.id;
+
+            NEW.search_vector :=
+                setweight(to_tsvector('english', coalesce(NEW.subject, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(NEW.sender_name, '') || ' ' || coalesce(NEW.sender_email, '')), 'B') ||
+                setweight(to_tsvector('english', coalesce(NEW.snippet, '')), 'C') ||
+                setweight(to_tsvector('english', coalesce(summary_words, '')), 'D');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    # Listing search_vector lets other code force a recompute by setting it to NULL
+    op.execute("""
+        CREATE TRIGGER emails_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF subject, sender_name, sender_email, snippet, search_vector
+        ON emails
+        FOR EACH ROW EXECUTE PROCEDURE emails_search_vector_update()
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION email_summaries_search_refresh() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                UPDATE emails SET search_vector = NULL WHERE id = OLD.email_id;
+            ELSE
+                UPDATE emails SET search_vector = NULL WHERE id = NEW.email_id;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER email_summaries_search_trigger
+        AFTER INSERT OR DELETE OR UPDATE OF summary_text, key_points
+        ON email_summaries
+        FOR EACH ROW EXECUTE PROCEDURE email_summaries_search_refresh()
+    """)
+
+    # Backfill through the trigger
+    op.execute("UPDATE emails SET search_vector = NULL")
+
+    op.create_index('idx_email_search', 'emails', ['search_vector'], postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('idx_email_search', table_name='emails')
+    op.execute("DROP TRIGGER IF EXISTS email_summaries_search_trigger ON email_summaries")
+    op.execute("DROP FUNCTION IF EXISTS email_summaries_search_refresh()")
+    op.execute("DROP TRIGGER IF EXISTS emails_search_vector_trigger ON emails")
+    op.execute("DROP FUNCTION IF EXISTS emails_search_vector_update()")
+    op.drop_column('emails', 'search_vector')
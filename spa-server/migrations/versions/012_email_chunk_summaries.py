@@ -0,0 +1,31 @@
+"""cache of partial summaries for chunked long emails
+
+Revision ID: 012_email_chunk_summaries
+Revises: 011_email_search
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '012_email_chunk_summaries'
+down_revision = '011_email_search'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'email_chunk_summaries',
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('summary_text', sa.Text(), nullable=False),
+        sa.Column('model_used', sa.String(length=32), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('content_hash')
+    )
+
+
+def downgrade():
+    op.drop_table('email_chunk_summaries')
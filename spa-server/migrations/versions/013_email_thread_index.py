@@ -0,0 +1,23 @@
+"""index for thread-grouped email queries
+
+Revision ID: 013_email_thread_index
+Revises: 012_email_chunk_summaries
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '013_email_thread_index'
+down_revision = '012_email_chunk_summaries'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('idx_email_account_thread', 'emails', ['account_id', 'thread_id'])
+
+
+def downgrade():
+    op.drop_index('idx_email_account_thread', table_name='emails')
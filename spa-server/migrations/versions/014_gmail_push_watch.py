@@ -0,0 +1,26 @@
+"""gmail push watch tracking
+
+Revision ID: 014_gmail_push_watch
+Revises: 013_email_thread_index
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '014_gmail_push_watch'
+down_revision = '013_email_thread_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('email_accounts', sa.Column('watch_expiration', sa.DateTime(), nullable=True))
+    op.create_index('idx_email_account_address', 'email_accounts', ['email_address'])
+
+
+def downgrade():
+    op.drop_index('idx_email_account_address', table_name='email_accounts')
+    op.drop_column('email_accounts', 'watch_expiration')
@@ -0,0 +1,56 @@
+"""normalized scholarship amounts and currency rates
+
+Revision ID: 015_scholarship_amounts
+Revises: 014_gmail_push_watch
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '015_scholarship_amounts'
+down_revision = '014_gmail_push_watch'
+branch_labels = None
+depends_on = None
+
+# Starting points only; keep current with `flask scholarships set-rate`
+SEED_RATES = {
+    'INR': 1.0,
+    'USD': 88.0,
+    'EUR': 102.0,
+    'GBP': 117.0,
+    'CAD': 63.0,
+    'AUD': 57.0,
+    'SGD': 68.0,
+    'JPY': 0.58,
+}
+
+
+def upgrade():
+    op.add_column('scholarships', sa.Column('amount_min', sa.Float(), nullable=True))
+    op.add_column('scholarships', sa.Column('amount_max', sa.Float(), nullable=True))
+    # Matches ORDER BY amount_max DESC NULLS LAST, id for the amount sort
+    op.create_index('idx_scholarship_amount', 'scholarships', [sa.text('amount_max DESC NULLS LAST'), 'id'])
+
+    currency_rates = op.create_table(
+        'currency_rates',
+        sa.Column('currency', sa.String(length=3), nullable=False),
+        sa.Column('rate_to_inr', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('currency')
+    )
+    op.bulk_insert(currency_rates, [
+        {'currency': currency, 'rate_to_inr': rate, 'updated_at': datetime.utcnow()}
+        for currency, rate in SEED_RATES.items()
+    ])
+    # Existing amounts are parsed by `flask scholarships normalize-amounts`
+
+
+def downgrade():
+    op.drop_table('currency_rates')
+    op.drop_index('idx_scholarship_amount', table_name='scholarships')
+    op.drop_column('scholarships', 'amount_max')
+    op.drop_column('scholarships', 'amount_min')
@@ -0,0 +1,28 @@
+"""scholarship feed dedupe index
+
+Revision ID: 016_scholarship_ingest
+Revises: 015_scholarship_amounts
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '016_scholarship_ingest'
+down_revision = '015_scholarship_amounts'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Feed ingestion matches existing rows on provider + title + deadline
+    op.create_index(
+        'idx_scholarship_dedupe', 'scholarships',
+        [sa.text("coalesce(provider, '')"), 'title', 'application_deadline']
+    )
+
+
+def downgrade():
+    op.drop_index('idx_scholarship_dedupe', table_name='scholarships')
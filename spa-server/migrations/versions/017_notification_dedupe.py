@@ -0,0 +1,26 @@
+"""notification dedupe key
+
+Revision ID: 017_notification_dedupe
+Revises: 016_scholarship_ingest
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '017_notification_dedupe'
+down_revision = '016_scholarship_ingest'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('notifications', sa.Column('dedupe_key', sa.String(length=128), nullable=True))
+    op.create_index('uq_notification_dedupe', 'notifications', ['user_id', 'dedupe_key'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_notification_dedupe', table_name='notifications')
+    op.drop_column('notifications', 'dedupe_key')
@@ -0,0 +1,26 @@
+"""summary truncation flag, account-scoped chunk notes
+
+Revision ID: 018_email_summary_truncated
+Revises: 017_notification_dedupe
+Create Date: 2026-10-20 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '018_email_summary_truncated'
+down_revision = '017_notification_dedupe'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('email_summaries', sa.Column('truncated', sa.Boolean(), nullable=False, server_default='false'))
+    # Chunk notes are now keyed per account; the old keys were shared across mailboxes
+    op.execute('DELETE FROM email_chunk_summaries')
+
+
+def downgrade():
+    op.drop_column('email_summaries', 'truncated')
@@ -0,0 +1,29 @@
+"""expression index on the thread key
+
+Revision ID: 019_email_thread_key_index
+Revises: 018_email_summary_truncated
+Create Date: 2026-10-20 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '019_email_thread_key_index'
+down_revision = '018_email_summary_truncated'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Thread queries filter and group on coalesce(thread_id, message_id),
+    # which a plain (account_id, thread_id) index cannot serve
+    op.create_index('idx_email_account_thread_key', 'emails',
+                    ['account_id', sa.text('coalesce(thread_id, message_id)')])
+    op.drop_index('idx_email_account_thread', table_name='emails')
+
+
+def downgrade():
+    op.create_index('idx_email_account_thread', 'emails', ['account_id', 'thread_id'])
+    op.drop_index('idx_email_account_thread_key', table_name='emails')
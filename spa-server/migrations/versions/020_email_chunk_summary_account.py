@@ -0,0 +1,33 @@
+"""tie chunk notes to their account
+
+Revision ID: 020_email_chunk_summary_account
+Revises: 019_email_thread_key_index
+Create Date: 2026-10-20 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '020_email_chunk_summary_account'
+down_revision = '019_email_thread_key_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keys are hashed with the account id, so existing notes cannot be attributed
+    op.execute('DELETE FROM email_chunk_summaries')
+    op.add_column('email_chunk_summaries', sa.Column('account_id', sa.Integer(), nullable=False))
+    op.create_foreign_key(
+        'email_chunk_summaries_account_id_fkey', 'email_chunk_summaries', 'email_accounts',
+        ['account_id'], ['id'], ondelete='CASCADE'
+    )
+    op.create_index('idx_email_chunk_account_created', 'email_chunk_summaries', ['account_id', 'created_at'])
+
+
+def downgrade():
+    op.drop_index('idx_email_chunk_account_created', table_name='email_chunk_summaries')
+    op.drop_constraint('email_chunk_summaries_account_id_fkey', 'email_chunk_summaries', type_='foreignkey')
+    op.drop_column('email_chunk_summaries', 'account_id')
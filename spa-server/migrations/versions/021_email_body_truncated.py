@@ -0,0 +1,24 @@
+"""flag stored bodies cut at the decode budget
+
+Revision ID: 021_email_body_truncated
+Revises: 020_email_chunk_summary_account
+Create Date: 2026-10-20 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '021_email_body_truncated'
+down_revision = '020_email_chunk_summary_account'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('email_bodies', sa.Column('truncated', sa.Boolean(), nullable=False, server_default='false'))
+
+
+def downgrade():
+    op.drop_column('email_bodies', 'truncated')